@@ -1,16 +1,224 @@
 import requests
-from flask import Flask, jsonify
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor # parite çekimlerini aynı anda yapmak için
+from flask import Flask, jsonify, request, Response, stream_with_context
+import os
+import json
+import gzip
+import hashlib
+import pandas as pd # tarihe göre hizalanmış seri çerçevesi için
+import sqlite3 # geçmiş fiyat deposu için
+import time
+import threading
+import functools
+from collections import OrderedDict, deque # LRU sırası ve kotasyon halka tamponu için
+from datetime import datetime, timezone
+from seri_istemcisi import SERI_IKILI_TURU, seri_ikili_kodla, seri_ikili_coz, seri_istegi # ikili seri biçimi istemcilerle ortak modülde
 
 api = Flask(__name__)
 
 # AwesomeAPI URL
-AWESOME_API_URL = "https://economia.awesomeapi.com.br/json/last/USD-TRY,EUR-TRY,XAU-USD" # güncel verileri çekeceğimiz url
-AWESOME_API_DAILY_URL = "https://economia.awesomeapi.com.br/json/daily"
-
+AWESOME_API_BASE_URL = os.environ.get("AWESOME_API_BASE_URL", "https://economia.awesomeapi.com.br").rstrip("/") # testlerde yerel sahte sunucuya yönlendirmek için ortam değişkeniyle değiştirilebilir
+AWESOME_API_URL = f"{AWESOME_API_BASE_URL}/json/last/USD-TRY,EUR-TRY,XAU-USD" # güncel verileri çekeceğimiz url
+AWESOME_API_DAILY_URL = f"{AWESOME_API_BASE_URL}/json/daily"
+
+FIYAT_DB = os.environ.get("FIYAT_DB", "fiyat_gecmisi.db") # günlük kapanışların yerel deposu (parite, tarih) anahtarlı
+FIYAT_GUNCELLEME_ARALIGI = 300 # saniye, bu süre içinde aynı parite için kaynağa tekrar gidilmez (gün içi son fiyat da bu sıklıkla yenilenir)
+UST_KAYNAK_ZAMAN_ASIMI = (3.05, 10) # saniye, (bağlantı kurma, yanıt okuma) süre sınırları. Sınırsız beklemede endpoint asılı kalıyordu
+UST_KAYNAK_ISCI_SAYISI = 8 # aynı anda yapılabilecek parite çekimi sayısı
+YENILEME_ISCI_SAYISI = 4 # önbelleklerin arka plan (stale-while-revalidate) yenilemeleri için iş parçacığı sayısı
+KOTASYON_ARALIGI = 15 # saniye, arka plandaki yoklayıcının güncel kurları çekme sıklığı
+KOTASYON_TAMPON_BOYUTU = 240 # bellekte tutulan son kotasyon sayısı (15 saniyede bir ~1 saat)
+KOTASYON_BAYAT_SURE = 3 * KOTASYON_ARALIGI # son kotasyon bundan eskiyse (yoklayıcı durmuş/hata alıyor) istek anında kaynaktan çekilir
+KOTASYON_YOKLAMA_ACIK = os.environ.get("KOTASYON_YOKLAMA", "1") != "0" # betiklerde veya testlerde arka plan iş parçacığını kapatmak için
+GZIP_ESIGI = 512 # bayt, bundan küçük yanıtlar sıkıştırılmaz
+SSE_CANLILIK_ARALIGI = 15 # saniye, yeni kotasyon gelmezse bağlantının kopmaması için gönderilen boş yorum satırı aralığı
+PAYLASIMLI_ONBELLEK_DB = os.environ.get("API_ONBELLEK_DB", "api_onbellek.db") # aynı makinedeki tüm api süreçlerinin (gunicorn işçileri gibi) ortak okuduğu önbellek
+PAYLASIMLI_KIRA_SURESI = 30 # saniye, bir anahtarı yenileyen sürecin kirası. Süreç çökerse kira bu süre sonunda başkasına geçer
+
+
+# Kaynağa yapılan tüm istekler için ortak oturum. Bağlantılar havuzda açık tutulur (keep-alive), her istekte yeniden TLS el sıkışması yapılmaz
+def _oturum_olustur():
+    oturum = requests.Session()
+    adaptor = HTTPAdapter(pool_connections=4, pool_maxsize=UST_KAYNAK_ISCI_SAYISI,
+                          max_retries=Retry(total=2, backoff_factor=0.3, status_forcelist=(502, 503, 504), allowed_methods=("GET",))) # geçici sunucu hatalarında kısa beklemeyle tekrar dener
+    oturum.mount("https://", adaptor)
+    oturum.mount("http://", adaptor) # yerel sahte sunucu için
+    return oturum
+
+_oturum = _oturum_olustur()
+_cekim_havuzu = ThreadPoolExecutor(max_workers=UST_KAYNAK_ISCI_SAYISI) # endpointler arasında paylaşılan iş parçacığı havuzu
+# Bayat önbellek kayıtlarının yenilemeleri ayrı havuzda çalışır. Bir yenileme (ör. hizali_cerceve) _cekim_havuzu'na iş gönderip sonucunu beklediğinden
+# aynı havuzda çalışsaydı, yeterince anahtar birlikte bayatladığında tüm işçiler iç çekimleri bekler ve havuz kilitlenirdi
+_yenileme_havuzu = ThreadPoolExecutor(max_workers=YENILEME_ISCI_SAYISI, thread_name_prefix="onbellek-yenileme")
+
+
+_paylasimli_yerel = threading.local() # her iş parçacığının kendi sqlite bağlantısı
+_SUREC_KIMLIGI = f"{os.getpid()}-{os.urandom(4).hex()}" # kira sahibini ayırt etmek için
+
+
+# Önbelleğe yazılmaya uygun sonuç kontrolü: hata sözlükleri ve boş sonuçlar yazılmaz (DataFrame için de geçerli)
+def _onbellege_uygun(deger):
+    return not (deger is None or len(deger) == 0 or (isinstance(deger, dict) and "error" in deger))
+
+
+# Ortak önbellek veritabanına iş parçacığına özel bağlantı (ilk kullanımda açılır, tablo yoksa oluşturulur)
+def _paylasimli_baglanti():
+    conn = getattr(_paylasimli_yerel, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(PAYLASIMLI_ONBELLEK_DB, timeout=5, isolation_level=None) # her ifade kendi başına işlem (autocommit)
+        conn.execute("PRAGMA journal_mode=WAL") # okuyucular yazanı beklemez
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS onbellek (
+                anahtar TEXT PRIMARY KEY,
+                deger TEXT,
+                yazilma REAL,
+                kira_sahibi TEXT,
+                kira_bitis REAL
+            )
+        ''')
+        _paylasimli_yerel.conn = conn
+    return conn
+
+
+# Anahtarın yenileme kirasını almaya çalışan fonksiyon. UPDATE tek ifadede yazma kilidiyle çalıştığından aynı anda sadece bir süreç kirayı alabilir
+def _kira_al(conn, anahtar, kira_suresi):
+    simdi = time.time()
+    conn.execute("INSERT OR IGNORE INTO onbellek (anahtar, deger, yazilma, kira_sahibi, kira_bitis) VALUES (?, NULL, 0, NULL, 0)", (anahtar,))
+    imlec = conn.execute("UPDATE onbellek SET kira_sahibi = ?, kira_bitis = ? WHERE anahtar = ? AND kira_bitis < ?",
+                         (_SUREC_KIMLIGI, simdi + kira_suresi, anahtar, simdi))
+    return imlec.rowcount == 1
+
+
+# Süreçler arası ortak önbellekten değer getiren fonksiyon. Taze değer varsa kaynağa gidilmez. Yoksa kirayı alan tek süreç hesaplar,
+# diğerleri varsa bayat değeri döndürür, yoksa kira sahibinin yazmasını bekler. Değerler json olarak saklanır (tuple'lar liste olarak döner)
+def paylasimli_getir(anahtar, ttl, hesapla, kira_suresi=PAYLASIMLI_KIRA_SURESI):
+    try:
+        conn = _paylasimli_baglanti()
+        satir = conn.execute("SELECT deger, yazilma FROM onbellek WHERE anahtar = ?", (anahtar,)).fetchone()
+        if satir and satir[0] is not None and time.time() - satir[1] < ttl:
+            return json.loads(satir[0])
 
-# GÜNCEL verileri çekme 
-def get_market_data():
-    response = requests.get(AWESOME_API_URL) #requests belirli kaynak yada api den veri almak için http get isteği oluşturur
+        if _kira_al(conn, anahtar, kira_suresi):
+            try:
+                deger = hesapla()
+                if _onbellege_uygun(deger):
+                    conn.execute("UPDATE onbellek SET deger = ?, yazilma = ? WHERE anahtar = ?", (json.dumps(deger), time.time(), anahtar))
+                return deger
+            finally:
+                conn.execute("UPDATE onbellek SET kira_bitis = 0 WHERE anahtar = ? AND kira_sahibi = ?", (anahtar, _SUREC_KIMLIGI)) # kira bırakılır
+
+        if satir and satir[0] is not None: # başka süreç yeniliyor, o bitene kadar bayat değer sunulur
+            return json.loads(satir[0])
+        bitis = time.time() + kira_suresi # ilk değer henüz hiç yazılmadı, kira sahibinin sonucu beklenir
+        while time.time() < bitis:
+            time.sleep(0.1)
+            satir = conn.execute("SELECT deger, yazilma, kira_bitis FROM onbellek WHERE anahtar = ?", (anahtar,)).fetchone()
+            if satir and satir[0] is not None:
+                return json.loads(satir[0])
+            if satir and satir[2] < time.time(): # kira sahibi sonuç yazmadan bıraktı (hata), bu süreç kendisi dener
+                break
+    except sqlite3.Error as e: # ortak önbellek kullanılamazsa süreç kendi başına devam eder
+        print(f"Uyarı: Ortak önbellek kullanılamadı ({anahtar}): {e}")
+    return hesapla()
+
+
+
+_ONBELLEKLER = {} # ad -> önbelleğe alınmış fonksiyon, istatistik endpointi için
+
+
+# Süreç içi TTL + LRU önbellek dekoratörü. Süresi dolan kayıt bayat_sure içindeyse hemen döner ve arka planda tek bir yenileme başlatılır (stale-while-revalidate)
+# Hata sözlükleri ve boş sonuçlar önbelleğe yazılmaz
+# paylasimli True ise süreç içi ıskalar önce süreçler arası ortak önbelleğe gider (değerler json'a çevrilebilir olmalı)
+# onbellege_al verilirse False döndürdüğü sonuçlar (ör. eksik veri) da yazılmaz: çağırana yine döner, varsa eski/bayat kayıt korunur ve sonraki istekte yeniden denenir
+def ttl_onbellek(ad, ttl, maxsize=128, bayat_sure=None, paylasimli=False, onbellege_al=None): # önbellek adı, saniye cinsinden taze kalma süresi, en fazla kayıt sayısı, bayat kaydın en fazla kaç saniye daha sunulabileceği (varsayılan 10*ttl), sonucu önbelleğe uygun bulan ek koşul
+    bayat_sure = 10 * ttl if bayat_sure is None else bayat_sure
+
+    def dekorator(fonksiyon):
+        kayitlar = OrderedDict() # anahtar -> (değer, yazılma zamanı), sonda en son kullanılan
+        kilit = threading.Lock()
+        yenilenenler = set() # arka planda yenilenen anahtarlar, aynı anahtar için ikinci yenileme başlatılmaz
+        sayaclar = {"isabet": 0, "bayat_isabet": 0, "iska": 0, "tahliye": 0, "yenileme_hatasi": 0}
+
+        def _uret(args, kwargs):
+            if paylasimli:
+                ortak_anahtar = f"{ad}:{json.dumps([args, sorted(kwargs.items())], default=str)}"
+                return paylasimli_getir(ortak_anahtar, ttl, lambda: fonksiyon(*args, **kwargs))
+            return fonksiyon(*args, **kwargs)
+
+        def _yaz(anahtar, deger):
+            if not _onbellege_uygun(deger) or (onbellege_al is not None and not onbellege_al(deger)):
+                return
+            with kilit:
+                kayitlar[anahtar] = (deger, time.monotonic())
+                kayitlar.move_to_end(anahtar)
+                while len(kayitlar) > maxsize: # en uzun süredir kullanılmayan kayıt atılır
+                    kayitlar.popitem(last=False)
+                    sayaclar["tahliye"] += 1
+
+        def _yenile(anahtar, args, kwargs):
+            try:
+                _yaz(anahtar, _uret(args, kwargs))
+            except Exception as e:
+                print(f"Uyarı: {ad} önbelleği arka planda yenilenemedi: {e}")
+                with kilit:
+                    sayaclar["yenileme_hatasi"] += 1
+            finally:
+                with kilit:
+                    yenilenenler.discard(anahtar)
+
+        @functools.wraps(fonksiyon)
+        def sarmalayici(*args, **kwargs):
+            anahtar = (args, tuple(sorted(kwargs.items())))
+            simdi = time.monotonic()
+            with kilit:
+                kayit = kayitlar.get(anahtar)
+                if kayit is not None:
+                    yas = simdi - kayit[1]
+                    if yas < ttl:
+                        kayitlar.move_to_end(anahtar)
+                        sayaclar["isabet"] += 1
+                        return kayit[0]
+                    if yas < ttl + bayat_sure: # bayat ama sunulabilir, yenileme arka planda
+                        kayitlar.move_to_end(anahtar)
+                        sayaclar["bayat_isabet"] += 1
+                        if anahtar not in yenilenenler:
+                            yenilenenler.add(anahtar)
+                            _yenileme_havuzu.submit(_yenile, anahtar, args, kwargs)
+                        return kayit[0]
+                sayaclar["iska"] += 1
+            deger = _uret(args, kwargs) # ıska: kaynak isteği (veya ortak önbellek okuması) kilit dışında yapılır
+            _yaz(anahtar, deger)
+            return deger
+
+        def istatistik():
+            with kilit:
+                toplam = sayaclar["isabet"] + sayaclar["bayat_isabet"] + sayaclar["iska"]
+                return dict(sayaclar, boyut=len(kayitlar), maxsize=maxsize, ttl=ttl,
+                            isabet_orani=round((sayaclar["isabet"] + sayaclar["bayat_isabet"]) / toplam, 4) if toplam else 0.0)
+
+        def temizle():
+            with kilit:
+                kayitlar.clear()
+
+        sarmalayici.istatistik = istatistik
+        sarmalayici.temizle = temizle
+        _ONBELLEKLER[ad] = sarmalayici
+        return sarmalayici
+    return dekorator
+
+
+KOTASYON_PARITELERI = ("USDTRY", "EURTRY", "XAUUSD") # /json/last yanıtındaki anahtarlar
+HAM_KOTASYON_ANAHTARI = "ham" # _kotasyon_cek sonucunda ham alış/satış fiyatlarının anahtarı
+
+
+# GÜNCEL verileri kaynaktan çekme (yoklayıcı ve yedek senkron yol bunu kullanır)
+def _kotasyon_cek():
+    try:
+        response = _oturum.get(AWESOME_API_URL, timeout=UST_KAYNAK_ZAMAN_ASIMI) # ortak oturum (bağlantı havuzu) üzerinden http get isteği oluşturur, süre sınırı aşılırsa hata döner
+    except requests.exceptions.RequestException as e:
+        return {"error": f"API'ye bağlanılamadı: {e}"}
     # yukarıda ki url apiye yapılacak isteğin urlsidir bu url AwesomeAPI'nin sağladığı endpoint
     # response apiden gelecek yanıtı tutar
 
@@ -36,7 +244,8 @@ def get_market_data():
                 "Gold_Gram_TLs": gold_gram_tls,
                 "USDa": usd_try_alis,
                 "EURa": eur_try_alis,
-                "Gold_Gram_TLa": gold_gram_tla
+                "Gold_Gram_TLa": gold_gram_tla,
+                HAM_KOTASYON_ANAHTARI: {f"{parite}_{alan}": float(data[parite][alan]) for parite in KOTASYON_PARITELERI for alan in ("bid", "ask")} # yuvarlanmamış kaynak fiyatları, sadece geçmiş tamponunda tutulur
             }
             return exchange_rates
 
@@ -47,6 +256,82 @@ def get_market_data():
         return {"error": f"API yanıt veremedi, HTTP Kodu: {response.status_code}"}
 
 
+_kotasyon_kilidi = threading.Condition() # hem kilit hem de yeni kotasyon bildirimi (akış aboneleri bunu bekler)
+_son_kotasyon = None # (kurlar sözlüğü, unix zamanı)
+_kotasyon_surumu = 0 # kurlar her değiştiğinde artar
+_kotasyon_gecmisi = deque(maxlen=KOTASYON_TAMPON_BOYUTU) # halka tampon, dolunca en eski kotasyon düşer
+_yoklayici = None
+_yoklayici_durdur = threading.Event()
+
+
+# Kaynaktan güncel kurları çekip son kotasyonu ve geçmiş tamponunu güncelleyen fonksiyon
+def _kotasyonu_guncelle():
+    global _son_kotasyon, _kotasyon_surumu
+    kurlar = paylasimli_getir("kotasyon", KOTASYON_ARALIGI / 2, _kotasyon_cek) # birden fazla api süreci varsa her aralıkta kaynağa sadece biri gider
+    if "error" in kurlar: # hatalı yanıt tampona yazılmaz, son başarılı kotasyon korunur
+        return kurlar
+    kurlar = dict(kurlar)
+    ham = kurlar.pop(HAM_KOTASYON_ANAHTARI, {}) # endpoint ve akış türetilmiş kurları sunar, ham fiyatlar sadece geçmişe yazılır
+    zaman = time.time()
+    with _kotasyon_kilidi:
+        degisti = _son_kotasyon is None or _son_kotasyon[0] != kurlar
+        _son_kotasyon = (kurlar, zaman)
+        _kotasyon_gecmisi.append(dict(kurlar, **ham, zaman=zaman)) # her kayıtta türetilmiş kurlar ve ham USDTRY/EURTRY/XAUUSD bid/ask
+        if degisti: # sadece fiyat değişince aboneler uyandırılır
+            _kotasyon_surumu += 1
+            _kotasyon_kilidi.notify_all()
+    return kurlar
+
+
+# Arka plan iş parçacığında sabit aralıkla kotasyon çeken döngü
+def _kotasyon_yoklama_dongusu():
+    while not _yoklayici_durdur.is_set():
+        try:
+            sonuc = _kotasyonu_guncelle()
+            if "error" in sonuc:
+                print(f"Uyarı: Kotasyon yoklaması başarısız: {sonuc['error']}")
+        except Exception as e: # döngü tek bir hatada ölmemeli
+            print(f"Uyarı: Kotasyon yoklamasında beklenmeyen hata: {e}")
+        _yoklayici_durdur.wait(KOTASYON_ARALIGI)
+
+
+# Yoklayıcıyı (çalışmıyorsa) başlatan fonksiyon. Birden fazla çağrılması güvenlidir
+def kotasyon_yoklayici_baslat():
+    global _yoklayici
+    with _kotasyon_kilidi:
+        if _yoklayici is not None and _yoklayici.is_alive():
+            return
+        _yoklayici_durdur.clear()
+        _yoklayici = threading.Thread(target=_kotasyon_yoklama_dongusu, name="kotasyon-yoklayici", daemon=True)
+        _yoklayici.start()
+
+
+def kotasyon_yoklayici_durdur():
+    _yoklayici_durdur.set()
+
+
+@api.before_request # yoklayıcı import sırasında değil, sunucu ilk isteği aldığında (sunucu sürecinde) başlar
+def _arka_plan_gorevlerini_baslat():
+    if KOTASYON_YOKLAMA_ACIK:
+        kotasyon_yoklayici_baslat()
+
+
+# GÜNCEL verileri döndürme. Yoklayıcının bellekte tuttuğu son kotasyon döner, yoksa veya bayatsa kaynaktan çekilir
+def get_market_data():
+    with _kotasyon_kilidi:
+        son = _son_kotasyon
+    if son is not None and time.time() - son[1] < KOTASYON_BAYAT_SURE:
+        return dict(son[0])
+    return _kotasyonu_guncelle()
+
+
+# Bellekteki son kotasyonları eskiden yeniye döndüren fonksiyon
+def kotasyon_gecmisi(limit=None):
+    with _kotasyon_kilidi:
+        gecmis = list(_kotasyon_gecmisi)
+    return gecmis[-limit:] if limit else gecmis
+
+
 @api.route('/get-market-data', methods=['GET']) # app.route belli bir urlye karşılık gelen fonksiyon tanımlar.
 # get-market-data urlnin yolunu belirler yani urlye get (çağırma) isteği atıldığında def market_Data çağırılır , method da gönderilen hangi isteğe göre çağırılacağını belirtir
 # yani bu route, "GET" isteklerine yanıt veren bir endpoint tanımlar
@@ -57,137 +342,323 @@ def market_data():
 # İŞLEMLER -> get isteğiyle http://127.0.0.1:8000/get-market-data ziyaret edilir , marketdata çağırılır , getmarketdata apiden verileri alır , jonify de verileri dönüştürüri flaskde istemciye cevap verir
 
 
+# Server-Sent Events akışı: bağlanınca tüm kurlar, sonra sadece değişen kurlar gönderilir. Yeni kotasyon yoksa belirli aralıkla canlılık yorumu gider
+def _kotasyon_akisi():
+    son_gonderilen = {}
+    son_surum = -1
+    while True:
+        with _kotasyon_kilidi:
+            _kotasyon_kilidi.wait_for(lambda: _kotasyon_surumu != son_surum, timeout=SSE_CANLILIK_ARALIGI) # yoklayıcı notify_all yapana kadar iş parçacığı uyur
+            surum, son = _kotasyon_surumu, _son_kotasyon
+        if son is None or surum == son_surum: # henüz kotasyon yok veya zaman aşımı
+            son_surum = surum
+            yield ": canli\n\n"
+            continue
+        kurlar, zaman = son
+        degisenler = {anahtar: deger for anahtar, deger in kurlar.items() if son_gonderilen.get(anahtar) != deger}
+        son_gonderilen, son_surum = dict(kurlar), surum
+        if degisenler:
+            yield f"id: {surum}\nevent: kotasyon\ndata: {json.dumps(dict(degisenler, zaman=zaman))}\n\n"
+
+
+@api.route('/stream-market-data', methods=['GET']) # EventSource ile abone olunur, her abone bir iş parçacığı tutar
+def stream_market_data():
+    return Response(stream_with_context(_kotasyon_akisi()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}) # ara vekil sunucuların tamponlamaması için
+
+
+@api.route('/get-market-history', methods=['GET']) # son kotasyonlar (her biri 'zaman' ve 'XAUUSD_bid' gibi ham fiyat anahtarlarıyla), ?limit=N ile son N tanesi
+def market_history():
+    limit = request.args.get("limit", type=int)
+    return jsonify(kotasyon_gecmisi(limit if limit and limit > 0 else None))
+
+
 #----------------------------
 
-def get_gecmis_veri(currency_pair: str, days: int): # aralıklı veriler buradan çekilir
+_etag_zamanlari = OrderedDict() # etag -> ilk üretildiği zaman. İçerik değişmedikçe Last-Modified sabit kalır
+_etag_kilidi = threading.Lock()
+
+
+# Seri endpointleri için ortak yanıt: Accept başlığına göre json veya ikili biçim, istemci destekliyorsa gzip, ETag/Last-Modified ve koşullu isteklerde 304
+def _seri_yaniti(veri, sutun_anahtari=None, ek_anahtarlari=()): # sutun_anahtari verilirse veri[sutun_anahtari] sütunlar, geri kalan alanlar ek olarak kodlanır. Verilmezse verinin kendisi sütun sözlüğüdür, ek_anahtarlari sayısal olmayan alanlardır
+    ikili = isinstance(veri, dict) and request.accept_mimetypes.best_match(["application/json", SERI_IKILI_TURU]) == SERI_IKILI_TURU # Accept yoksa json döner
+    if ikili:
+        if sutun_anahtari:
+            govde = seri_ikili_kodla(veri[sutun_anahtari], ek={k: v for k, v in veri.items() if k != sutun_anahtari}, kok=sutun_anahtari)
+        else:
+            govde = seri_ikili_kodla({k: v for k, v in veri.items() if k not in ek_anahtarlari}, ek={k: veri[k] for k in ek_anahtarlari if k in veri})
+        yanit = Response(govde, mimetype=SERI_IKILI_TURU)
+    else:
+        yanit = jsonify(veri)
+        govde = yanit.get_data()
+
+    if "gzip" in request.accept_encodings and len(govde) > GZIP_ESIGI:
+        yanit.set_data(gzip.compress(govde, compresslevel=6))
+        yanit.headers["Content-Encoding"] = "gzip"
+    yanit.headers["Vary"] = "Accept, Accept-Encoding"
+
+    if isinstance(veri, dict):
+        sutunlar = veri.get(sutun_anahtari, {}) if sutun_anahtari else {k: v for k, v in veri.items() if k not in ek_anahtarlari}
+        eksik = any(isinstance(v, list) and len(v) == 0 for v in sutunlar.values())
+    else: # tek seri (liste) yanıtı, ör. /get-historical-series
+        eksik = len(veri) == 0
+    if eksik: # eksik seri içeren yanıt doğrulayıcıyla (ETag) sunulmaz, istemci saklamaz ve tekrar ister
+        yanit.headers["Cache-Control"] = "no-store"
+        return yanit
+
+    etag = hashlib.sha256(govde).hexdigest()[:32]
+    if yanit.headers.get("Content-Encoding") == "gzip":
+        etag += "-gz" # sıkıştırılmış gösterim ayrı bir varlıktır
+    with _etag_kilidi:
+        if etag not in _etag_zamanlari:
+            _etag_zamanlari[etag] = datetime.now(timezone.utc)
+            while len(_etag_zamanlari) > 256:
+                _etag_zamanlari.popitem(last=False)
+        son_degisiklik = _etag_zamanlari[etag]
+
+    yanit.set_etag(etag)
+    yanit.last_modified = son_degisiklik
+    yanit.headers["Cache-Control"] = "no-cache" # istemci önbelleği tutabilir ama her seferinde koşullu istekle doğrular
+    return yanit.make_conditional(request) # If-None-Match / If-Modified-Since eşleşirse gövdesiz 304 döner
+
+
+# Fiyat deposuna bağlanan fonksiyon (tablolar yoksa oluşturur)
+def _fiyat_db_baglan():
+    conn = sqlite3.connect(FIYAT_DB)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS gunluk_fiyatlar (
+            parite TEXT,
+            tarih TEXT,
+            bid REAL,
+            PRIMARY KEY (parite, tarih)
+        )
+    ''') # her parite için günde tek kayıt tutulur, aynı gün tekrar gelirse son değer yazılır
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS seri_durumu (
+            parite TEXT PRIMARY KEY,
+            son_cekim REAL,
+            tam_pencere INTEGER DEFAULT 0
+        )
+    ''') # paritenin kaynaktan en son ne zaman güncellendiği ve kaynaktan bütünüyle çekilmiş en uzun pencere (gün)
+    if "tam_pencere" not in {satir[1] for satir in conn.execute("PRAGMA table_info(seri_durumu)")}: # eski depolara sütun eklenir, bu pariteler bir kez tam çekilir
+        conn.execute("ALTER TABLE seri_durumu ADD COLUMN tam_pencere INTEGER DEFAULT 0")
+    return conn
+
+
+
+# AwesomeAPI'den paritenin son `days` günlük kaydını (tarih, bid) çiftleri olarak çeken fonksiyon. Hata durumunda exception fırlatır
+def _gunluk_kayitlari_cek(currency_pair, days):
     url = f"{AWESOME_API_DAILY_URL}/{currency_pair}/{days}"
-    prices = [] # risk analizi yaparken başlangıç fiyatından başlanmalı listeyi riskanaliz.py içinde ters döndürerek kullanılmalı
+    response = _oturum.get(url, timeout=UST_KAYNAK_ZAMAN_ASIMI)
+    response.raise_for_status() # HTTP hataları için exception fırlatır
+    data = response.json()
+
+    kayitlar = []
+    if data and isinstance(data, list): # eğer data mevcut ve liste türünde ise
+        for item in data:
+            # Her bir günün verisi bir sözlük içinde
+            if 'bid' in item and 'timestamp' in item:
+                try:
+                    tarih = datetime.fromtimestamp(int(item['timestamp']), timezone.utc).date().isoformat() # günlük kayıt anahtarı
+                    kayitlar.append((tarih, float(item['bid'])))
+                except (ValueError, TypeError):
+                    print(f"Uyarı: {currency_pair} için 'bid' veya 'timestamp' değeri geçersiz: {item.get('bid')}, {item.get('timestamp')}")
+    return kayitlar[::-1] # API en yeniyi başta verir, eskiden yeniye çevrilir ki aynı güne düşen kayıtlarda en yenisi en son yazılsın
+
+
+
+def get_gecmis_veri(currency_pair: str, days: int): # aralıklı veriler buradan çekilir (sadece fiyatlar, en yeni gün başta)
+    return [bid for _, bid in gecmis_kayitlari_getir(currency_pair, days)] # risk analizi yaparken başlangıç fiyatından başlanmalı listeyi riskanaliz.py içinde ters döndürerek kullanılmalı
+
+
+
+# Paritenin son `days` günlük (tarih, bid) kayıtlarını en yeni gün başta olacak şekilde döndüren fonksiyon. Önce yerel depoya bakılır, kaynaktan sadece son kayıttan sonraki eksik günler çekilir
+@ttl_onbellek("gecmis_kayitlar", ttl=FIYAT_GUNCELLEME_ARALIGI, maxsize=64, paylasimli=True)
+def gecmis_kayitlari_getir(currency_pair: str, days: int):
     try:
-        response = requests.get(url)
-        response.raise_for_status() # HTTP hataları için exception fırlatır
-        data = response.json()
-
-        if data and isinstance(data, list): # eğer data mevcut ve liste türünde ise
-            for item in data:
-                # Her bir günün verisi bir sözlük içinde
-                if 'bid' in item:
-                    try:
-                        prices.append(float(item['bid']))
-                    except ValueError:
-                        print(f"Uyarı: {currency_pair} için 'bid' değeri float değil: {item.get('bid')}")
-                        pass # veya loglama yapılabilir
-
-        return prices if prices else []
+        conn = _fiyat_db_baglan()
+    except sqlite3.Error as e: # depo açılamazsa doğrudan kaynaktan okunur
+        print(f"Uyarı: Fiyat deposu açılamadı, kaynaktan okunuyor: {e}")
+        try:
+            return _gunluk_kayitlari_cek(currency_pair, days)[::-1]
+        except Exception as e:
+            print(f"Awesome API'dan geçmiş seri veri alınırken hata ({currency_pair}, son {days} gün): {e}")
+            return []
+
+    try:
+        kayit_sayisi, son_tarih = conn.execute("SELECT COUNT(*), MAX(tarih) FROM gunluk_fiyatlar WHERE parite = ?", (currency_pair,)).fetchone()
+        durum = conn.execute("SELECT son_cekim, tam_pencere FROM seri_durumu WHERE parite = ?", (currency_pair,)).fetchone()
+        taze = durum is not None and time.time() - durum[0] < FIYAT_GUNCELLEME_ARALIGI
+        tam_pencere = (durum[1] or 0) if durum else 0
+
+        if kayit_sayisi == 0 or tam_pencere < days: # bu pencere kaynaktan hiç bütünüyle çekilmedi, bir kez çekilir. Kayıt sayısına bakılmaz: kaynak hafta sonu ve tatillerde kayıt vermediğinden depo hiçbir zaman `days` farklı güne ulaşmaz
+            cekilecek_gun = days
+        elif taze: # yakın zamanda güncellendi, kaynağa gidilmez
+            cekilecek_gun = 0
+        else: # son kayıttan bugüne kadar olan günler (bugünün kaydı gün içinde değiştiğinden o da yenilenir)
+            bugun = datetime.now(timezone.utc).date()
+            cekilecek_gun = min(days, (bugun - datetime.fromisoformat(son_tarih).date()).days + 1)
+
+        if cekilecek_gun > 0:
+            try:
+                kayitlar = _gunluk_kayitlari_cek(currency_pair, cekilecek_gun)
+                conn.executemany("INSERT OR REPLACE INTO gunluk_fiyatlar (parite, tarih, bid) VALUES (?, ?, ?)",
+                                 [(currency_pair, tarih, bid) for tarih, bid in kayitlar])
+                conn.execute("INSERT OR REPLACE INTO seri_durumu (parite, son_cekim, tam_pencere) VALUES (?, ?, ?)",
+                             (currency_pair, time.time(), max(tam_pencere, days) if cekilecek_gun == days else tam_pencere))
+                conn.commit()
+            except requests.exceptions.RequestException as e: # kaynak yanıt vermezse depodaki (eski olabilecek) veri döner
+                print(f"Awesome API'dan geçmiş seri veri alınırken hata ({currency_pair}, son {cekilecek_gun} gün): {e}")
+
+        satirlar = conn.execute("SELECT tarih, bid FROM gunluk_fiyatlar WHERE parite = ? ORDER BY tarih DESC LIMIT ?", (currency_pair, days)).fetchall()
+        return [(tarih, bid) for tarih, bid in satirlar] # API ile aynı sıra: en yeni gün başta
 
-    except requests.exceptions.RequestException as e:
-        print(f"Awesome API'dan geçmiş seri veri alınırken hata ({currency_pair}, son {days} gün): {e}")
-        return [] # Hata durumunda boş liste dönüyoruz
     except Exception as e:
         print(f"Beklenmeyen hata oluştu ({currency_pair}, son {days} gün): {e}")
         return [] # Diğer beklenmeyen hatalar için boş liste dönüyoruz
+    finally:
+        conn.close()
+
+
+# Birden fazla paritenin serisini aynı anda çeken fonksiyon. Toplam süre en yavaş tek çekim kadar olur
+def serileri_paralel_cek(pariteler, days, tarihli=False): # parite listesi ve gün sayısı, {parite: fiyat listesi} döner. tarihli True ise fiyatlar yerine (tarih, bid) kayıtları döner
+    fonksiyon = gecmis_kayitlari_getir if tarihli else get_gecmis_veri
+    gelecekler = {parite: _cekim_havuzu.submit(fonksiyon, parite, days) for parite in pariteler}
+    return {parite: gelecek.result() for parite, gelecek in gelecekler.items()} # get_gecmis_veri hata durumunda boş liste döndüğünden result exception fırlatmaz
 
 
 @api.route('/get-historical-series/<currency_pair>/<int:days>', methods=['GET'])
 def historical_series_route(currency_pair, days):
 
     prices = get_gecmis_veri(currency_pair, days)
-    return jsonify(prices)
+    return _seri_yaniti(prices) # tek liste json olarak döner, ETag/304 yine geçerlidir
 
 #----------------------------
 
-def haftalik_veri():
-    haftalik_veriler = {}
-
-    haftalik_dolar_tl_seri = get_gecmis_veri("USD-TRY", 7)
-    haftalik_veriler['USDh'] = haftalik_dolar_tl_seri
+SERI_PENCERESI = 360 # en uzun dönem (yıllık). Tüm kısa dönemler bu pencerenin dilimidir, kaynaktan/depodan tek pencere okunur
+VARSAYILAN_PARITELER = ["USD-TRY", "EUR-TRY", "XAU-USD"]
+GRAM_ALTIN_ANAHTARI = "Gold_Gram_TL" # USD-TRY ve XAU-USD istenmişse türetilen gram altın serisi bu anahtarla eklenir
+
+
+ONS_GRAM = 31.1035 # bir ons altının gram karşılığı
+
+# Türetilmiş seriler: ad -> (gereken pariteler, hizalı çerçeveden seriyi hesaplayan vektörel fonksiyon). Yeni çapraz kur eklemek için buraya bir satır eklenir
+TURETILMIS_SERILER = {
+    GRAM_ALTIN_ANAHTARI: (("XAU-USD", "USD-TRY"), lambda c: (c["XAU-USD"] * c["USD-TRY"] / ONS_GRAM).round(2)), # dolar*tl = altının tl cinsi, ons -> gram
+}
+
+
+# Paritelerin son `days` günlük kayıtlarını tarihe göre iç birleştirmeyle (sadece tüm paritelerde bulunan günler) hizalayan ve türetilmiş serileri ekleyen fonksiyon
+# Satırlar tarih (YYYY-MM-DD), en yeni gün başta. Verisi hiç gelmeyen pariteler birleştirmeye katılmaz, diğerlerinin günlerini boşaltmasın diye
+# Böyle eksik çerçeveler attrs["eksik_pariteler"] ile işaretlenir ve önbelleğe yazılmaz (tek paritedeki geçici hata, ör. 429, TTL boyunca boş seri olarak sunulmasın)
+@ttl_onbellek("hizali_cerceve", ttl=FIYAT_GUNCELLEME_ARALIGI, maxsize=16, onbellege_al=lambda cerceve: not cerceve.attrs.get("eksik_pariteler"))
+def hizali_cerceve(pariteler, days=SERI_PENCERESI): # pariteler önbellek anahtarı olabilmesi için tuple olmalı
+    pencereler = serileri_paralel_cek(pariteler, days, tarihli=True)
+    sutunlar = []
+    eksikler = []
+    for parite, kayitlar in pencereler.items():
+        if not kayitlar:
+            print(f"Uyarı: {parite} için veri yok, hizalamaya katılmadı.")
+            eksikler.append(parite)
+            continue
+        seri = pd.Series(dict(kayitlar), name=parite, dtype=float) # tarih -> bid
+        sutunlar.append(seri[~seri.index.duplicated(keep="last")])
+    if not sutunlar:
+        return pd.DataFrame()
+
+    cerceve = pd.concat(sutunlar, axis=1, join="inner").sort_index(ascending=False) # tarihe göre iç birleştirme, API ile aynı sıra
+    for ad, (gerekenler, hesapla) in TURETILMIS_SERILER.items():
+        if all(parite in cerceve.columns for parite in gerekenler):
+            cerceve[ad] = hesapla(cerceve)
+    cerceve.attrs["eksik_pariteler"] = eksikler
+    return cerceve
+
+
+
+# Paritelerin serilerini en uzun pencereden dilimleyerek döndüren fonksiyon. days verilirse son N gün, baslangic/bitis (YYYY-MM-DD) verilirse o tarih aralığı alınır
+# Tüm seriler aynı tarihlere hizalıdır: {"seriler": {ad: [...]}, "tarihler": [...]}, en yeni gün başta
+def seri_verisi(pariteler=None, days=None, baslangic=None, bitis=None):
+    pariteler = tuple(pariteler or VARSAYILAN_PARITELER)
+    cerceve = hizali_cerceve(pariteler, SERI_PENCERESI) # her parite için tek pencere okunur, hizalı çerçeve önbellekten gelir
+
+    if baslangic:
+        cerceve = cerceve[cerceve.index >= baslangic] # ISO tarihler metin olarak sıralanabilir
+    if bitis:
+        cerceve = cerceve[cerceve.index <= bitis]
+    if days is not None:
+        cerceve = cerceve.iloc[:days] # en yeni gün başta olduğundan son N gün çerçevenin başıdır
+
+    seriler = {ad: cerceve[ad].tolist() if ad in cerceve.columns else [] for ad in pariteler}
+    for ad in TURETILMIS_SERILER:
+        if ad in cerceve.columns:
+            seriler[ad] = cerceve[ad].tolist()
+    return {"seriler": seriler, "tarihler": cerceve.index.tolist()}
+
+
+# Örnek: /get-series?pairs=USD-TRY,XAU-USD&days=30  veya  /get-series?start=2024-01-01&end=2024-03-31
+@api.route('/get-series', methods=['GET'])
+def get_series():
+    pariteler = [p.strip() for p in request.args.get("pairs", ",".join(VARSAYILAN_PARITELER)).split(",") if p.strip()]
+    days = request.args.get("days", type=int)
+    baslangic = request.args.get("start")
+    bitis = request.args.get("end")
+
+    if days is not None and not 1 <= days <= SERI_PENCERESI:
+        return jsonify({"error": f"days 1 ile {SERI_PENCERESI} arasında olmalı"}), 400
+    for tarih in (baslangic, bitis):
+        if tarih:
+            try:
+                datetime.strptime(tarih, "%Y-%m-%d")
+            except ValueError:
+                return jsonify({"error": f"Geçersiz tarih (YYYY-MM-DD bekleniyor): {tarih}"}), 400
 
-    haftalik_euro_tl_seri = get_gecmis_veri("EUR-TRY", 7)
-    haftalik_veriler['EURh'] = haftalik_euro_tl_seri
+    return _seri_yaniti(seri_verisi(pariteler, days=days, baslangic=baslangic, bitis=bitis), sutun_anahtari="seriler")
 
-    haftalik_altin_dolar_seri = get_gecmis_veri("XAU-USD", 7)
+#----------------------------
 
-    haftalik_gram_altin_tl_seri = []
-    if haftalik_dolar_tl_seri and haftalik_altin_dolar_seri and len(haftalik_dolar_tl_seri) == len(haftalik_altin_dolar_seri):
-        for i in range(len(haftalik_dolar_tl_seri)):
-            try:
-                gram_altin_tl_fiyat = round((haftalik_altin_dolar_seri[i] * haftalik_dolar_tl_seri[i]) / 31.1035 , 2)
-                haftalik_gram_altin_tl_seri.append(gram_altin_tl_fiyat)
-            except Exception as e:
-                print(f"Gram Altın/TL hesaplanırken hata oluştu (indeks {i}): {e}")
-                haftalik_gram_altin_tl_seri.append(None) # Hata durumunda None ekle
+# Eski dönem endpointlerinin biçiminde ({'USDh': [...], 'EURh': [...], 'Gold_Gram_TLh': [...]}) veri üreten fonksiyon, seri_verisi'nin ince sarmalayıcısıdır
+def _donem_verisi(days, ek):
+    veri = seri_verisi(VARSAYILAN_PARITELER, days=days)
+    seriler = veri["seriler"]
+    return {
+        'USD' + ek: seriler["USD-TRY"],
+        'EUR' + ek: seriler["EUR-TRY"],
+        GRAM_ALTIN_ANAHTARI + ek: seriler.get(GRAM_ALTIN_ANAHTARI, []), # Gram Altın/TL fiyat serisi
+        "tarihler": veri["tarihler"] # serilerin gerçek tarihleri (YYYY-MM-DD), en yeni gün başta
+    }
 
-    haftalik_veriler["Gold_Gram_TLh"] = haftalik_gram_altin_tl_seri # Gram Altın/TL fiyat serisi
 
-    return haftalik_veriler
+def haftalik_veri():
+    return _donem_verisi(7, "h")
 
 
 @api.route('/get-weekly', methods=['GET']) # bu local urller app.py den rahat ve sade erişmek için
 def get_weekly():
-    return jsonify(haftalik_veri())
+    return _seri_yaniti(haftalik_veri(), ek_anahtarlari=("tarihler",))
 
 #----------------------------
 
 def aylik_veri():
-    aylik_veriler = {}
-
-    aylik_dolar_tl_seri = get_gecmis_veri("USD-TRY", 30)
-    aylik_veriler['USDa'] = aylik_dolar_tl_seri
-
-    aylik_euro_tl_seri = get_gecmis_veri("EUR-TRY", 30)
-    aylik_veriler['EURa'] = aylik_euro_tl_seri
-
-    aylik_altin_dolar_seri = get_gecmis_veri("XAU-USD", 30)
-
-    aylik_gram_altin_tl_seri = []
-    if aylik_dolar_tl_seri and aylik_altin_dolar_seri and len(aylik_dolar_tl_seri) == len(aylik_altin_dolar_seri):
-        for i in range(len(aylik_dolar_tl_seri)):
-            try:
-                # Her bir gün için Gram Altın/TL'yi hesapla
-                gram_altin_tl_fiyat = round((aylik_altin_dolar_seri[i] * aylik_dolar_tl_seri[i]) / 31.1035 , 2)
-                aylik_gram_altin_tl_seri.append(gram_altin_tl_fiyat)
-            except Exception as e:
-                print(f"Aylık Gram Altın/TL hesaplanırken hata oluştu (indeks {i}): {e}")
-                aylik_gram_altin_tl_seri.append(None) # Hata durumunda None ekle
-
-    aylik_veriler["Gold_Gram_TLa"] = aylik_gram_altin_tl_seri # Gram Altın/TL fiyat serisi
-
-    return aylik_veriler
+    return _donem_verisi(30, "a")
 
 @api.route('/get-monthly', methods=['GET']) 
 def get_monthly():
-    return jsonify(aylik_veri())
+    return _seri_yaniti(aylik_veri(), ek_anahtarlari=("tarihler",))
 
 #----------------------------
 
 def yillik_veri():
-    yillik_veriler = {}
-
-    yillik_dolar_tl_seri = get_gecmis_veri("USD-TRY", 360)
-    yillik_veriler['USDy'] = yillik_dolar_tl_seri
+    return _donem_verisi(360, "y")
 
-    yillik_euro_tl_seri = get_gecmis_veri("EUR-TRY", 360)
-    yillik_veriler['EURy'] = yillik_euro_tl_seri
-
-    yillik_altin_dolar_seri = get_gecmis_veri("XAU-USD", 360)
-
-    yillik_gram_altin_tl_seri = []
-    if yillik_dolar_tl_seri and yillik_altin_dolar_seri:
-        for i in range(len(yillik_dolar_tl_seri)):
-            try:
-                # Her bir gün için Gram Altın/TL'yi hesapla
-                gram_altin_tl_fiyat = round((yillik_altin_dolar_seri[i] * yillik_dolar_tl_seri[i]) / 31.1035 , 2)
-                yillik_gram_altin_tl_seri.append(gram_altin_tl_fiyat)
-            except Exception as e:
-                print(f"Yıllık Gram Altın/TL hesaplanırken hata oluştu (indeks {i}): {e}")
-                yillik_gram_altin_tl_seri.append(None) # Hata durumunda None ekle
+@api.route('/get-yearly', methods=['GET']) # bu local urller app.py den rahat ve sade erişmek için
+def get_yearly():
+    return _seri_yaniti(yillik_veri(), ek_anahtarlari=("tarihler",))
 
-    yillik_veriler["Gold_Gram_TLy"] = yillik_gram_altin_tl_seri # Gram Altın/TL fiyat serisi
 
-    return yillik_veriler
 
-@api.route('/get-yearly', methods=['GET']) # bu local urller app.py den rahat ve sade erişmek için
-def get_yearly():
-    return jsonify(yillik_veri())
+@api.route('/cache-stats', methods=['GET']) # önbellek isabet/ıska sayaçları
+def cache_stats():
+    return jsonify({ad: fonksiyon.istatistik() for ad, fonksiyon in _ONBELLEKLER.items()})
 
 
 
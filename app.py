@@ -4,9 +4,14 @@ import requests
 import api 
 import db
 import riskanaliz
+import islem_aktarimi
+import seri_istemcisi
 import matplotlib.pyplot as plt
 from datetime import datetime, timedelta
 import pandas as pd
+import json
+import threading
+import time
 
 
 st.set_page_config(page_title="Cüzdan Uygulaması", layout="wide") # sayfayı tam boyutunda kullanmak için
@@ -22,6 +27,22 @@ API_URL = "http://127.0.0.1:8000/get-market-data" #apinin güncel verileri json
 API_WEEKLY_URL = "http://127.0.0.1:8000/get-weekly"
 API_MONTHLY_URL = "http://127.0.0.1:8000/get-monthly"
 API_YEARLY_URL = "http://127.0.0.1:8000/get-yearly"
+API_STREAM_URL = "http://127.0.0.1:8000/stream-market-data" # kurlar değiştikçe sunucunun ittiği akış (SSE)
+CANLI_YENILEME_SANIYE = 5 # güncel kurlar bölümünün kendini yeniden çizme aralığı (sadece o bölüm, tüm sayfa değil)
+
+# Kenar çubuğunda seçili portföy (tüm cüzdan işlemleri bu portföy üzerinde yapılır)
+def aktif_portfoy():
+    return st.session_state.get("aktif_portfoy", db.VARSAYILAN_PORTFOY)
+
+
+# "Yeni Portföy" kutusuna ad girilince bir kez çalışır: portföyü seçer ve kutuyu boşaltır. Kutu dolu kalsaydı her yeniden çizimde seçimi ezerdi
+def yeni_portfoy_sec():
+    ad = st.session_state.get("yeni_portfoy", "").strip()
+    if ad:
+        st.session_state["aktif_portfoy"] = ad
+    st.session_state["yeni_portfoy"] = ""
+
+
 
 @st.cache_data(ttl=3000) # sürekli veri yenilenmesin diye zamanlayıcı
 def get_exchange_rates(): # apiden verileri çekerek bu ana dosyada kullanılmasını sağlayan fonksiyondur
@@ -37,12 +58,31 @@ def get_exchange_rates(): # apiden verileri çekerek bu ana dosyada kullanılmas
         return {"error": str(e)} # hatanın nerde olduğunu görelim diye kodu fırlatır
 
 
+# Streamlit sunucu süreci başına tek bir akış aboneliği açılır, tüm oturumlar aynı sözlükten okur
+@st.cache_resource
+def canli_kotasyon_abonesi():
+    durum = {"kurlar": None}
+
+    def dinle():
+        while True:
+            try:
+                with requests.get(API_STREAM_URL, stream=True, timeout=(3.05, 60)) as response: # okuma süresi sunucunun canlılık aralığından uzun olmalı
+                    response.raise_for_status()
+                    for satir in response.iter_lines(decode_unicode=True):
+                        if satir and satir.startswith("data:"): # sadece değişen kurlar gelir, öncekilerle birleştirilir
+                            durum["kurlar"] = {**(durum["kurlar"] or {}), **json.loads(satir[5:])}
+            except Exception as e: # bağlantı koparsa biraz bekleyip yeniden abone olunur
+                print(f"Canlı kotasyon akışı kesildi, yeniden bağlanılacak: {e}")
+                time.sleep(5)
+
+    threading.Thread(target=dinle, name="canli-kotasyon", daemon=True).start()
+    return durum
+
+
 @st.cache_data(ttl=10000)
 def get_weekly_data():
     try:
-        response = requests.get(API_WEEKLY_URL)
-        response.raise_for_status()
-        return response.json()
+        return seri_istemcisi.seri_istegi(API_WEEKLY_URL) # ikili biçim ve koşullu istek, veri değişmediyse sunucu 304 döner
     except requests.exceptions.RequestException as e:
         return {"error": f"Haftalık veri API hatası: {e}"}
     except ValueError:
@@ -52,9 +92,7 @@ def get_weekly_data():
 @st.cache_data(ttl=10000)
 def get_monthly_data():
     try:
-        response = requests.get(API_MONTHLY_URL)
-        response.raise_for_status()
-        return response.json()
+        return seri_istemcisi.seri_istegi(API_MONTHLY_URL) # ikili biçim ve koşullu istek, veri değişmediyse sunucu 304 döner
     except requests.exceptions.RequestException as e:
         return {"error": f"Aylık veri API hatası: {e}"}
     except ValueError:
@@ -64,9 +102,7 @@ def get_monthly_data():
 @st.cache_data(ttl=10000)
 def get_yearly_data():
     try:
-        response = requests.get(API_YEARLY_URL)
-        response.raise_for_status()
-        return response.json()
+        return seri_istemcisi.seri_istegi(API_YEARLY_URL) # ikili biçim ve koşullu istek, veri değişmediyse sunucu 304 döner
     except requests.exceptions.RequestException as e:
         return {"error": f"Yıllık veri API hatası: {e}"}
     except ValueError:
@@ -81,24 +117,11 @@ def add_to_wallet(varlik_turu, miktar, satis_fiyati, alis_fiyati):
         st.sidebar.warning("Lütfen Miktar ve Alış Fiyat bilgilerini girin ve Satış Fiyatı boş bırakın.", icon="⚠️")
         return
 
-    # Belirli bir varlık türü için bilgileri alır
-    mevcut_varlik = db.load_wallet_data(varlik_turu)
-
-    if mevcut_varlik and varlik_turu in mevcut_varlik: #varlık daha önceden cüzdanda varsa
-        mevcut_miktar = mevcut_varlik[varlik_turu]["miktar"]
-        mevcut_maliyet = mevcut_varlik[varlik_turu]["maliyet"]
-
-        # yeni maliyet hesaplaması
-        toplam_maliyet = (mevcut_miktar * mevcut_maliyet) + (miktar * alis_fiyati) # mevcut maliyet hesabı + yeni mesaliyet
-        yeni_miktar = mevcut_miktar + miktar
-        yeni_maliyet = toplam_maliyet / yeni_miktar
-
-    else: #varlık cüzdan yoksa ilk defa giriliyorsa
-        yeni_miktar = miktar
-        yeni_maliyet = alis_fiyati # maliyet saten miktar * fiyat olacağından miktarlar gider direkt fiyata eşit olur ilk maliyet
-
-    # Veritabanına kaydet
-    db.save_wallet_data(varlik_turu, yeni_miktar, yeni_maliyet, alis_fiyati, satis_fiyati)
+    # İşlem deftere yazılır, ortalama maliyet ve miktar db tarafında aynı transaction içinde güncellenir (okuma-hesaplama-yazma arasında başka işlem araya giremez)
+    sonuc = db.islem_ekle(varlik_turu, "alis", miktar, alis_fiyati, portfoy_id=aktif_portfoy())
+    if "error" in sonuc:
+        st.sidebar.warning(sonuc["error"], icon="⚠️")
+        return
 
     st.success(f"{varlik_turu} cüzdana eklendi ve güncellendi!")
     st.sidebar.empty()  # Sidebar'ı temizle
@@ -109,7 +132,7 @@ def add_to_wallet(varlik_turu, miktar, satis_fiyati, alis_fiyati):
 def calculate_asset():
     exchange_rates = get_exchange_rates()  # API verilerini al
     toplam_deger = 0  # Toplam değer için havuz
-    wallet_data = db.load_wallet_data()  # Veritabanından cüzdan verilerini al
+    wallet_data = db.load_wallet_data(portfoy_id=aktif_portfoy())  # Veritabanından cüzdan verilerini al
 
     for varlik in wallet_data:  # Varlıktaki ögeler sırayla alınır
         miktar = wallet_data[varlik]["miktar"]
@@ -132,41 +155,91 @@ def calculate_asset():
 
 # Cüzdandan varlık çıkarma işlemi
 def remove_wallet(varlik_turu, miktar, satis_fiyati):
-    wallet_data = db.load_wallet_data(varlik_turu)  # Veritabanından cüzdan verilerini al
-
-    if varlik_turu in wallet_data:
-        mevcut_miktar = wallet_data[varlik_turu]["miktar"]
-        mevcut_maliyet = wallet_data[varlik_turu]["maliyet"]
-        mevcut_kar_zarar = wallet_data[varlik_turu]["kar_zarar"]
+    if satis_fiyati is None: #alış fiyatı girilmiş iken satış fiyat boş olunca hata veriyorda ona çözüm
+        st.sidebar.warning("Lütfen Satış Fiyatı bilgisini girin.", icon="⚠️")
+        return
+    if not miktar:
+        st.sidebar.warning("Lütfen Miktar bilgisini girin.", icon="⚠️")
+        return
 
-        if satis_fiyati is None: #alış fiyatı girilmiş iken satış fiyat boş olunca hata veriyorda ona çözüm
-            st.sidebar.warning("Lütfen Satış Fiyatı bilgisini girin.", icon="⚠️")
-        
+    # Satış deftere yazılır, miktar kontrolü ve kar/zarar hesabı (satılan tutar - eldeki toplam maliyet) db tarafında aynı transaction içinde yapılır
+    sonuc = db.islem_ekle(varlik_turu, "satis", miktar, satis_fiyati, portfoy_id=aktif_portfoy())
+    if "error" in sonuc:
+        if sonuc.get("durum") == db.DURUM_VARLIK_YOK:
+            st.sidebar.warning(f"Cüzdanda yeterli {varlik_turu} yok.", icon="⚠️")
         else:
-            if miktar > mevcut_miktar:
-                st.sidebar.warning(f"Yetersiz miktar. Mevcut miktar: {mevcut_miktar}", icon="⚠️")
-            else:
-                yeni_miktar = mevcut_miktar - miktar
-
-                elde_bulunan_deger = mevcut_miktar * mevcut_maliyet
-                satisi_yapilan = miktar * satis_fiyati
-                toplam_kar_zarar = satisi_yapilan - elde_bulunan_deger #son işlemle beraber toplam kar-zarara durumu
+            st.sidebar.warning(sonuc["error"], icon="⚠️")
+        return
 
-                if yeni_miktar == 0:
-                    db.remove_wallet_data(varlik_turu)  # Veritabanından varlığı sil
-                    st.success(f"{varlik_turu} cüzdandan çıkarıldı!")
-                    st.info(f"Son İşlemde Bu Varlıktan Elde Edilen Kâr/Zarar: {toplam_kar_zarar:.2f} TL")
-                else:
-                    db.update_wallet_data(varlik_turu, yeni_miktar, toplam_kar_zarar)  # Veritabanını güncelle
-                    st.success(f"{varlik_turu} cüzdandan çıkarıldı ve güncellendi!")
+    toplam_kar_zarar = sonuc["islem_kar_zarar"] #son işlemle beraber toplam kar-zarara durumu
+    if sonuc["miktar"] == 0: # pozisyon kapandı, varlık cüzdandan silindi
+        st.success(f"{varlik_turu} cüzdandan çıkarıldı!")
+        st.info(f"Son İşlemde Bu Varlıktan Elde Edilen Kâr/Zarar: {toplam_kar_zarar:.2f} TL")
     else:
-        st.sidebar.warning(f"Cüzdanda yeterli {varlik_turu} yok.", icon="⚠️")
+        st.success(f"{varlik_turu} cüzdandan çıkarıldı ve güncellendi!")
+
+
+
+# RİSK ANALİZİ İÇİN VARLIKLARI DÜZENLE -> cüzdan varlıklarını güncel kurlarla risk analizi anahtarlarına (USD, EUR, Gold_Gram_TL) göre TL değerine çevirir
+def risk_varlik_degerleri(wallet_data, exchange_rates):
+    initial_asset_values = {}
+    if not wallet_data or not exchange_rates or "error" in exchange_rates:
+        return initial_asset_values
+
+    for varlik, bilgiler in wallet_data.items():
+        miktar = bilgiler["miktar"]
+        current_price = None
+
+        if varlik == "Dolar":
+            current_price = exchange_rates.get("USDa")
+            risk_analysis_key = "USD"
+        elif varlik == "Euro":
+            current_price = exchange_rates.get("EURa")
+            risk_analysis_key = "EUR"
+        elif varlik == "Altın":
+            current_price = exchange_rates.get("Gold_Gram_TLa")
+            risk_analysis_key = "Gold_Gram_TL"
+        elif varlik == "TL":
+            current_price = 1.0 # TL'nin değeri 1 TL
+            risk_analysis_key = "TL" # TL için risk analizi yapmıyacağımızdan gereksiz
+
+        # Sadece risk analizi yapılacak varlıkları (USD, EUR, Gold_Gram_TL) initial_asset_values'a ekle
+        if current_price is not None and risk_analysis_key in ["USD", "EUR", "Gold_Gram_TL"]:
+            initial_asset_values[risk_analysis_key] = miktar * current_price
+    return initial_asset_values
+
+
+
+# Tüm portföylerin değer ve risk özeti. Portföyler tek sorguda okunur, kurlar bir kez çekilir ve risk tek simülasyonla hepsi için birlikte hesaplanır
+def display_tum_portfoyler():
+    portfoyler = db.load_portfolios()
+    if len(portfoyler) < 2: # tek portföyde özet yukarıdaki analizle aynıdır
+        return
+
+    with st.expander(f"🗂️ Tüm Portföyler ({len(portfoyler)})"):
+        exchange_rates = get_exchange_rates()
+        if "error" in exchange_rates:
+            st.warning(f"Kurlar alınamadı: {exchange_rates['error']}", icon="⚠️")
+            return
+        degerler = {portfoy_id: risk_varlik_degerleri(wallet_data, exchange_rates) for portfoy_id, wallet_data in portfoyler.items()}
+        toplu_sonuc = riskanaliz.toplu_risk_analiz_yap(degerler)
+        if "error" in toplu_sonuc:
+            st.error(f"Toplu risk analizi çalıştırılırken hata oluştu: {toplu_sonuc['error']}")
+            return
+
+        ozet = pd.DataFrame([{
+            "Portföy": portfoy_id,
+            "Değer (TL)": sonuc["initial_value"],
+            "%95 VaR (TL)": sonuc.get("VaR_95", 0.0),
+            "%95 CVaR (TL)": sonuc.get("CVaR_95", 0.0),
+        } for portfoy_id, sonuc in toplu_sonuc["sonuclar"].items()])
+        st.dataframe(ozet.style.format({"Değer (TL)": "{:.2f}", "%95 VaR (TL)": "{:.2f}", "%95 CVaR (TL)": "{:.2f}"}), use_container_width=True, hide_index=True)
 
 
 
 # Anlık Kar/Zarar Hesaplama
 def kar_zarar_anlik(varlik):
-    wallet_data = db.load_wallet_data(varlik)  # Veritabanından cüzdan verilerini al
+    wallet_data = db.load_wallet_data(varlik, portfoy_id=aktif_portfoy())  # Veritabanından cüzdan verilerini al
     toplam_kar_zarar = 0
 
     for varlik, bilgiler in wallet_data.items():
@@ -190,11 +263,47 @@ def kar_zarar_anlik(varlik):
 
 
 
+# GÜNCEL KURLARI GÖSTERME
+def display_guncel_kurlar():
+    guncel = canli_kotasyon_abonesi()["kurlar"] or get_exchange_rates() # akıştan gelen son kurlar, akış henüz veri getirmediyse api isteği
+
+    # Veri kontrolü
+    if "error" in guncel: # hata alırak
+        st.error(guncel["error"])  # Hatayı göster
+    else: # hata yoksa
+        st.markdown("<br>", unsafe_allow_html=True) # boşluk
+        st.markdown("""
+            <h2 style='color: #ffffff; font-family: "Thin 100"; text-align: center;'>
+                🏪  Güncel Piyasa Verileri 🏪
+            </h2>
+        """, unsafe_allow_html=True)
+
+    
+        col_usd, col_eur, col_gold = st.columns(3) #  # 3 sütun oluştur
+        with col_usd:
+            st.subheader("💵 Dolar/TL")
+            st.write(f"**ALIŞ:** {guncel.get('USDa', '--')}") # .get() kullanarak anahtar yoksa hata yerine '--' göster
+            st.write(f"**SATIŞ:** {guncel.get('USDs', '--')}")
+        with col_eur:
+            st.subheader("💶 Euro/TL")  
+            st.write(f"**ALIŞ:** {guncel.get('EURa', '--')}")
+            st.write(f"**SATIŞ:** {guncel.get('EURs', '--')}")
+        with col_gold:
+            st.subheader("🧈 Gram Altın/TL")
+            st.write(f"**ALIŞ:** {guncel.get('Gold_Gram_TLa', '--')}")
+            st.write(f"**SATIŞ:** {guncel.get('Gold_Gram_TLs', '--')}")
+
+
+if hasattr(st, "fragment"): # destekleyen sürümlerde sadece bu bölüm periyodik yenilenir, sayfa yeniden çalışmaz
+    display_guncel_kurlar = st.fragment(run_every=CANLI_YENILEME_SANIYE)(display_guncel_kurlar)
+
+
+
 # GÜNCEL CÜZDANI GÖSTERME
 def display_wallet():
     st.subheader("💼 Cüzdan")
 
-    wallet_data = db.load_wallet_data()
+    wallet_data = db.load_wallet_data(portfoy_id=aktif_portfoy())
 
     if wallet_data:
         for varlik, bilgiler in wallet_data.items():
@@ -206,6 +315,12 @@ def display_wallet():
     else:
         st.info("Henüz cüzdana eklenmiş bir varlık yok.")
 
+    # Gerçekleşen kar/zarar geçmişi işlem defterinden (sadece satışlar, varlık bazında birikimli)
+    kar_zarar_kayitlari = db.kar_zarar_gecmisi(portfoy_id=aktif_portfoy())
+    if kar_zarar_kayitlari:
+        with st.expander("📜 Gerçekleşen Kar/Zarar Geçmişi"):
+            st.dataframe(pd.DataFrame(kar_zarar_kayitlari), use_container_width=True, hide_index=True)
+
 
 
 # Cüzdan dağılımı için pasta grafik oluşturma
@@ -295,6 +410,13 @@ def main():
                 st.rerun()
 
 
+    # Portföy seçimi (bir kurulumda birden çok cüzdan). Yeni ad yazılırsa o portföy seçilir, ilk işlemle veritabanında oluşur
+    st.sidebar.header("🗂️ Portföy")
+    st.session_state.setdefault("aktif_portfoy", db.VARSAYILAN_PORTFOY)
+    st.sidebar.text_input("Yeni Portföy", placeholder="portföy adı", key="yeni_portfoy", on_change=yeni_portfoy_sec)
+    portfoyler = sorted(set(db.portfoy_listesi()) | {db.VARSAYILAN_PORTFOY, aktif_portfoy()}) # henüz işlemi olmayan yeni portföy de listede kalır
+    st.sidebar.selectbox("Portföy", portfoyler, key="aktif_portfoy") # seçim doğrudan oturum durumuna yazılır
+
     st.sidebar.header("📌 Varlık Seçimi")
 
     # Varlık türleri için seçim kutusu
@@ -312,7 +434,24 @@ def main():
         remove_wallet(varlik_turu, miktar, satis_fiyati)
     # Cüzdanı Boşalt butonu
     if st.sidebar.button("0️⃣ Cüzdanı Boşalt"):
-        db.empty_wallet()
+        db.empty_wallet(aktif_portfoy())
+
+    # Geçmiş işlemleri dosyadan toplu içe aktarma (tek tek eklemek yerine)
+    st.sidebar.header("📥 İşlem Geçmişi Aktar")
+    islem_dosyasi = st.sidebar.file_uploader("CSV / ekstre (tarih, varlik, yon, miktar, fiyat)", type=["csv", "txt"])
+    if islem_dosyasi is not None and st.sidebar.button("📥 İçe Aktar"):
+        ilerleme_cubugu = st.sidebar.progress(0.0, text="Aktarılıyor...")
+        sonuc = islem_aktarimi.csv_ice_aktar(
+            islem_dosyasi, ilerleme=lambda oran, eklenen: ilerleme_cubugu.progress(oran, text=f"{eklenen} işlem yazıldı"), portfoy_id=aktif_portfoy())
+        ilerleme_cubugu.empty()
+        if "error" in sonuc:
+            st.sidebar.error(f"İçe aktarma geri alındı: {sonuc['error']}")
+        else:
+            st.sidebar.success(f"{sonuc['eklenen']} işlem aktarıldı, pozisyonlar güncellendi.")
+        if sonuc["hatali"]:
+            st.sidebar.warning(f"{sonuc['hatali']} satır geçersiz olduğu için atlandı.", icon="⚠️")
+            with st.sidebar.expander("Atlanan satırlar"):
+                st.write("\n".join(f"- {h}" for h in sonuc["hatalar"]))
         
 
     st.markdown("""
@@ -329,33 +468,7 @@ def main():
 
 
     with tab1:
-        guncel = get_exchange_rates() # data içerisinden json verileri sözlük şeklinde tutulur
-
-        # Veri kontrolü
-        if "error" in guncel: # hata alırak
-            st.error(guncel["error"])  # Hatayı göster
-        else: # hata yoksa
-            st.markdown("<br>", unsafe_allow_html=True) # boşluk
-            st.markdown("""
-                <h2 style='color: #ffffff; font-family: "Thin 100"; text-align: center;'>
-                    🏪  Güncel Piyasa Verileri 🏪
-                </h2>
-            """, unsafe_allow_html=True)
-
-        
-            col_usd, col_eur, col_gold = st.columns(3) #  # 3 sütun oluştur
-            with col_usd:
-                st.subheader("💵 Dolar/TL")
-                st.write(f"**ALIŞ:** {guncel.get('USDa', '--')}") # .get() kullanarak anahtar yoksa hata yerine '--' göster
-                st.write(f"**SATIŞ:** {guncel.get('USDs', '--')}")
-            with col_eur:
-                st.subheader("💶 Euro/TL")  
-                st.write(f"**ALIŞ:** {guncel.get('EURa', '--')}")
-                st.write(f"**SATIŞ:** {guncel.get('EURs', '--')}")
-            with col_gold:
-                st.subheader("🧈 Gram Altın/TL")
-                st.write(f"**ALIŞ:** {guncel.get('Gold_Gram_TLa', '--')}")
-                st.write(f"**SATIŞ:** {guncel.get('Gold_Gram_TLs', '--')}")
+        display_guncel_kurlar()
 
 
         st.markdown("<br>", unsafe_allow_html=True)
@@ -402,9 +515,13 @@ def main():
                 asset_name_for_chart = chart_asset_names.get(data_key, data_key) # Grafik başlığı için isim al
 
                 if prices: # fiyatlar alındıysa
-                    today = datetime.now().date()
-                    dates = [today - timedelta(days=i) for i in range(len(prices)-1, -1, -1)][::-1] # Tarihleri en eskiden en yeniye sırala
-                    df = pd.DataFrame({'Date': dates, 'Price': prices})
+                    api_tarihleri = period_data.get("tarihler") or [] # api'nin hizaladığı gerçek işlem günleri (en yeni gün başta)
+                    if len(api_tarihleri) == len(prices):
+                        dates = pd.to_datetime(api_tarihleri)
+                    else: # eski api yanıtlarında tarih yoksa günler bugünden geriye sayılır
+                        today = datetime.now().date()
+                        dates = [today - timedelta(days=i) for i in range(len(prices)-1, -1, -1)][::-1]
+                    df = pd.DataFrame({'Date': dates, 'Price': prices}).sort_values('Date') # en eskiden en yeniye
                     asset_dfs[data_key] = df 
                 else:
                     asset_dfs[data_key] = pd.DataFrame({'Date': [], 'Price': []})
@@ -460,37 +577,21 @@ def main():
                 </h1>
             """, unsafe_allow_html=True)
 
-            wallet_data = db.load_wallet_data() # Cüzdan verilerini yükle
-            initial_asset_values = {}
-            exchange_rates = get_exchange_rates() # Güncel fiyatları al
-
-            #RİSK ANALİZİ İÇİN VARLIKLARI DÜZENLE
-            if wallet_data and exchange_rates and "error" not in exchange_rates:
-                for varlik, bilgiler in wallet_data.items():
-                    miktar = bilgiler["miktar"]
-                    current_price = None
-
-                    if varlik == "Dolar":
-                        current_price = exchange_rates.get("USDa")
-                        risk_analysis_key = "USD"
-                    elif varlik == "Euro":
-                        current_price = exchange_rates.get("EURa")
-                        risk_analysis_key = "EUR"
-                    elif varlik == "Altın":
-                        current_price = exchange_rates.get("Gold_Gram_TLa")
-                        risk_analysis_key = "Gold_Gram_TL"
-                    elif varlik == "TL":
-                        current_price = 1.0 # TL'nin değeri 1 TL
-                        risk_analysis_key = "TL" # TL için risk analizi yapmıyacağımızdan gereksiz
-
-                    # Sadece risk analizi yapılacak varlıkları (USD, EUR, Gold_Gram_TL) initial_asset_values'a ekle
-                    if current_price is not None and risk_analysis_key in ["USD", "EUR", "Gold_Gram_TL"]:
-                        initial_asset_values[risk_analysis_key] = miktar * current_price
+            wallet_data = db.load_wallet_data(portfoy_id=aktif_portfoy()) # Cüzdan verilerini yükle
+            initial_asset_values = risk_varlik_degerleri(wallet_data, get_exchange_rates()) # Güncel fiyatlarla risk analizi için varlıkları düzenle
 
 
             # initial_asset_values sözlüğü doluysa risk analizini çalıştır
             if initial_asset_values:
-                sim_results = riskanaliz.risk_analiz_yap(initial_asset_values)
+                # Monte Carlo sürerken parametrik (Cornish-Fisher) ön tahmin gösterilir, simülasyon bitince yer tutucu temizlenir
+                on_tahmin_alani = st.empty()
+                kalibrasyon = riskanaliz.analiz_kalibrasyonu_hazirla(set(initial_asset_values)) # veri çekme ve kalibrasyon bir kez yapılır, ön tahmin ve simülasyon aynısını kullanır
+                on_tahmin = riskanaliz.hizli_risk_analiz_yap(initial_asset_values, kalibrasyon=kalibrasyon)
+                if on_tahmin and "error" not in on_tahmin:
+                    on_tahmin_alani.info(f"Ön tahmin (parametrik) ➡️ %95 VaR: {on_tahmin.get('VaR_95', 0.0):.2f} TL, %95 CVaR: {on_tahmin.get('CVaR_95', 0.0):.2f} TL. Monte Carlo simülasyonu hesaplanıyor...")
+
+                sim_results = riskanaliz.risk_analiz_yap(initial_asset_values, ufuklar=riskanaliz.RISK_UFUKLARI, kalibrasyon=kalibrasyon) # risk yüzeyi için 1/7/30 günlük ufuklar aynı patikalardan
+                on_tahmin_alani.empty()
 
                 # Simülasyon sonuçlarını kontrol et ve göster
                 if sim_results and "error" not in sim_results:
@@ -500,6 +601,13 @@ def main():
                     st.write(f"**%95 VaR (Beklenen Maksimum Kayıp):➡️** {sim_results.get('VaR_95', 0.0):.2f} TL")
                     st.write(f"**%95 CVaR (En Kötü Senaryoların Ortalama Kaybı):➡️** {sim_results.get('CVaR_95', 0.0):.2f} TL")
 
+                    # Aynı simülasyondan elde edilen ufuk x güven seviyesi tablosu (satırlar gün ufku)
+                    if sim_results.get('risk_yuzeyi'):
+                        st.write("**Risk Yüzeyi (Gün Ufku x Güven Seviyesi, TL)**")
+                        risk_yuzeyi_df = pd.DataFrame(sim_results['risk_yuzeyi']).T
+                        risk_yuzeyi_df.index = [f"{ufuk} gün" for ufuk in risk_yuzeyi_df.index]
+                        st.dataframe(risk_yuzeyi_df.style.format("{:.2f}"))
+
                     st.write("**Varlık Risk Sıralaması (Volatiliteye Göre)**")
                     # Risk sıralaması sözlüğünü kontrol etmeden döngüye girme
                     if sim_results.get('risk_ranking'):
@@ -529,6 +637,8 @@ def main():
                 # initial_asset_values sözlüğü boşsa (cüzdanda USD, EUR, Altın yoksa)
                 st.warning("Risk analizi yapmak için cüzdanınızda Dolar, Euro veya Altın bulunmalıdır.", icon="⚠️")
 
+            display_tum_portfoyler() # birden çok portföy varsa hepsinin toplu risk özeti
+
         else:
             st.markdown("""
                 <h3 style='color: #ffcccb; text-align: center;'>
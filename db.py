@@ -1,77 +1,383 @@
 # SQLİTE BAĞLANTISI -> sqlite avantajı yerel dosyada saklama
 import sqlite3
+import threading
+import json
+import os
+from contextlib import contextmanager
+from datetime import datetime
 
 # Tablo adını sabit olarak tanımla
-TABLE_NAME = "wallet"
-
-# SQLite veritabanı dosyasına bağlanma
+TABLE_NAME = "wallet" # güncel pozisyonlar (işlem defterinden türetilen, her işlemle aynı transaction içinde güncellenen özet)
+ISLEM_TABLOSU = "islemler" # sadece ekleme yapılan işlem defteri (her alış/satış bir satır)
+KAR_ZARAR_TABLOSU = "gerceklesen_kar_zarar" # satışların defter oynatılarak hesaplanan kar/zararı (türetilmiş, wallet gibi yeniden yazılabilir)
+ISLEM_YONLERI = ("alis", "satis")
+TOPLU_PARTI_BOYUTU = 5000 # toplu içe aktarımda tek executemany çağrısına giden satır sayısı
+VARSAYILAN_PORTFOY = "varsayilan" # portföy belirtilmeyen çağrılar (ve tek cüzdanlı eski şemadan taşınan satırlar) bu portföye gider
+# islem_ekle sonucundaki "durum" değerleri, arayüz hata metnine göre değil bunlara göre dallanır
+DURUM_TAMAM = "tamam"
+DURUM_GECERSIZ = "gecersiz" # yön, miktar veya fiyat geçersiz
+DURUM_VARLIK_YOK = "varlik_yok" # satılmak istenen varlık portföyde yok
+DURUM_YETERSIZ_MIKTAR = "yetersiz_miktar" # satış miktarı eldekinden fazla
+ACILIS_ZAMANI = "1970-01-01T00:00:00" # defter öncesi cüzdandan yazılan açılış işlemlerinin zamanı, geçmişe tarihli her işlemden önce oynatılır
+DB_YOLU = "cuzdan.db"
+
+_yerel = threading.local() # her iş parçacığının (streamlit oturum iş parçacıkları) kendi uzun ömürlü bağlantısı
+
+# load_wallet_data önbelleği. Sürüm (yerel yazma sayacı, PRAGMA data_version) çiftidir: sayaç bu süreçteki her yazma yolunda artar,
+# data_version ise başka bağlantıların (diğer süreçler dahil) yaptığı commit'lerde değişir. Sürüm değişmedikçe okuma sorgu çalıştırmaz
+_onbellek_kilidi = threading.Lock()
+_yazma_sayaci = 0
+_izleyici = None # (pid, bağlantı) sadece data_version okumak için süreç başına tek bağlantı
+_cuzdan_onbellegi = {"surum": None, "kayitlar": {}} # (portfoy_id, varlik_turu) -> wallet_data
+
+
+# SQLite veritabanı dosyasına bağlanma. Bağlantı iş parçacığı başına bir kez açılır ve sonraki çağrılarda aynısı döner (her çağrıda dosya açma/kilitleme maliyeti olmasın diye)
 def connect_db():
-    conn = sqlite3.connect('cuzdan.db')  # Veritabanı dosyasına bağlan
+    conn = getattr(_yerel, "conn", None)
+    if conn is None or getattr(_yerel, "pid", None) != os.getpid(): # fork sonrası ebeveynin bağlantısı kullanılmaz
+        conn = sqlite3.connect(DB_YOLU, cached_statements=256)  # Veritabanı dosyasına bağlan, hazırlanmış sorgular bağlantı üzerinde önbellekte tutulur
+        conn.execute("PRAGMA journal_mode=WAL") # okuma yazmayı beklemez, yazma tek dosyaya eklenir
+        conn.execute("PRAGMA synchronous=NORMAL") # WAL ile güvenli, her işlemde fsync yapılmaz
+        conn.execute("PRAGMA cache_size=-8000") # ~8 MB sayfa önbelleği
+        conn.execute("PRAGMA mmap_size=67108864") # 64 MB bellek eşlemeli okuma
+        conn.execute("PRAGMA temp_store=MEMORY")
+        _yerel.conn, _yerel.pid = conn, os.getpid()
     return conn
 
 
+# Her yazma yolunun commit sonrası çağırdığı fonksiyon (önbellekteki cüzdan verisini geçersiz kılar)
+def _surumu_artir():
+    global _yazma_sayaci
+    with _onbellek_kilidi:
+        _yazma_sayaci += 1
 
-# veritabanında tablo yoksa ilk kez tablo oluşturur
-def initialize_db():
+
+
+# Önbellek anahtarı olarak kullanılan veri sürümü
+def _veri_surumu():
+    global _izleyici
+    with _onbellek_kilidi:
+        if _izleyici is None or _izleyici[0] != os.getpid(): # fork sonrası kendi izleyici bağlantısı açılır
+            _izleyici = (os.getpid(), sqlite3.connect(DB_YOLU, check_same_thread=False))
+        return _yazma_sayaci, _izleyici[1].execute("PRAGMA data_version").fetchone()[0]
+
+
+
+# Yazma işlemi için transaction açan yardımcı. BEGIN IMMEDIATE ile yazma kilidi en başta alınır, böylece oku-hesapla-yaz arasında başka bir yazar araya giremez
+@contextmanager
+def _yazma_islemi():
     conn = connect_db()
-    cursor = conn.cursor()
-    
-    # Tablo adını sabit kullanarak oluştur
-    cursor.execute(f'''
-        CREATE TABLE IF NOT EXISTS {TABLE_NAME} (
-            varlik_turu TEXT PRIMARY KEY,
-            miktar REAL,
-            maliyet REAL,
-            alis_fiyati REAL,
-            satis_fiyati REAL,
-            kar_zarar REAL
-        )
-    ''')      # Tabloyu wallet olarak oluşturuyoruz en başta sabit olsun diye adı atadık saten
-    
-    conn.commit()
-    conn.close()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    else:
+        conn.commit()
+        _surumu_artir()
+
+
+# Bu iş parçacığının bağlantısını kapatan fonksiyon (uygulama kapanırken veya testlerde dosya değiştirilirken)
+# data_version izleyicisi ve cüzdan önbelleği de bırakılır, dosya değiştiyse eski dosyanın sürümü ve verisi kullanılmasın
+def close_db():
+    global _izleyici
+    conn = getattr(_yerel, "conn", None)
+    if conn is not None:
+        conn.close()
+        _yerel.conn = None
+    with _onbellek_kilidi:
+        if _izleyici is not None and _izleyici[0] == os.getpid():
+            _izleyici[1].close()
+        _izleyici = None
+        _cuzdan_onbellegi["surum"], _cuzdan_onbellegi["kayitlar"] = None, {}
+
+
+
+# veritabanında tablo yoksa ilk kez tablo oluşturur. Tek cüzdanlı eski şema bulunursa aynı transaction içinde portföylü şemaya taşınır
+def initialize_db():
+    with _yazma_islemi() as conn:
+        cursor = conn.cursor()
+
+        # Eski şemada varlik_turu tek başına birincil anahtardı (tek global cüzdan). SQLite birincil anahtar değiştirmeye izin vermediğinden tablo yeniden kurulur
+        wallet_sutunlari = [sutun[1] for sutun in cursor.execute(f"PRAGMA table_info({TABLE_NAME})")]
+        eski_wallet = bool(wallet_sutunlari) and "portfoy_id" not in wallet_sutunlari
+        if eski_wallet:
+            cursor.execute(f"ALTER TABLE {TABLE_NAME} RENAME TO {TABLE_NAME}_eski")
+
+        # Tablo adını sabit kullanarak oluştur. Birincil anahtar (portfoy_id, varlik_turu), WITHOUT ROWID ile satırlar bu anahtara göre fiziksel sıralı tutulur (bir portföyün tüm varlıkları tek aralık okumasıyla gelir)
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS {TABLE_NAME} (
+                portfoy_id TEXT NOT NULL,
+                varlik_turu TEXT NOT NULL,
+                miktar REAL,
+                maliyet REAL,
+                alis_fiyati REAL,
+                satis_fiyati REAL,
+                kar_zarar REAL,
+                PRIMARY KEY (portfoy_id, varlik_turu)
+            ) WITHOUT ROWID
+        ''')      # Tabloyu wallet olarak oluşturuyoruz en başta sabit olsun diye adı atadık saten
+        if eski_wallet:
+            cursor.execute(f"""
+                INSERT INTO {TABLE_NAME} (portfoy_id, varlik_turu, miktar, maliyet, alis_fiyati, satis_fiyati, kar_zarar)
+                SELECT ?, varlik_turu, miktar, maliyet, alis_fiyati, satis_fiyati, kar_zarar FROM {TABLE_NAME}_eski """, (VARSAYILAN_PORTFOY,))
+            cursor.execute(f"DROP TABLE {TABLE_NAME}_eski")
+            print(f"Cüzdan tablosu portföylü şemaya taşındı, mevcut varlıklar '{VARSAYILAN_PORTFOY}' portföyüne aktarıldı.")
+
+        # İşlem defteri: kayıtlar değiştirilmez, sadece eklenir. kar_zarar satışlarda işlem yazıldığı andaki kar/zarar, açılış alışlarında defter öncesinden taşınan kar/zarar (diğer alışlarda NULL)
+        # Geçmişe tarihli işlemler sonraki satışların kar/zararını değiştirebildiğinden raporlar satışlar için KAR_ZARAR_TABLOSU'nu okur
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS {ISLEM_TABLOSU} (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                zaman TEXT NOT NULL,
+                varlik_turu TEXT NOT NULL,
+                yon TEXT NOT NULL CHECK (yon IN ('alis', 'satis')),
+                miktar REAL NOT NULL,
+                fiyat REAL NOT NULL,
+                kar_zarar REAL,
+                portfoy_id TEXT NOT NULL DEFAULT '{VARSAYILAN_PORTFOY}'
+            )
+        ''')
+        if "portfoy_id" not in [sutun[1] for sutun in cursor.execute(f"PRAGMA table_info({ISLEM_TABLOSU})")]: # portföysüz defter: satırlar varsayılan portföye düşer
+            cursor.execute(f"ALTER TABLE {ISLEM_TABLOSU} ADD COLUMN portfoy_id TEXT NOT NULL DEFAULT '{VARSAYILAN_PORTFOY}'")
+        cursor.execute("DROP INDEX IF EXISTS idx_islemler_varlik_zaman") # portföysüz eski indeksler yerine portföy önekli bileşik indeksler
+        cursor.execute("DROP INDEX IF EXISTS idx_islemler_zaman")
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_islemler_portfoy_varlik_zaman ON {ISLEM_TABLOSU} (portfoy_id, varlik_turu, zaman)") # portföy + varlık bazında geçmiş
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_islemler_portfoy_zaman ON {ISLEM_TABLOSU} (portfoy_id, zaman)") # portföyün tarih aralığı sorguları
+
+        # Satış başına gerçekleşen kar/zarar. Defter oynatıldığında etkilenen varlıkların satırları silinip yeniden yazılır, defter satırlarına dokunulmaz
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS {KAR_ZARAR_TABLOSU} (
+                islem_id INTEGER PRIMARY KEY,
+                portfoy_id TEXT NOT NULL,
+                varlik_turu TEXT NOT NULL,
+                kar_zarar REAL
+            )
+        ''')
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_kar_zarar_portfoy_varlik ON {KAR_ZARAR_TABLOSU} (portfoy_id, varlik_turu)")
+        cursor.execute(f"""
+            INSERT OR IGNORE INTO {KAR_ZARAR_TABLOSU} (islem_id, portfoy_id, varlik_turu, kar_zarar)
+            SELECT id, portfoy_id, varlik_turu, kar_zarar FROM {ISLEM_TABLOSU} WHERE yon = 'satis' """) # tablodan önceki satışlar defterdeki değerleriyle bir kez taşınır
+
+        # Defter öncesinden kalan cüzdan satırları için açılış işlemi yazılır (bir kez), böylece defter ile pozisyonlar tutarlı başlar
+        # Açılış ACILIS_ZAMANI'na tarihlenir (sonradan aktarılan eski işlemler açılıştan sonra oynatılır), cüzdandaki kar_zarar da açılış satırında gerçekleşmiş kar/zarar olarak taşınır
+        if cursor.execute(f"SELECT 1 FROM {ISLEM_TABLOSU} LIMIT 1").fetchone() is None:
+            cursor.execute(f"""
+                INSERT INTO {ISLEM_TABLOSU} (zaman, portfoy_id, varlik_turu, yon, miktar, fiyat, kar_zarar)
+                SELECT ?, portfoy_id, varlik_turu, 'alis', COALESCE(miktar, 0), COALESCE(maliyet, 0), NULLIF(COALESCE(kar_zarar, 0), 0) FROM {TABLE_NAME}
+                WHERE miktar > 0 OR COALESCE(kar_zarar, 0) != 0 """, (ACILIS_ZAMANI,))
+
+
+
+# İşlem zaman damgası (ISO biçimi metin olarak sıralanabilir)
+def _simdi():
+    return datetime.now().isoformat(timespec="seconds")
+
+
+
+# Bir işlemin pozisyona etkisini hesaplayan fonksiyon. pozisyon None ise varlık cüzdanda yok demektir
+# Alışta ağırlıklı ortalama maliyet, satışta (satılan tutar - eldeki toplam maliyet) kar/zarar hesabı uygulamadaki eski formüllerle aynıdır
+# (yeni_pozisyon, kar_zarar, hata) döner, hata (durum, mesaj) çiftidir. Pozisyon kapanırsa yeni_pozisyon["miktar"] 0 olur
+# acilis_kar_zarar açılış işleminde taşınan (defter öncesi) gerçekleşmiş kar/zarardır, yeni açılan pozisyonun başlangıç kar_zarar değeri olur
+def _pozisyona_uygula(pozisyon, yon, miktar, fiyat, acilis_kar_zarar=None):
+    if yon == "alis":
+        if pozisyon:
+            toplam_maliyet = (pozisyon["miktar"] * pozisyon["maliyet"]) + (miktar * fiyat)
+            yeni_miktar = pozisyon["miktar"] + miktar
+            yeni_maliyet = toplam_maliyet / yeni_miktar if yeni_miktar else 0
+            kar_zarar = pozisyon["kar_zarar"]
+        else:
+            yeni_miktar, yeni_maliyet, kar_zarar = miktar, fiyat, acilis_kar_zarar or 0
+        return {"miktar": yeni_miktar, "maliyet": yeni_maliyet, "alis_fiyati": fiyat, "satis_fiyati": None, "kar_zarar": kar_zarar}, None, None
+
+    if not pozisyon:
+        return None, None, (DURUM_VARLIK_YOK, "Cüzdanda bu varlık yok")
+    if miktar > pozisyon["miktar"]:
+        return None, None, (DURUM_YETERSIZ_MIKTAR, f"Yetersiz miktar. Mevcut miktar: {pozisyon['miktar']}")
+    kar_zarar = (miktar * fiyat) - (pozisyon["miktar"] * pozisyon["maliyet"]) # son işlemle beraber toplam kar-zarar durumu
+    return dict(pozisyon, miktar=pozisyon["miktar"] - miktar, kar_zarar=kar_zarar), kar_zarar, None
+
+
+
+# İşlem defterine alış/satış yazan ve cüzdandaki pozisyonu aynı transaction içinde güncelleyen fonksiyon
+# Başarılıysa güncel pozisyonu (ve o işlemin kar_zarar değerini), değilse {"error": ...} döndürür. Her iki durumda "durum" anahtarı DURUM_* sabitlerinden biridir
+def islem_ekle(varlik_turu, yon, miktar, fiyat, zaman=None, portfoy_id=VARSAYILAN_PORTFOY):
+    if yon not in ISLEM_YONLERI:
+        return {"error": f"Geçersiz işlem yönü: {yon}", "durum": DURUM_GECERSIZ}
+    if not miktar or miktar <= 0 or fiyat is None or fiyat < 0:
+        return {"error": "Miktar pozitif, fiyat boş olmamalı", "durum": DURUM_GECERSIZ}
+
+    with _yazma_islemi() as conn:
+        satir = conn.execute(f"SELECT miktar, maliyet, alis_fiyati, satis_fiyati, kar_zarar FROM {TABLE_NAME} WHERE portfoy_id = ? AND varlik_turu = ?",
+                             (portfoy_id, varlik_turu)).fetchone()
+        pozisyon = dict(zip(("miktar", "maliyet", "alis_fiyati", "satis_fiyati", "kar_zarar"), (d if d is not None else 0 for d in satir))) if satir else None # load_wallet_data gibi None -> 0
+        yeni, islem_kar_zarar, hata = _pozisyona_uygula(pozisyon, yon, miktar, fiyat)
+        if hata:
+            return {"error": hata[1], "durum": hata[0]} # hiçbir şey yazılmadan transaction kapanır
+
+        imlec = conn.execute(f"INSERT INTO {ISLEM_TABLOSU} (portfoy_id, zaman, varlik_turu, yon, miktar, fiyat, kar_zarar) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                             (portfoy_id, zaman or _simdi(), varlik_turu, yon, miktar, fiyat, islem_kar_zarar))
+        if yon == "satis":
+            conn.execute(f"INSERT INTO {KAR_ZARAR_TABLOSU} (islem_id, portfoy_id, varlik_turu, kar_zarar) VALUES (?, ?, ?, ?)",
+                         (imlec.lastrowid, portfoy_id, varlik_turu, islem_kar_zarar))
+        if yeni["miktar"] == 0:
+            conn.execute(f"DELETE FROM {TABLE_NAME} WHERE portfoy_id = ? AND varlik_turu = ?", (portfoy_id, varlik_turu)) # pozisyon kapandı
+        else:
+            conn.execute(f"""
+                INSERT INTO {TABLE_NAME} (portfoy_id, varlik_turu, miktar, maliyet, alis_fiyati, satis_fiyati, kar_zarar) VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(portfoy_id, varlik_turu) DO UPDATE SET miktar = excluded.miktar, maliyet = excluded.maliyet, alis_fiyati = excluded.alis_fiyati,
+                    satis_fiyati = excluded.satis_fiyati, kar_zarar = excluded.kar_zarar """,
+                (portfoy_id, varlik_turu, yeni["miktar"], yeni["maliyet"], yeni["alis_fiyati"], yeni["satis_fiyati"], yeni["kar_zarar"]))
+
+    return dict(yeni, islem_kar_zarar=islem_kar_zarar, durum=DURUM_TAMAM)
+
+
+
+# Verilen varlıkların pozisyonlarını işlem defterini zaman sırasıyla baştan oynatarak yeniden hesaplayan fonksiyon (açık transaction içinde çağrılır)
+# Geçmişe tarihli işlemler eklendiğinde sonraki satışların kar_zarar değerleri de değişeceği için bu varlıkların KAR_ZARAR_TABLOSU satırları da yeniden yazılır (defter satırları değişmez)
+# Bir satış o ana kadarki miktarı aşıyorsa ValueError fırlatır (transaction geri alınsın diye)
+def _pozisyonlari_yeniden_hesapla(conn, varliklar, portfoy_id=VARSAYILAN_PORTFOY):
+    pozisyonlar, kar_zarar_satirlari = {}, []
+    for varlik_turu in varliklar:
+        pozisyon = None
+        for islem_id, zaman, yon, miktar, fiyat, kayitli_kar_zarar in conn.execute(
+                f"SELECT id, zaman, yon, miktar, fiyat, kar_zarar FROM {ISLEM_TABLOSU} WHERE portfoy_id = ? AND varlik_turu = ? ORDER BY zaman, id", (portfoy_id, varlik_turu)):
+            yeni, islem_kar_zarar, hata = _pozisyona_uygula(pozisyon, yon, miktar, fiyat, acilis_kar_zarar=kayitli_kar_zarar if yon == "alis" else None) # alışlarda kar_zarar sadece açılış satırında dolu
+            if hata:
+                raise ValueError(f"{varlik_turu} {zaman}: {hata[1]}")
+            if yon == "satis":
+                kar_zarar_satirlari.append((islem_id, portfoy_id, varlik_turu, islem_kar_zarar))
+            pozisyon = yeni if yeni["miktar"] != 0 else None # kapanan pozisyon sonraki alışta sıfırdan başlar
+        pozisyonlar[varlik_turu] = pozisyon
+
+    conn.executemany(f"DELETE FROM {KAR_ZARAR_TABLOSU} WHERE portfoy_id = ? AND varlik_turu = ?", [(portfoy_id, v) for v in varliklar])
+    conn.executemany(f"INSERT INTO {KAR_ZARAR_TABLOSU} (islem_id, portfoy_id, varlik_turu, kar_zarar) VALUES (?, ?, ?, ?)", kar_zarar_satirlari)
+    conn.executemany(f"DELETE FROM {TABLE_NAME} WHERE portfoy_id = ? AND varlik_turu = ?", [(portfoy_id, v) for v in varliklar])
+    conn.executemany(f"INSERT INTO {TABLE_NAME} (portfoy_id, varlik_turu, miktar, maliyet, alis_fiyati, satis_fiyati, kar_zarar) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                     [(portfoy_id, v, p["miktar"], p["maliyet"], p["alis_fiyati"], p["satis_fiyati"], p["kar_zarar"]) for v, p in pozisyonlar.items() if p])
+    return pozisyonlar
+
+
+
+# Çok sayıda işlemi tek transaction içinde deftere yazan fonksiyon. islemler (zaman, varlik_turu, yon, miktar, fiyat) demetleri üreten herhangi bir iterable olabilir,
+# bellekte toplanmadan parti_boyutu'luk parçalar halinde executemany ile yazılır. Pozisyonlar her satırda değil en sonda bir kez, etkilenen varlıklar için hesaplanır
+# ilerleme verilirse her partiden sonra o ana kadar yazılan satır sayısıyla çağrılır. Hata olursa hiçbir satır yazılmaz ve {"error": ...} döner
+def islemleri_toplu_ekle(islemler, parti_boyutu=TOPLU_PARTI_BOYUTU, ilerleme=None, portfoy_id=VARSAYILAN_PORTFOY):
+    eklenen, varliklar = 0, set()
+    try:
+        with _yazma_islemi() as conn:
+            parti = []
+            for islem in islemler:
+                parti.append((portfoy_id, *islem))
+                varliklar.add(islem[1])
+                if len(parti) >= parti_boyutu:
+                    conn.executemany(f"INSERT INTO {ISLEM_TABLOSU} (portfoy_id, zaman, varlik_turu, yon, miktar, fiyat) VALUES (?, ?, ?, ?, ?, ?)", parti)
+                    eklenen += len(parti)
+                    parti = []
+                    if ilerleme:
+                        ilerleme(eklenen)
+            if parti:
+                conn.executemany(f"INSERT INTO {ISLEM_TABLOSU} (portfoy_id, zaman, varlik_turu, yon, miktar, fiyat) VALUES (?, ?, ?, ?, ?, ?)", parti)
+                eklenen += len(parti)
+                if ilerleme:
+                    ilerleme(eklenen)
+            pozisyonlar = _pozisyonlari_yeniden_hesapla(conn, sorted(varliklar), portfoy_id)
+    except (ValueError, sqlite3.Error) as e:
+        print(f"Uyarı: Toplu işlem aktarımı geri alındı: {e}")
+        return {"error": str(e)}
+
+    return {"eklenen": eklenen, "pozisyonlar": pozisyonlar}
+
+
+
+_KAR_ZARAR_IFADESI = "CASE WHEN i.yon = 'satis' THEN g.kar_zarar ELSE i.kar_zarar END" # satışlarda oynatılmış değer, açılış alışlarında defterdeki taşınan değer
+
+
+
+# İşlem defterini zamana göre sıralı döndüren fonksiyon. varlik_turu ve tarih aralığı (ISO metin, bitis dahil) ile süzülebilir
+def islem_gecmisi(varlik_turu=None, baslangic=None, bitis=None, portfoy_id=VARSAYILAN_PORTFOY):
+    kosullar, parametreler = ["i.portfoy_id = ?"], [portfoy_id]
+    if varlik_turu is not None:
+        kosullar.append("i.varlik_turu = ?"); parametreler.append(varlik_turu)
+    if baslangic is not None:
+        kosullar.append("i.zaman >= ?"); parametreler.append(baslangic)
+    if bitis is not None:
+        kosullar.append("i.zaman <= ?"); parametreler.append(bitis)
+    where = f"WHERE {' AND '.join(kosullar)}"
+
+    cursor = connect_db().execute(f"""
+        SELECT i.zaman, i.varlik_turu, i.yon, i.miktar, i.fiyat, {_KAR_ZARAR_IFADESI}
+        FROM {ISLEM_TABLOSU} i LEFT JOIN {KAR_ZARAR_TABLOSU} g ON g.islem_id = i.id {where} ORDER BY i.zaman, i.id """, parametreler)
+    return [dict(zip(("zaman", "varlik_turu", "yon", "miktar", "fiyat", "kar_zarar"), satir)) for satir in cursor]
+
+
+
+# Gerçekleşen kar/zarar geçmişi: her satış işlemi (ve defter öncesinden taşınan açılış kar/zararı) ile varlık bazında birikimli toplamı. Defter baştan oynatılmaz, toplam pencere fonksiyonuyla SQL içinde alınır
+def kar_zarar_gecmisi(varlik_turu=None, portfoy_id=VARSAYILAN_PORTFOY):
+    where, parametreler = ("AND i.varlik_turu = ?", (portfoy_id, varlik_turu)) if varlik_turu is not None else ("", (portfoy_id,))
+    cursor = connect_db().execute(f"""
+        SELECT zaman, varlik_turu, miktar, fiyat, kar_zarar,
+               SUM(kar_zarar) OVER (PARTITION BY varlik_turu ORDER BY zaman, id) AS birikimli_kar_zarar
+        FROM (SELECT i.id, i.zaman, i.varlik_turu, i.miktar, i.fiyat, {_KAR_ZARAR_IFADESI} AS kar_zarar
+              FROM {ISLEM_TABLOSU} i LEFT JOIN {KAR_ZARAR_TABLOSU} g ON g.islem_id = i.id
+              WHERE i.portfoy_id = ? AND (i.yon = 'satis' OR i.kar_zarar IS NOT NULL) {where})
+        ORDER BY zaman, id """, parametreler)
+    return [dict(zip(("zaman", "varlik_turu", "miktar", "fiyat", "kar_zarar", "birikimli_kar_zarar"), satir)) for satir in cursor]
 
 
 
 # Veritabanında cüzdan verilerini kaydetme
-def save_wallet_data(varlik_turu, miktar, maliyet, alis_fiyati, satis_fiyati):
+def save_wallet_data(varlik_turu, miktar, maliyet, alis_fiyati, satis_fiyati, portfoy_id=VARSAYILAN_PORTFOY):
 
     conn = connect_db()
     cursor = conn.cursor()
     
     # Varlık türü veritabanında var mı kontrol et
-    cursor.execute(f"SELECT * FROM {TABLE_NAME} WHERE varlik_turu = ?", (varlik_turu,))    
+    cursor.execute(f"SELECT * FROM {TABLE_NAME} WHERE portfoy_id = ? AND varlik_turu = ?", (portfoy_id, varlik_turu))    
     bulunan_varlik = cursor.fetchone() # varsa ilgili satırı tuple olarak döndürür
     
     if bulunan_varlik:
         # Eğer varlık zaten varsa, miktar ve maliyeti güncelle
-        cursor.execute(f"UPDATE {TABLE_NAME} SET miktar = ?, maliyet = ?, alis_fiyati = ?, satis_fiyati = ? WHERE varlik_turu = ?", 
-                       (miktar, maliyet, alis_fiyati, satis_fiyati, varlik_turu))
+        cursor.execute(f"UPDATE {TABLE_NAME} SET miktar = ?, maliyet = ?, alis_fiyati = ?, satis_fiyati = ? WHERE portfoy_id = ? AND varlik_turu = ?", 
+                       (miktar, maliyet, alis_fiyati, satis_fiyati, portfoy_id, varlik_turu))
     else:
         # Yeni varlık ekle
-        cursor.execute(f"INSERT INTO {TABLE_NAME} (varlik_turu, miktar, maliyet, alis_fiyati, satis_fiyati) VALUES (?, ?, ?, ?, ?)", 
-                       (varlik_turu, miktar, maliyet, alis_fiyati, satis_fiyati))
+        cursor.execute(f"INSERT INTO {TABLE_NAME} (portfoy_id, varlik_turu, miktar, maliyet, alis_fiyati, satis_fiyati) VALUES (?, ?, ?, ?, ?, ?)", 
+                       (portfoy_id, varlik_turu, miktar, maliyet, alis_fiyati, satis_fiyati))
+
+    conn.commit() # işlemleri kaydet (bağlantı açık kalır, tekrar kullanılır)
+    _surumu_artir()
+
 
-    conn.commit() # işlemleri kaydet
-    conn.close() # bağlantıyı kapat
 
+_WALLET_SUTUNLARI = "varlik_turu, miktar, maliyet, alis_fiyati, satis_fiyati, kar_zarar" # satır indeksleri aşağıdaki okumaya göre sabit sırada seçilir
 
 
-# Veritabanından cüzdan verilerini okuma
-def load_wallet_data(varlik_turu=None): 
+
+# Veritabanından cüzdan verilerini okuma. Veri sürümü son okumadan beri değişmediyse sorgu çalıştırılmaz, önbellekteki sözlüğün kopyası döner
+def load_wallet_data(varlik_turu=None, portfoy_id=VARSAYILAN_PORTFOY): 
     
+    anahtar = (portfoy_id, varlik_turu)
+    surum = _veri_surumu()
+    with _onbellek_kilidi:
+        if _cuzdan_onbellegi["surum"] != surum: # araya yazma girdi, tüm kayıtlar eskidi
+            _cuzdan_onbellegi["surum"], _cuzdan_onbellegi["kayitlar"] = surum, {}
+        onbellekteki = _cuzdan_onbellegi["kayitlar"].get(anahtar)
+    if onbellekteki is not None:
+        return {varlik: dict(bilgiler) for varlik, bilgiler in onbellekteki.items()} # çağıran değiştirse de önbellek bozulmasın
+
     conn = connect_db()
     cursor = conn.cursor()
 
     if varlik_turu:
         # Belirli bir varlık türünü getir
-        cursor.execute(f"SELECT * FROM {TABLE_NAME} WHERE varlik_turu = ?", (varlik_turu,))
+        cursor.execute(f"SELECT {_WALLET_SUTUNLARI} FROM {TABLE_NAME} WHERE portfoy_id = ? AND varlik_turu = ?", (portfoy_id, varlik_turu))
     else:
-        # Tüm varlıkları getir
-        cursor.execute(f"SELECT * FROM {TABLE_NAME}")
+        # Portföydeki tüm varlıkları getir
+        cursor.execute(f"SELECT {_WALLET_SUTUNLARI} FROM {TABLE_NAME} WHERE portfoy_id = ?", (portfoy_id,))
 
     data = cursor.fetchall()  # Bu bir tuple döndürecektir varlığa ait bilgileri
-    conn.close()
 
     # Burada gelen veriyi bir sözlüğe dönüştürün
     wallet_data = {}
@@ -89,58 +395,79 @@ def load_wallet_data(varlik_turu=None):
             "satis_fiyati": satis_fiyati,
             "kar_zarar": kar_zarar
         }
+
+    with _onbellek_kilidi:
+        if _cuzdan_onbellegi["surum"] == surum: # okuma sürerken yazma olduysa eski sürümle kaydedilmez
+            _cuzdan_onbellegi["kayitlar"][anahtar] = {varlik: dict(bilgiler) for varlik, bilgiler in wallet_data.items()}
     return wallet_data   
 
 
 
+# Birden çok portföyü tek sorguda okuyan fonksiyon. {portfoy_id: {varlik_turu: {...load_wallet_data ile aynı alanlar}}} döner
+# portfoy_idleri verilmezse tüm portföyler gelir. Liste tek parametre olarak json dizisi şeklinde gönderilir (yüzlerce id için SQLite parametre sınırına takılmaz)
+def load_portfolios(portfoy_idleri=None):
+    conn = connect_db()
+    if portfoy_idleri is None:
+        cursor = conn.execute(f"SELECT portfoy_id, {_WALLET_SUTUNLARI} FROM {TABLE_NAME} ORDER BY portfoy_id")
+    else:
+        cursor = conn.execute(f"SELECT portfoy_id, {_WALLET_SUTUNLARI} FROM {TABLE_NAME} WHERE portfoy_id IN (SELECT value FROM json_each(?)) ORDER BY portfoy_id",
+                              (json.dumps(list(portfoy_idleri)),))
 
-# Veritabanında varlık miktarını güncelleme -> cüzdanda satış sonrası varlık miktarı değişikliği
-def update_wallet_data(varlik_turu, yeni_miktar, yeni_kar_zarar):
+    portfoyler = {portfoy_id: {} for portfoy_id in (portfoy_idleri or [])} # istenip boş olan portföyler de boş sözlükle döner
+    for portfoy_id, varlik_turu, *degerler in cursor:
+        portfoyler.setdefault(portfoy_id, {})[varlik_turu] = dict(zip(("miktar", "maliyet", "alis_fiyati", "satis_fiyati", "kar_zarar"),
+                                                                      (d if d is not None else 0 for d in degerler)))
+    return portfoyler
 
-    try:
-        conn = connect_db()
-        cursor = conn.cursor()
 
-        cursor.execute(f"""
-            UPDATE {TABLE_NAME} SET miktar = ?, kar_zarar = ? WHERE varlik_turu = ? """, (yeni_miktar, yeni_kar_zarar, varlik_turu))
 
-        conn.commit()
+# Cüzdanında varlık veya defterinde işlem bulunan portföylerin listesi
+def portfoy_listesi():
+    cursor = connect_db().execute(f"SELECT portfoy_id FROM {TABLE_NAME} UNION SELECT DISTINCT portfoy_id FROM {ISLEM_TABLOSU} ORDER BY portfoy_id")
+    return [satir[0] for satir in cursor]
+
+
 
-    finally:
-        if conn:
-            conn.close()  # Bağlantıyı kapat
+
+# Veritabanında varlık miktarını güncelleme -> cüzdanda satış sonrası varlık miktarı değişikliği
+def update_wallet_data(varlik_turu, yeni_miktar, yeni_kar_zarar, portfoy_id=VARSAYILAN_PORTFOY):
+
+    conn = connect_db()
+    with conn: # hata olursa işlem geri alınır, olmazsa kaydedilir
+        conn.execute(f"""
+            UPDATE {TABLE_NAME} SET miktar = ?, kar_zarar = ? WHERE portfoy_id = ? AND varlik_turu = ? """, (yeni_miktar, yeni_kar_zarar, portfoy_id, varlik_turu))
+    _surumu_artir()
 
 
 
 # Veritabanından varlık silme -> varlık miktarı satış sonrası sıfıra inince silme
-def remove_wallet_data(varlik_turu):
+def remove_wallet_data(varlik_turu, portfoy_id=VARSAYILAN_PORTFOY):
     
-    try:
-        conn = connect_db()
-        cursor = conn.cursor()
-
+    conn = connect_db()
+    with conn:
         # Cüzdandaki varlığı veritabanından sil
-        cursor.execute(f"DELETE FROM {TABLE_NAME} WHERE varlik_turu = ?", (varlik_turu,))
-        conn.commit()
+        conn.execute(f"DELETE FROM {TABLE_NAME} WHERE portfoy_id = ? AND varlik_turu = ?", (portfoy_id, varlik_turu))
+    _surumu_artir()
 
-    finally:
-        if conn:
-            conn.close()  # Bağlantıyı kapat  
 
 
-
-def empty_wallet():
+def empty_wallet(portfoy_id=VARSAYILAN_PORTFOY):
     """
-    Cüzdandaki tüm varlıkları siler (veritabanındaki tüm kayıtları temizler).
+    Portföydeki tüm varlıkları kapatır (diğer portföyler etkilenmez). İşlem defteri silinmez: her açık pozisyon için
+    maliyet fiyatından bir kapanış satışı deftere eklenir (gerçekleşen kar/zarar değişmez), sonra türetilmiş cüzdan satırları temizlenir.
     """
     try:
-        conn = connect_db()  # Veritabanına bağlan
-        cursor = conn.cursor()
-
-        # Tüm varlıkları sil
-        cursor.execute(f"DELETE FROM {TABLE_NAME}")
-        conn.commit()  # Değişiklikleri kaydet
-        conn.close()  # Bağlantıyı kapat
+        with _yazma_islemi() as conn:
+            zaman = _simdi()
+            for varlik_turu, miktar, maliyet, alis_fiyati, satis_fiyati, kar_zarar in conn.execute(
+                    f"SELECT {_WALLET_SUTUNLARI} FROM {TABLE_NAME} WHERE portfoy_id = ? AND miktar > 0", (portfoy_id,)).fetchall():
+                pozisyon = {"miktar": miktar, "maliyet": maliyet or 0, "alis_fiyati": alis_fiyati or 0, "satis_fiyati": satis_fiyati or 0, "kar_zarar": kar_zarar or 0}
+                _, islem_kar_zarar, _ = _pozisyona_uygula(pozisyon, "satis", miktar, pozisyon["maliyet"]) # tamamı maliyetten satılır, kar/zarar 0
+                imlec = conn.execute(f"INSERT INTO {ISLEM_TABLOSU} (portfoy_id, zaman, varlik_turu, yon, miktar, fiyat, kar_zarar) VALUES (?, ?, ?, 'satis', ?, ?, ?)",
+                                     (portfoy_id, zaman, varlik_turu, miktar, pozisyon["maliyet"], islem_kar_zarar))
+                conn.execute(f"INSERT INTO {KAR_ZARAR_TABLOSU} (islem_id, portfoy_id, varlik_turu, kar_zarar) VALUES (?, ?, ?, ?)",
+                             (imlec.lastrowid, portfoy_id, varlik_turu, islem_kar_zarar))
+            conn.execute(f"DELETE FROM {TABLE_NAME} WHERE portfoy_id = ?", (portfoy_id,)) # cüzdan defterden türetildiği için defterle tutarlı kalır
 
         return True  # İşlem başarılı
     except Exception as e:
@@ -0,0 +1,127 @@
+import csv
+import io
+from datetime import datetime
+
+import db
+
+# Geçmiş alış/satış işlemlerini CSV (veya CSV olarak dışa aktarılmış aracı kurum ekstresi) dosyasından toplu olarak işlem defterine aktarır
+# Dosya satır satır okunur, her satır doğrulanıp normalize edilir ve db.islemleri_toplu_ekle ile tek transaction içinde partiler halinde yazılır
+# Beklenen sütunlar (başlık satırı zorunlu, sıra önemsiz): tarih, varlik, yon, miktar, fiyat
+#   tarih,varlik,yon,miktar,fiyat
+#   2023-01-05,Dolar,alis,100,18.75
+#   05.03.2023;USD;SAT;50;19,10      <- ';' ayraç ve ondalık virgül de kabul edilir
+
+SUTUN_ADLARI = { # dosyadaki başlık -> defterdeki alan
+    "tarih": "zaman", "zaman": "zaman", "date": "zaman", "islem tarihi": "zaman", "işlem tarihi": "zaman",
+    "varlik": "varlik_turu", "varlık": "varlik_turu", "varlik_turu": "varlik_turu", "asset": "varlik_turu", "sembol": "varlik_turu",
+    "yon": "yon", "yön": "yon", "islem": "yon", "işlem": "yon", "side": "yon",
+    "miktar": "miktar", "adet": "miktar", "quantity": "miktar",
+    "fiyat": "fiyat", "price": "fiyat", "kur": "fiyat",
+}
+VARLIK_ADLARI = { # ekstrelerde görülen kodlar -> uygulamadaki varlık türleri (app.VARLIK_TURLERI)
+    "tl": "TL", "try": "TL",
+    "altın": "Altın", "altin": "Altın", "xau": "Altın", "gold": "Altın", "gram altın": "Altın", "gram altin": "Altın",
+    "dolar": "Dolar", "usd": "Dolar",
+    "euro": "Euro", "eur": "Euro",
+}
+YON_ADLARI = {"alis": "alis", "alış": "alis", "al": "alis", "buy": "alis", "a": "alis",
+              "satis": "satis", "satış": "satis", "sat": "satis", "sell": "satis", "s": "satis"}
+TARIH_BICIMLERI = ("%Y-%m-%d", "%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d %H:%M", "%d.%m.%Y", "%d.%m.%Y %H:%M:%S", "%d.%m.%Y %H:%M", "%d/%m/%Y")
+HATA_SINIRI = 100 # rapora eklenen en fazla hatalı satır sayısı (geri kalanlar sadece sayılır)
+
+
+
+_ASCII_KARSILIKLARI = str.maketrans("ışçğöü", "iscgou")
+
+
+
+# Başlık ve kodları sözlüklerde aranacak biçime getiren fonksiyon. Küçük harfe çevrilip Türkçe harfler ASCII karşılıklarına indirilir (sözlüklerde ASCII yazımlar bulunur)
+# str.lower() "İ" harfini "i" + birleşik nokta, "I" harfini "i" yapar ("İşlem" -> "i̇şlem", "ALIŞ" -> "aliş"), bu yüzden büyük harfli ekstreler de aynı anahtara düşer
+def _anahtar(metin):
+    return metin.strip().replace("İ", "i").lower().translate(_ASCII_KARSILIKLARI)
+
+
+
+# Ondalık virgüllü veya binlik ayraçlı sayıyı ("1.234,50", "19,10", "1,234.50") float'a çeviren fonksiyon
+def _sayi(metin):
+    metin = metin.strip().replace(" ", "")
+    if "," in metin and "." in metin:
+        metin = metin.replace(".", "").replace(",", ".") if metin.rfind(",") > metin.rfind(".") else metin.replace(",", "")
+    elif "," in metin:
+        metin = metin.replace(",", ".")
+    return float(metin)
+
+
+
+# Tarihi işlem defterindeki ISO biçimine çeviren fonksiyon
+def _tarih(metin):
+    metin = metin.strip()
+    for bicim in TARIH_BICIMLERI:
+        try:
+            return datetime.strptime(metin, bicim).isoformat(timespec="seconds")
+        except ValueError:
+            continue
+    raise ValueError(f"tanınmayan tarih: {metin!r}")
+
+
+
+# Bir CSV satırını doğrulayıp (zaman, varlik_turu, yon, miktar, fiyat) demetine çeviren fonksiyon, geçersizse ValueError fırlatır
+def _satiri_dogrula(satir):
+    varlik = VARLIK_ADLARI.get(_anahtar(satir["varlik_turu"]))
+    if varlik is None:
+        raise ValueError(f"bilinmeyen varlık: {satir['varlik_turu']!r}")
+    yon = YON_ADLARI.get(_anahtar(satir["yon"]))
+    if yon is None:
+        raise ValueError(f"bilinmeyen işlem yönü: {satir['yon']!r}")
+    miktar, fiyat = _sayi(satir["miktar"]), _sayi(satir["fiyat"])
+    if not miktar > 0:
+        raise ValueError("miktar pozitif olmalı")
+    if fiyat < 0:
+        raise ValueError("fiyat negatif olamaz")
+    return (_tarih(satir["zaman"]), varlik, yon, miktar, fiyat)
+
+
+
+# Metin akışındaki CSV'yi satır satır okuyup geçerli işlemleri üreten generator. Geçersiz satırlar atlanır ve rapor sözlüğüne yazılır
+def csv_islemlerini_oku(metin_akisi, rapor):
+    ilk_satir = metin_akisi.readline()
+    ayrac = ";" if ilk_satir.count(";") > ilk_satir.count(",") else "," # ondalık virgüllü ekstreler genelde ';' ayraçlıdır
+    basliklar = [SUTUN_ADLARI.get(_anahtar(b)) for b in next(csv.reader([ilk_satir], delimiter=ayrac))]
+    eksik = {"zaman", "varlik_turu", "yon", "miktar", "fiyat"} - set(basliklar)
+    if eksik:
+        raise ValueError(f"CSV başlığında eksik sütunlar: {', '.join(sorted(eksik))}")
+
+    for satir_no, degerler in enumerate(csv.reader(metin_akisi, delimiter=ayrac), start=2):
+        if not degerler or not any(d.strip() for d in degerler):
+            continue # boş satır
+        try:
+            yield _satiri_dogrula({alan: deger for alan, deger in zip(basliklar, degerler) if alan})
+            rapor["gecerli"] += 1
+        except (ValueError, KeyError) as e:
+            rapor["hatali"] += 1
+            if len(rapor["hatalar"]) < HATA_SINIRI:
+                rapor["hatalar"].append(f"Satır {satir_no}: {e}")
+
+
+
+# İkili dosya nesnesinden (açık dosya veya streamlit UploadedFile) işlemleri içe aktaran fonksiyon
+# ilerleme verilirse okunan bayt oranıyla (0-1) ve o ana kadar yazılan satır sayısıyla çağrılır
+def csv_ice_aktar(dosya, ilerleme=None, parti_boyutu=db.TOPLU_PARTI_BOYUTU, portfoy_id=db.VARSAYILAN_PORTFOY):
+    rapor = {"gecerli": 0, "hatali": 0, "hatalar": []}
+    dosya.seek(0, io.SEEK_END)
+    toplam_bayt = dosya.tell() or 1
+    dosya.seek(0)
+    metin_akisi = io.TextIOWrapper(dosya, encoding="utf-8-sig", newline="") # BOM'lu Excel çıktıları da okunur
+
+    def _ilerleme(eklenen):
+        if ilerleme:
+            ilerleme(min(dosya.tell() / toplam_bayt, 1.0), eklenen)
+
+    try:
+        sonuc = db.islemleri_toplu_ekle(csv_islemlerini_oku(metin_akisi, rapor), parti_boyutu=parti_boyutu, ilerleme=_ilerleme, portfoy_id=portfoy_id)
+    except (ValueError, UnicodeDecodeError, csv.Error) as e: # başlık veya dosya biçimi hatası
+        return {"error": str(e), **rapor}
+    finally:
+        metin_akisi.detach() # UploadedFile kapatılmasın
+
+    return {**sonuc, **rapor}
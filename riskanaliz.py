@@ -1,8 +1,18 @@
 import pandas as pd
 import numpy as np
 import requests
+import seri_istemcisi # seri endpointlerinin istemcisi (ikili biçim çözücü), api.py ve Flask içe aktarılmaz
 import random 
 import scipy.stats as stats # dağılımlar için gerekli
+from concurrent.futures import ProcessPoolExecutor # paralel monte carlo için süreç havuzu
+from scipy.stats import qmc # sobol yarı rastgele dizileri için
+import warnings
+import sqlite3 # kalibrasyon önbelleği için
+import hashlib
+import json
+import os
+import time
+from datetime import datetime, timezone
 
 try:
     from arch import arch_model # vollalite modellemesi için garch kullanılacak ondan dolayı arch lazım olacak
@@ -17,57 +27,125 @@ API_WEEKLY_URL = "http://127.0.0.1:8000/get-weekly"
 API_MOTHLY_URL = "http://127.0.0.1:8000/get-monthly"
 API_YEARLY_URL = "http://127.0.0.1:8000/get-yearly"
 
+KALIBRASYON_DB = "kalibrasyon.db" # kalibrasyon önbelleği cuzdan.db ile aynı klasörde tutulur
+KALIBRASYON_SURUMU = 2 # kalibrasyon içeriği değişince artırılır, eski önbellek kayıtları kendiliğinden geçersiz olur
+
+
+
+ADAY_DAGILIMLAR = ['norm', 't', 'laplace'] # kalibrasyonda en iyi dağılımı bulma fonksiyonunda kullanılacak adaylar
+DAGILIM_ISCI_SAYISI = os.cpu_count() or 1 # aday uydurmaları en fazla bu kadar süreçli havuza dağıtılır (aday sayısı arttıkça gecikme doğrusal büyümez). Tek çekirdekte 1 olur ve havuz açılmaz
+AD_DESTEKLI_DAGILIMLAR = ['norm', 'expon', 'logistic', 'gumbel_l', 'gumbel_r'] # ad testinin desteklediği dağılımlar (ad testi her dağılımı desteklemez)
+
+
+
+def en_iyi_dagilimi_bul(veri_serisi, aday_dagilimlar, bins=20, havuz=None): #incelenecek veri serisi, incelenecek dağılımlar, histogram için bin sayısı (kikare için) ve verilirse adayların dağıtılacağı işçi havuzu (concurrent.futures Executor)
+    # sıralama ve histogram tüm adaylar için bir kez hesaplanır
+    veri, sirali, hist, bin_edges = _ortak_istatistikler(veri_serisi, bins)
+    gorevler = [(dagilim_adi, veri, sirali, hist, bin_edges) for dagilim_adi in aday_dagilimlar]
+    sonuclar = list(havuz.map(_aday_degerlendir, gorevler)) if havuz is not None else [_aday_degerlendir(gorev) for gorev in gorevler]
+    return _en_iyi_sonucu_sec(sonuclar) # en iyi uyum sağlanan dağılım ve parametreleri döndürülür
+
+
+
+# Birden fazla varlığın serisi için en iyi dağılımları bulan fonksiyon. Tüm (varlık, aday) çiftleri tek bir süreç havuzuna dağıtılır
+def en_iyi_dagilimlari_bul(seriler, aday_dagilimlar, bins=20, num_workers=None): # varlık adı -> log getiri serisi sözlüğü. num_workers verilmezse çekirdek sayısı, 1 ise havuz açılmaz sırayla çalışır
+    ortak = {asset: _ortak_istatistikler(seri, bins) for asset, seri in seriler.items()}
+    gorevler = [(asset, (dagilim_adi,) + ortak[asset]) for asset in seriler for dagilim_adi in aday_dagilimlar]
+    num_workers = min(num_workers or os.cpu_count() or 1, len(gorevler)) # görevden fazla süreç başlatılmaz
+    if num_workers <= 1:
+        sonuclar = [_aday_degerlendir(gorev) for _, gorev in gorevler]
+    else:
+        with ProcessPoolExecutor(max_workers=num_workers) as havuz:
+            sonuclar = list(havuz.map(_aday_degerlendir, [gorev for _, gorev in gorevler]))
+
+    varlik_dagilimlari = {}
+    for asset in seriler: # sonuçlar varlık bazında toplanıp her varlık için en iyisi seçilir
+        dagilim_adi, parametreler = _en_iyi_sonucu_sec([sonuc for (gorev_varligi, _), sonuc in zip(gorevler, sonuclar) if gorev_varligi == asset])
+        varlik_dagilimlari[asset] = {'dist': dagilim_adi, 'params': parametreler}
+    return varlik_dagilimlari
+
+
+
+# Seriyi numpy dizisine çevirip bütün adayların ortak kullandığı sıralı diziyi ve histogramı hesaplayan fonksiyon
+def _ortak_istatistikler(veri_serisi, bins):
+    veri = np.asarray(veri_serisi, dtype=float)
+    hist, bin_edges = np.histogram(veri, bins=bins) # veri serimizin histogramını oluşturur, hist ve bin_edges döner (her binin frekansı ve histogramın kenarları)
+    return veri, np.sort(veri), hist, bin_edges
 
 
-def en_iyi_dagilimi_bul(veri_serisi, aday_dagilimlar, bins=20): #incelenecek veri serisi, incelenecek dağılımlar ve histogram için bin sayısı alır (kikare için)
-    # başlangıç olarak aranan değerler boş olarak başlanıyor
-    en_iyi_ortalama = float('inf') # inf her test sonucunda min değeri seçer
-    en_iyi_dagilim = None
-    en_iyi_parametreler = None
 
-    for dagilim_adi in aday_dagilimlar: # listede ki her dağılımı tek tek alır
+# Kapalı formda en çok olabilirlik (MLE) tahmini olan dağılımlar için parametreleri doğrudan hesaplayan, diğerleri için sayısal fit yapan fonksiyon
+def _dagilim_parametreleri(dagilim_adi, veri, sirali):
+    if dagilim_adi == 'norm':
+        return (float(np.mean(veri)), float(np.std(veri))) # normal için MLE: ortalama ve (n'e bölünen) standart sapma
+    if dagilim_adi == 'laplace':
+        medyan = float(np.median(sirali))
+        return (medyan, float(np.mean(np.abs(veri - medyan)))) # laplace için MLE: medyan ve medyandan ortalama mutlak sapma
+    if dagilim_adi == 't': # t için kapalı form yoktur, sayısal fit basıklıktan (kurtosis) tahmin edilen başlangıç değerlerinden başlatılır ve daha hızlı yakınsar
+        basiklik = stats.kurtosis(veri)
+        df0 = 6.0 / basiklik + 4.0 if basiklik > 0 else 30.0
+        return stats.t.fit(veri, df0, loc=float(np.median(sirali)), scale=float(np.std(veri) * np.sqrt(max(df0 - 2.0, 0.1) / df0)))
+    return getattr(stats, dagilim_adi).fit(veri) # alınan dağılımın parametrelerini hesaplar
+
+
+
+# Tek bir aday dağılımı uydurup test istatistiklerinin ortalamasını (skor) hesaplayan fonksiyon. Süreç havuzuna gönderilebilmesi için modül seviyesindedir
+def _aday_degerlendir(gorev):
+    dagilim_adi, veri, sirali, hist, bin_edges = gorev
+    try:
         dagilim = getattr(stats, dagilim_adi) # scipy dan ilgili dağılım nesnesini alır (örneğin dağılım adı "norm" ise "scipy.stats.norm" olur)
-        try:
-            parametreler = dagilim.fit(veri_serisi) # alınan dağılımın parametrelerini hesaplar (örneğin normal dağılım için veri serimizin ortalama ve standart sapmasını hesaplar)
+        parametreler = _dagilim_parametreleri(dagilim_adi, veri, sirali)
+        n = len(sirali)
 
-            ks_stat, _ = stats.kstest(veri_serisi, dagilim_adi, args=parametreler) # kolmogorov-smirnov testi ile veri setimiz aday dağılım ile uygunluk testi yapılır kümülatif dağılım fonksiyonları karşılaştırılır (test istatistiği ve p-değeri döner)  
-            
-            try:
-                if dagilim_adi in ['norm', 'expon', 'logistic', 'gumbel_l', 'gumbel_r']: # bizim dağılım adaylarımızın ad testi için desteklenen dağılımlardan olup olmadığı kontrol edilir (ad testi her dağılımı desteklemez)
-                    ad_result = stats.anderson(veri_serisi, dist=dagilim_adi) # dağılım destekleniyorsa test gerçekleştirilir
-                    ad_stat = ad_result.statistic # test istatistiği , kritik değerler gibi sonuçlar nesnesi döndürür
-                else:
-                    ad_stat = np.nan # dağılım desteklenmiyorsa
-            except Exception:
-                ad_stat = np.nan
-
-            hist, bin_edges = np.histogram(veri_serisi, bins=bins) # veri serimizin histogramını oluşturur, hist ve bin_edges döner (her binin frekansı ve histogramın kenarları)
-            cdf_vals = dagilim.cdf(bin_edges, *parametreler) # aday dağılımın cdf değerlerini hesaplar (bin kenarları ile birlikte) yani her binin üstündeki alanı verir
-            expected = len(veri_serisi) * np.diff(cdf_vals) # her bin için beklenen frekanslardır (histogram frekanslarımız bu beklenen frekanslara yakın olmalı)
-            with np.errstate(divide='ignore', invalid='ignore'): # karşılaştırma yapılırken frekanslar birbirine bölünür. bazı durumlarda bölüm sıfır olur yada nan değerler olur hata vermemesi için bu satır kullanılır
-                chi2_stat = np.nansum((hist - expected) ** 2 / (expected + 1e-8)) # frekanslar farkı hesaplanır, farkın karesi alınır, beklenen frekansa bölünür ve çok küçük pozitif değer eklenir üstteki sıfır bölüm durumunu önlemek için en son nansum ile toplamı alınır (nansum, nan değerleri yoksayar bu da yine üstteki nan hatasını önler)
-            
-            scores = [ks_stat, chi2_stat] # ad testi nan olabilir önce diğer test sonuçları alınır
-            if not np.isnan(ad_stat): # ad testi nan değilse o da eklenir
-                scores.append(ad_stat)
-            ortalama = np.mean(scores) # hepsinin ortalaması alınır
-            if ortalama < en_iyi_ortalama: #  eğer ortalama en iyi ortalamadan küçükse yeni en iyi olarak atanır
-                en_iyi_ortalama = ortalama
-                en_iyi_dagilim = dagilim_adi
-                en_iyi_parametreler = parametreler
-        except Exception: # hatalar göz ardı edilir
-            print(f"Uyarı: {dagilim_adi} dağılımı için hata oluştu Diğer testler devam edecek")   
-            continue
-    return en_iyi_dagilim, en_iyi_parametreler # en iyi uyum sağlanan dağılım ve parametreleri döndürülür
+        # kolmogorov-smirnov istatistiği ortak sıralı diziden hesaplanır: ampirik ve teorik cdf arasındaki en büyük fark
+        cdf_sirali = dagilim.cdf(sirali, *parametreler)
+        ks_stat = max(np.max(np.arange(1, n + 1) / n - cdf_sirali), np.max(cdf_sirali - np.arange(n) / n))
+
+        try:
+            if dagilim_adi == 'norm': # normal için ad istatistiği de sıralı diziden hesaplanır (stats.anderson ile aynı tanım: ortalama ve n-1'e bölünen std)
+                z = (sirali - np.mean(sirali)) / np.std(sirali, ddof=1)
+                i = np.arange(1, n + 1)
+                ad_stat = -n - np.sum((2 * i - 1) / n * (stats.norm.logcdf(z) + stats.norm.logsf(z[::-1])))
+            elif dagilim_adi in AD_DESTEKLI_DAGILIMLAR:
+                ad_stat = stats.anderson(veri, dist=dagilim_adi).statistic
+            else:
+                ad_stat = np.nan # dağılım desteklenmiyorsa
+        except Exception:
+            ad_stat = np.nan
+
+        cdf_vals = dagilim.cdf(bin_edges, *parametreler) # aday dağılımın cdf değerlerini hesaplar (ortak histogramın bin kenarları ile birlikte)
+        expected = n * np.diff(cdf_vals) # her bin için beklenen frekanslardır
+        with np.errstate(divide='ignore', invalid='ignore'): # sıfıra bölme ve nan durumlarında hata vermemesi için
+            chi2_stat = np.nansum((hist - expected) ** 2 / (expected + 1e-8))
+
+        scores = [ks_stat, chi2_stat] # ad testi nan olabilir önce diğer test sonuçları alınır
+        if not np.isnan(ad_stat): # ad testi nan değilse o da eklenir
+            scores.append(ad_stat)
+        return dagilim_adi, parametreler, float(np.mean(scores)) # hepsinin ortalaması skor olur
+    except Exception: # hatalar göz ardı edilir
+        print(f"Uyarı: {dagilim_adi} dağılımı için hata oluştu Diğer testler devam edecek")
+        return dagilim_adi, None, float('inf')
+
+
+
+# Adayların sonuçlarından en düşük skorlu (en iyi uyan) dağılımı seçen fonksiyon
+def _en_iyi_sonucu_sec(sonuclar):
+    en_iyi_ortalama = float('inf') # inf her test sonucunda min değeri seçer
+    en_iyi_dagilim = None
+    en_iyi_parametreler = None
+    for dagilim_adi, parametreler, ortalama in sonuclar:
+        if parametreler is not None and ortalama < en_iyi_ortalama: #  eğer ortalama en iyi ortalamadan küçükse yeni en iyi olarak atanır
+            en_iyi_ortalama = ortalama
+            en_iyi_dagilim = dagilim_adi
+            en_iyi_parametreler = parametreler
+    return en_iyi_dagilim, en_iyi_parametreler
 
 
 
 # Yıllık seri verileri API'den çeken fonksiyon (get-yearly endpoint'ini kullanır)
 def yillik_veri_cek(api_url):
     try:
-        response = requests.get(api_url)
-        response.raise_for_status() # veri çekme sırasında bir hata varsa hata fırlatır
-        data = response.json()
+        data = seri_istemcisi.seri_istegi(api_url) # ikili biçimde ve koşullu istekle okunur, veri değişmediyse bellekteki kopya kullanılır. Hata varsa exception fırlatır
 
         if isinstance(data, dict):        # API'den gelen verinin beklenen formatta (sözlük) olup olmadığını kontrol et
              return data             # api.py'deki get_yearly fonksiyonu zaten doğru formatta veriyi döndürüyor.
@@ -158,6 +236,190 @@ def garch_volalite_hesapla(log_returns_df):
 
 
 
+GARCH_KUYRUK_BOYUTU = 10 # yeni getirilerin serideki yerini bulmak için durumda saklanan son getiri sayısı
+
+
+
+# Bugünün UTC tarihini (YYYY-MM-DD) döndüren fonksiyon. api.py günlük kayıtları UTC tarihine göre tuttuğundan bugünün barı gün içinde değişmeye devam eden geçici bardır
+def _bugun():
+    return datetime.now(timezone.utc).date().isoformat()
+
+
+
+# GARCH durum deposuna bağlanan fonksiyon (kalibrasyon önbelleği ile aynı veritabanı dosyası kullanılır)
+def _garch_db_baglan():
+    conn = sqlite3.connect(KALIBRASYON_DB)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS garch_durumu (
+            varlik TEXT PRIMARY KEY,
+            parametreler TEXT,
+            son_varyans REAL,
+            son_getiriler TEXT,
+            guncelleme_sayisi INTEGER,
+            z2_toplami REAL,
+            uydurma_zamani REAL,
+            son_tarih TEXT
+        )
+    ''') # parametreler: arch modelinin tüm parametreleri (omega, alpha[1], beta[1] ...) json olarak, son_getiriler: serinin son getirileri, son_tarih: durumun ulaştığı son tamamlanmış gün
+    if "son_tarih" not in {satir[1] for satir in conn.execute("PRAGMA table_info(garch_durumu)")}: # eski biçimdeki tabloya sütun eklenir, bu satırlar ilk çağrıda son getirilerle eşleştirilip tarihe bağlanır
+        conn.execute("ALTER TABLE garch_durumu ADD COLUMN son_tarih TEXT")
+    return conn
+
+
+
+# GARCH(1,1) modelini kuran fonksiyon (garch_volalite_hesapla ile aynı model tanımı)
+def _garch_modeli_kur(returns_series):
+    try:
+        return arch_model(returns_series, mean='zero', vol='Garch', p=1, q=1, distribution='t')
+    except TypeError:
+        return arch_model(returns_series, mean='zero', vol='Garch', p=1, q=1)
+
+
+
+# Modeli tam olarak uydurup yeni GARCH durumunu oluşturan fonksiyon. Önceki parametreler verilirse optimizasyon onlardan başlar (sıcak başlangıç)
+def _garch_tam_uydur(getiriler, onceki_parametreler=None, son_tarih=None):
+    model = _garch_modeli_kur(pd.Series(getiriler))
+    baslangic = None
+    if onceki_parametreler is not None and len(onceki_parametreler) == len(model.parameter_names()):
+        baslangic = np.array(onceki_parametreler)
+    results = model.fit(disp='off', starting_values=baslangic)
+    return {
+        "parametreler": dict(results.params.astype(float)),
+        "son_varyans": float(results.conditional_volatility.iloc[-1] ** 2),
+        "son_getiriler": [float(r) for r in getiriler[-GARCH_KUYRUK_BOYUTU:]],
+        "guncelleme_sayisi": 0, # son tam uydurmadan beri özyineleme ile eklenen getiri sayısı
+        "z2_toplami": 0.0, # eklenen getirilerin standartlaştırılmış karelerinin toplamı (model uyumu için tanı)
+        "uydurma_zamani": time.time(),
+        "son_tarih": son_tarih
+    }
+
+
+
+# Son kaydedilen getirilerin yeni serideki yerini bulup sonrasında gelen yeni getirileri döndüren fonksiyon (bulunamazsa None)
+def _yeni_getirileri_bul(getiriler, son_getiriler):
+    k = len(son_getiriler)
+    if k == 0 or len(getiriler) < k:
+        return None
+    pencereler = np.lib.stride_tricks.sliding_window_view(getiriler, k)
+    eslesmeler = np.flatnonzero(np.all(np.isclose(pencereler, son_getiriler, rtol=0, atol=1e-12), axis=1))
+    if len(eslesmeler) == 0:
+        return None
+    return getiriler[eslesmeler[-1] + k:]
+
+
+
+# Tarih indeksli getiri serisinde durumun bağlı olduğu günden sonraki getirileri döndüren fonksiyon. O günün getirisi kayıtlı olanla aynı değilse (seri değişmiş) None
+def _tarihten_sonraki_getiriler(seri, durum):
+    son_tarih = durum["son_tarih"]
+    if son_tarih not in seri.index or not np.isclose(seri[son_tarih], durum["son_getiriler"][-1], rtol=1e-9, atol=1e-12): # tamamlanmış günlerin getirisi değişmez
+        return None
+    return seri[seri.index > son_tarih].to_numpy(dtype=float)
+
+
+
+# GARCH(1,1) özyinelemesini verilen getiriler üzerinde ilerleten fonksiyon: sigma^2_t = omega + alpha * r_(t-1)^2 + beta * sigma^2_(t-1)
+# Son varyansı ve eklenen getirilerin standartlaştırılmış karelerinin toplamını döndürür
+def _garch_ilerlet(parametreler, onceki_getiri, varyans, getiriler):
+    omega, alpha, beta = parametreler["omega"], parametreler["alpha[1]"], parametreler["beta[1]"]
+    z2_toplami = 0.0
+    for r in getiriler:
+        varyans = omega + alpha * onceki_getiri**2 + beta * varyans
+        z2_toplami += r**2 / varyans if varyans > 0 else 0.0
+        onceki_getiri = r
+    return float(varyans), z2_toplami
+
+
+
+# GARCH(1,1) koşullu volatilitesini her seferinde yeniden uydurmadan, saklanan parametrelerle özyinelemeli olarak güncelleyen fonksiyon
+# log_returns_df tarih indeksliyse (YYYY-MM-DD) durum son tamamlanmış güne bağlanır. Bugünün geçici barı kalıcı duruma hiç katılmaz, sadece döndürülen volatiliteye tek adımlık geçici güncelleme olarak uygulanır
+def garch_volalite_artimli_hesapla(log_returns_df, yeniden_uydurma_araligi=20, z2_alt=0.5, z2_ust=2.0): # kaç yeni getiride bir tam uydurma yapılacağı ve standartlaştırılmış kare getirilerin ortalaması için kabul aralığı
+    garch_volatility = {}
+    if not GARCH_AVAILABLE:
+        print("GARCH kütüphanesi yüklü değil. GARCH volatilitesi hesaplanamayacak.")
+        return garch_volatility
+    if log_returns_df.empty:
+        print("Uyarı: GARCH volatilitesi hesaplamak için log getiri DataFrame'i boş.")
+        return garch_volatility
+
+    try:
+        conn = _garch_db_baglan()
+    except Exception as e: # durum deposu açılamazsa her varlık için tam uydurma yapılır
+        print(f"Uyarı: GARCH durum deposu açılamadı, tam uydurma yapılacak: {e}")
+        return garch_volalite_hesapla(log_returns_df)
+
+    tarihli = not isinstance(log_returns_df.index, pd.RangeIndex) # tarih indeksi yoksa eski davranış: son getiriler yeni seride aranır
+    bugun = _bugun()
+    try:
+        for asset in log_returns_df.columns:
+            seri = log_returns_df[asset].dropna()
+            gecici_getiriler = np.array([])
+            son_tarih = None
+            if tarihli:
+                seri.index = seri.index.astype(str)
+                gecici_getiriler = seri[seri.index >= bugun].to_numpy(dtype=float) # gün içinde her fiyat yenilemesinde değişen bar
+                seri = seri[seri.index < bugun]
+                son_tarih = seri.index[-1] if len(seri) else None
+            getiriler = seri.to_numpy(dtype=float)
+            if len(getiriler) <= 30: # garch_volalite_hesapla ile aynı en az veri koşulu
+                print(f"Uyarı: {asset} için GARCH(1,1) modeli uydurmak için yeterli veri yok ({len(getiriler)} nokta).")
+                garch_volatility[asset] = 0.0
+                continue
+            try:
+                satir = conn.execute("SELECT parametreler, son_varyans, son_getiriler, guncelleme_sayisi, z2_toplami, uydurma_zamani, son_tarih FROM garch_durumu WHERE varlik = ?", (asset,)).fetchone()
+                durum = None
+                if satir:
+                    durum = {"parametreler": json.loads(satir[0]), "son_varyans": satir[1], "son_getiriler": json.loads(satir[2]),
+                             "guncelleme_sayisi": satir[3], "z2_toplami": satir[4], "uydurma_zamani": satir[5], "son_tarih": satir[6]}
+
+                yeni_getiriler = None
+                if durum and tarihli and durum["son_tarih"]:
+                    yeni_getiriler = _tarihten_sonraki_getiriler(seri, durum)
+                elif durum: # tarihsiz durum (eski kayıt veya tarihsiz seri) son getirilerle eşleştirilir
+                    yeni_getiriler = _yeni_getirileri_bul(getiriler, np.array(durum["son_getiriler"]))
+
+                degisti = True
+                if durum is None:
+                    print(f"{asset} için GARCH(1,1) modeli ilk kez uyduruluyor...")
+                    durum = _garch_tam_uydur(getiriler, son_tarih=son_tarih)
+                elif yeni_getiriler is None: # seri öncekiyle örtüşmüyorsa (veri kaynağı değişti, uzun ara vb.) sıcak başlangıçla yeniden uydurulur
+                    print(f"{asset} için kayıtlı getiriler yeni seride bulunamadı, GARCH modeli yeniden uyduruluyor...")
+                    durum = _garch_tam_uydur(getiriler, list(durum["parametreler"].values()), son_tarih=son_tarih)
+                elif len(yeni_getiriler) > 0: # yeni tamamlanmış günler özyinelemeyle eklenir
+                    durum["son_varyans"], z2_artisi = _garch_ilerlet(durum["parametreler"], durum["son_getiriler"][-1], durum["son_varyans"], yeni_getiriler)
+                    durum["z2_toplami"] += z2_artisi
+                    durum["son_getiriler"] = [float(r) for r in getiriler[-GARCH_KUYRUK_BOYUTU:]]
+                    durum["guncelleme_sayisi"] += len(yeni_getiriler)
+                    durum["son_tarih"] = son_tarih
+
+                    z2_ortalama = durum["z2_toplami"] / durum["guncelleme_sayisi"] # model doğruysa standartlaştırılmış kare getirilerin ortalaması 1'e yakın olur
+                    if durum["guncelleme_sayisi"] >= yeniden_uydurma_araligi or (durum["guncelleme_sayisi"] >= 5 and not z2_alt <= z2_ortalama <= z2_ust):
+                        print(f"{asset} için GARCH modeli planlı olarak yeniden uyduruluyor ({durum['guncelleme_sayisi']} yeni getiri, z^2 ortalaması {z2_ortalama:.2f})...")
+                        durum = _garch_tam_uydur(getiriler, list(durum["parametreler"].values()), son_tarih=son_tarih)
+                else: # aynı gün içinde tekrar çağrı: kalıcı durum zaten son tamamlanmış günde
+                    degisti = durum["son_tarih"] != son_tarih
+                    durum["son_tarih"] = son_tarih
+
+                if degisti:
+                    conn.execute("INSERT OR REPLACE INTO garch_durumu (varlik, parametreler, son_varyans, son_getiriler, guncelleme_sayisi, z2_toplami, uydurma_zamani, son_tarih) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                 (asset, json.dumps(durum["parametreler"]), durum["son_varyans"], json.dumps(durum["son_getiriler"]),
+                                  durum["guncelleme_sayisi"], durum["z2_toplami"], durum["uydurma_zamani"], durum["son_tarih"]))
+                    conn.commit()
+
+                varyans = durum["son_varyans"]
+                if len(gecici_getiriler): # bugünün barı sadece bu sonuca tek adım olarak eklenir, veritabanına yazılmaz
+                    varyans, _ = _garch_ilerlet(durum["parametreler"], durum["son_getiriler"][-1], varyans, gecici_getiriler)
+                garch_volatility[asset] = float(np.sqrt(varyans)) # en güncel koşullu volatilite
+
+            except Exception as e:
+                print(f"Uyarı: {asset} için GARCH(1,1) modeli uydurulurken hata oluştu: {e}")
+                garch_volatility[asset] = 0.0
+    finally:
+        conn.close()
+
+    return garch_volatility
+
+
+
 # Korelasyon Matrisi hesaplayan fonksiyon
 def korelasyon_hesapla(log_returns_df):
     if not log_returns_df.empty: #boş değilse
@@ -198,71 +460,198 @@ def kovaryans_hesapla(log_returns_df, volatility_dict): # log getiri dfsi ve her
 
 
 
-# Monte Carlo simülasyonu çalıştıran fonksiyon
-def mcs_yap(drift_dict, volatility_dict, cholesky_matrix_L, initial_asset_values, num_simulations=10000, num_days=7, varlik_dagilimlari=None):    # ortalama log getiri , varlıkların volatilitesi (std yada grachdan gelen), cholesky matrisi (yada std matrisi, getirilerin birlikte nasıl hareket edeceği), varlıkların başlangıç varlık değerleri, simülasyon sayısı ve gün sayısı alır
-    simulated_portfolio_values = [] # Tüm simülasyonların sonucunda toplam portföy değerlerini saklamak için 
+TABLO_DESTEKLI_DAGILIMLAR = ['t', 'laplace'] # ters cdf tablo modunun kullanılabildiği dağılımlar (ppf hesabı pahalı olanlar)
+
+
+
+# Dondurulmuş dağılımın şokları birim varyansa getirmek için konum ve ölçeğini döndüren fonksiyon
+# Varyansı sonsuz olan dağılımlarda (ör. df <= 2 olan t) medyan ve çeyrekler arası açıklık normal eşdeğerine göre kullanılır
+def _standartlastirma(dagilim):
+    with np.errstate(all='ignore'):
+        konum, olcek = float(dagilim.mean()), float(dagilim.std())
+    if np.isfinite(konum) and np.isfinite(olcek) and olcek > 0:
+        return konum, olcek
+    return float(dagilim.median()), float((dagilim.ppf(0.75) - dagilim.ppf(0.25)) / 1.349)
+
+
+
+# Bir varlığın en uygun dağılım bilgisinden ({'dist': ..., 'params': ...}) şok örnekleyicisi oluşturan fonksiyon (varlık başına bir kez oluşturulur)
+# Dağılımlar getiri ölçeğinde uydurulur, örnekleyici ise şekli (kuyruk, çarpıklık) koruyup ortalaması 0 ve varyansı 1 olan şoklar üretir. Volatilite şoklara sadece Cholesky matrisi ile bir kez girer
+def sok_ornekleyici_olustur(dagilim_bilgisi, tablo_modu=False, tablo_boyutu=4096): # en_iyi_dagilimi_bul sonucu, ters cdf tablo modu kullanılsın mı ve tablodaki nokta sayısı
+    ornekleyici = {"dist": "norm", "dagilim": stats.norm(), "tablo": None, "konum": 0.0, "olcek": 1.0} # dağılım bilgisi yoksa standart normal kullanılır
+    if dagilim_bilgisi and dagilim_bilgisi.get('dist'):
+        try:
+            dagilim = getattr(stats, dagilim_bilgisi['dist'])
+            ornekleyici = {"dist": dagilim_bilgisi['dist'], "dagilim": dagilim(*dagilim_bilgisi['params']), "tablo": None} # dağılım parametreleri ile bir kez dondurulur (frozen) her çekilişte tekrar kurulmaz
+            ornekleyici["konum"], ornekleyici["olcek"] = _standartlastirma(ornekleyici["dagilim"])
+        except Exception as e:
+            print(f"Uyarı: {dagilim_bilgisi.get('dist')} dağılımı için örnekleyici oluşturulamadı, standart normal kullanılacak: {e}")
+
+    if tablo_modu and ornekleyici["dist"] in TABLO_DESTEKLI_DAGILIMLAR:
+        # kuyruklarda sıklaşan bir olasılık ızgarası (logit uzayında eşit aralıklı) kurulur ve ppf değerleri bir kez hesaplanır
+        logit_izgara = np.linspace(-16.0, 16.0, tablo_boyutu)
+        u_izgara = 1.0 / (1.0 + np.exp(-logit_izgara))
+        ornekleyici["tablo"] = (u_izgara, (ornekleyici["dagilim"].ppf(u_izgara) - ornekleyici["konum"]) / ornekleyici["olcek"]) # tablo standartlaştırılmış değerlerle kurulur
+    return ornekleyici
+
 
+
+# Verilen düzgün (uniform) sayıları örnekleyicinin standartlaştırılmış dağılımına dönüştüren fonksiyon (ters cdf)
+def sok_ppf(ornekleyici, u):
+    if ornekleyici["tablo"] is not None:
+        u_izgara, x_izgara = ornekleyici["tablo"]
+        return np.interp(u, u_izgara, x_izgara) # tablo modunda pahalı ppf yerine doğrusal ara değer bulma yapılır
+    return (ornekleyici["dagilim"].ppf(u) - ornekleyici["konum"]) / ornekleyici["olcek"]
+
+
+
+# Örnekleyiciden istenen boyutta bir blok şok çeken fonksiyon
+def sok_ornekle(ornekleyici, boyut, rng):
+    if ornekleyici["tablo"] is not None:
+        return sok_ppf(ornekleyici, rng.random(boyut)) # düzgün dağılımdan çekiliş + ara değer bulma
+    return (ornekleyici["dagilim"].rvs(size=boyut, random_state=rng) - ornekleyici["konum"]) / ornekleyici["olcek"] # tüm blok tek rvs çağrısıyla üretilir
+
+
+
+# Monte Carlo simülasyonunu dizi (array) tabanlı olarak çalıştıran fonksiyon
+def mcs_yap_vektorel(drift_dict, volatility_dict, cholesky_matrix_L, initial_asset_values, num_simulations=10000, num_days=7, varlik_dagilimlari=None, varlik_degerleri_don=False, rng=None, ornekleyiciler=None, tablo_modu=False, yazdir=True, varyans_azaltma=None, patikalari_don=False): # mcs_yap ile aynı girdileri alır. varlik_degerleri_don True ise varlık bazında son değerleri de döndürür, patikalari_don True ise portföy değerleri son gün yerine her gün için (simülasyon, gün) boyutunda döner, rng tekrarlanabilir sonuç için numpy Generator'dır, ornekleyiciler önceden kurulmuş varlık örnekleyicileridir, varyans_azaltma 'antitetik' veya 'sobol' olabilir
+    if varyans_azaltma not in (None, 'antitetik', 'sobol'): # kontrol değişkeni patika ağırlıkları gerektirdiğinden sadece mcs_varyans_azaltmali_risk_hesapla'da desteklenir
+        raise ValueError(f"mcs_yap_vektorel varyans_azaltma={varyans_azaltma!r} desteklemiyor (None, 'antitetik' veya 'sobol'). 'kontrol' için mcs_varyans_azaltmali_risk_hesapla kullanın.")
     assets = list(initial_asset_values.keys()) #varlıklar alınır
     num_assets = len(assets) # varlık sayısı alınır
     if num_assets == 0 or cholesky_matrix_L.shape[0] != num_assets: # varlık sayısı ile l matris satırı eşit olmalı ki simülasyon yapılabilsin
         print("Hata: Simülasyon için varlık sayısı veya Cholesky matrisi boyutu uyumsuz.")
         print(f"  Varlık sayısı (initial_asset_values): {num_assets}")
         print(f"  Cholesky matrisi boyutu: {cholesky_matrix_L.shape}")
-        return [] # Boş liste döndür
-
-    dt = 1.0 # simülasyonun ilerleyeceği Günlük adım
-    print(f"Monte Carlo simülasyonu başlatılıyor ({num_simulations} simülasyon, {num_days} gün)...")
-    for sim_num in range(num_simulations): # her simülasyon olası gelecek değeri gösterir
-        if num_simulations >= 100 and sim_num % (num_simulations // 100) == 0: # Toplam simülasyon sayısının %1'inde bir ilerleme yazdır
-             print(f"  Simülasyon {sim_num}/{num_simulations}...")
-        current_asset_values = initial_asset_values.copy() # Başlangıç değerlerini kopyalanır her sim aynı noktadan başlar
-
-        for day in range(num_days): # her simülasyon (10k) 7 günlük seriyi bulmak için çalışır. her 7 günlük seri 1 sim patikasıdır. Bu döngüde her patikanın 7 günlük serisinin 1 gününü temsil eder
-            independent_random_shocks_Z = np.zeros(num_assets) # her varlık için üretilecek rastgele şoklar için sıfır matris oluşturulur
-            for i, asset in enumerate(assets):
-                if varlik_dagilimlari and asset in varlik_dagilimlari:
-                    dagilim_adi = varlik_dagilimlari[asset]['dist']
-                    parametreler = varlik_dagilimlari[asset]['params']
-                    dagilim = getattr(stats, dagilim_adi)
-                    try:
-                        independent_random_shocks_Z[i] = dagilim.rvs(*parametreler) # testler sonucunda gelen dağılım parametrelerine göre rastgele değer üretilir yani rastgele şoklar üretilir
-                    except Exception:
-                        independent_random_shocks_Z[i] = np.random.normal() # herhangi bir hata durumunda normal dağılımdan rastgele değer üretilir
-                else:
-                    independent_random_shocks_Z[i] = np.random.normal()
-                    
-            correlated_random_shocks_epsilon = np.dot(cholesky_matrix_L, independent_random_shocks_Z) # np.dot=@ yani ikiside matris çarpımı demek. rastgele üretilen şoklar ile cholesky matrisinin çarpımı ile korelasyonlu şoklar üretilir. Bu işlemde L matrisinin Cholesky ayrışımından geldiği için varlıklar arası ilişkili şoklar üretilir. bu ilişki sonuç vektörüdür
-            # burada korelasyon hesabında hata yoksa gerçekten L matrisi gelmiş ise varlıklar arası gerçek bir ilişki sağlanarak korelasyon yapısı oluşur ancak L matris yerine D matrsi gelmiş ise varlıklar kendi özel volalitelerini kullanır buda hata payı doğurur
-            
-            for i, asset in enumerate(assets): # gün içinde her varlığa ait tek tek fiyat güncellemesi
-                S_t = current_asset_values.get(asset, 0.0) # varlığa ait o anki mevcut değer alınır boş ise 0.0 oto. atanır
-                if S_t <= 0: # Fiyat sıfır veya negatifse simülasyonu durdur veya atla
-                    current_asset_values[asset] = 0.0 # Değeri sıfır yap devam et
-                    continue 
-
-                mu_i = drift_dict.get(asset, 0.0) # drift değerleri
-                sigma_i = volatility_dict.get(asset, 0.0) # volalite değerleri
-                epsilon_i = correlated_random_shocks_epsilon[i] # o güne ait ilgili korele şok değerleri
-                try:
-                    exponent = (mu_i - 0.5 * sigma_i**2) * dt + sigma_i * epsilon_i * np.sqrt(dt) # Geometric Brownian Motion modeli kullanılarak varlığın bir sonraki zaman adımına ait log getirisini modelleyen üs kısmı hesaplanır.
-                    # log getirinin beklenen değerini + rastgele şokun etkisi
-                    S_t_plus_dt = S_t * np.exp(exponent) # Varlığın bir sonraki günkü değeri =  mevcut değeri * hesaplanan üsün loge üzeri
-                    current_asset_values[asset] = max(0.0, S_t_plus_dt) # hesaplanan değer ilgili varlığın değerine atanır herhangi bir hata durumunda 0 atanır
-                except Exception as e: # herhangi bir hata mesajı oluşursa varlık değeri eski halinde yani o anki fiyatında bırakılır
-                    print(f"Hata: Simülasyon {sim_num}, Gün {day}, Varlık {asset} için GBM simülasyonunda hata oluştu: {e}")
-                    current_asset_values[asset] = S_t # Hata durumunda önceki değeri koru veya 0 yapabilirsiniz
+        bos = np.empty((0, num_days)) if patikalari_don else np.array([]) # boş dizi döndürülür
+        return (bos, np.empty((0, num_assets))) if varlik_degerleri_don else bos
+
+    if rng is None:
+        rng = np.random.default_rng() # dışarıdan üreteç verilmezse yeni bir üreteç oluşturulur
 
-        final_portfolio_value = sum(current_asset_values.values()) # günler bittiğinde (yani 1 patika bitince o günkü varlık değerleri toplanır)
-        simulated_portfolio_values.append(final_portfolio_value) # toplam değer listeye eklenir
+    if yazdir: # paralel parçalarda her parça için mesaj basılmaması için kapatılabilir
+        print(f"Vektörel Monte Carlo simülasyonu başlatılıyor ({num_simulations} simülasyon, {num_days} gün)...")
 
-    print("Monte Carlo simülasyonu tamamlandı.") # patikalar birince simülasyon bitmiş olur ve mesaj döndürülür
-    return simulated_portfolio_values # her bir simülasyon patikasının sonundaki portföy değerlerini içeren listesini döndürür.
+    if ornekleyiciler is None: # her varlık için örnekleyici bir kez kurulur (dağılım bilgisi yoksa standart normal)
+        ornekleyiciler = {asset: sok_ornekleyici_olustur((varlik_dagilimlari or {}).get(asset), tablo_modu=tablo_modu) for asset in assets}
+
+    independent_random_shocks_Z, _ = _sok_tensoru_uret([ornekleyiciler[asset] for asset in assets], num_simulations, num_days, rng, varyans_azaltma=varyans_azaltma)
+
+    mu = np.array([drift_dict.get(asset, 0.0) for asset in assets]) # drift değerleri
+    sigma = np.array([volatility_dict.get(asset, 0.0) for asset in assets]) # volalite değerleri
+    S_0 = np.array([initial_asset_values[asset] for asset in assets], dtype=float) # başlangıç varlık değerleri
+    son_portfoy_degerleri, son_varlik_degerleri = _gbm_son_degerler(independent_random_shocks_Z, mu, sigma, cholesky_matrix_L, S_0, patika_don=patikalari_don)
+
+    if yazdir:
+        print("Vektörel Monte Carlo simülasyonu tamamlandı.")
+    if varlik_degerleri_don:
+        return son_portfoy_degerleri, son_varlik_degerleri
+    return son_portfoy_degerleri # her bir simülasyon patikasının sonundaki portföy değerlerini içeren numpy dizisi
+
+
+
+# (simülasyon, gün, varlık) boyutunda bağımsız şok tensörünü üreten fonksiyon. Varyans azaltma modlarında şoklar düzgün (uniform) sayıların ters cdf ile dönüştürülmesiyle elde edilir ve bu düzgün sayılar da döndürülür
+def _sok_tensoru_uret(ornekleyici_listesi, num_simulations, num_days, rng, varyans_azaltma=None):
+    num_assets = len(ornekleyici_listesi)
+    independent_random_shocks_Z = np.empty((num_simulations, num_days, num_assets))
+
+    if varyans_azaltma is None: # her varlığın bütün bloğu tek çağrıyla çekilir
+        for i, ornekleyici in enumerate(ornekleyici_listesi):
+            try:
+                independent_random_shocks_Z[:, :, i] = sok_ornekle(ornekleyici, (num_simulations, num_days), rng) # testler sonucunda gelen dağılım parametrelerine göre tüm şoklar bir kerede üretilir
+            except Exception:
+                independent_random_shocks_Z[:, :, i] = rng.standard_normal((num_simulations, num_days)) # herhangi bir hata durumunda normal dağılımdan üretilir
+        return independent_random_shocks_Z, None
+
+    if varyans_azaltma == 'antitetik': # patikaların ilk yarısı u ile ikinci yarısı 1-u ile üretilir, böylece her patikanın ayna eşi olur
+        yarim = (num_simulations + 1) // 2
+        u_yarim = rng.random((yarim, num_days, num_assets))
+        U = np.concatenate([u_yarim, 1.0 - u_yarim])[:num_simulations]
+    elif varyans_azaltma == 'sobol': # karıştırılmış (scrambled) Sobol dizisi, her boyut bir (gün, varlık) çiftidir
+        sobol = qmc.Sobol(d=num_days * num_assets, scramble=True, seed=rng)
+        with warnings.catch_warnings(): # patika sayısı 2'nin kuvveti değilse scipy denge uyarısı verir, sonuç yine geçerlidir
+            warnings.simplefilter("ignore")
+            U = sobol.random(num_simulations).reshape(num_simulations, num_days, num_assets)
+    elif varyans_azaltma == 'kontrol': # kontrol modunda şoklar düz rastgeledir, aynı düzgün sayılar kontrol değişkeni için de kullanılır
+        U = rng.random((num_simulations, num_days, num_assets))
+    else:
+        raise ValueError(f"Bilinmeyen varyans azaltma modu: {varyans_azaltma!r} (None, 'antitetik', 'sobol' veya 'kontrol' olmalı)")
+
+    U = np.clip(U, 1e-12, 1 - 1e-12) # ters cdf'in sonsuz dönmemesi için uçlar kırpılır
+    for i, ornekleyici in enumerate(ornekleyici_listesi):
+        independent_random_shocks_Z[:, :, i] = sok_ppf(ornekleyici, U[:, :, i]) # düzgün sayılar uydurulan marjinal dağılımlardan geçirilir
+    return independent_random_shocks_Z, U
+
+
+
+# Bağımsız şok tensöründen GBM ile son varlık ve portföy değerlerini hesaplayan fonksiyon
+# Şoklar birim varyanslı, cholesky_matrix_L ise kovaryansın (D*rho*D) ayrışımıdır. Korelasyonlu şoklar volatiliteyi zaten taşıdığından sigma sadece Itô düzeltmesinde (-0.5*sigma^2) kullanılır
+def _gbm_son_degerler(independent_random_shocks_Z, mu, sigma, cholesky_matrix_L, S_0, dt=1.0, patika_don=False): # patika_don True ise portföy değerleri yalnız son gün için değil her gün için (simülasyon, gün) boyutunda döner
+    correlated_random_shocks_epsilon = independent_random_shocks_Z @ cholesky_matrix_L.T # tek matris çarpımı ile tüm günlerin ve patikaların korelasyonlu şokları elde edilir (her satır vektörü için L @ Z işleminin toplu halidir)
+    log_getiriler = (mu - 0.5 * sigma**2) * dt + correlated_random_shocks_epsilon * np.sqrt(dt) # Geometric Brownian Motion üs kısmı tüm tensör için aynı anda hesaplanır
+    kumulatif_log_getiriler = np.cumsum(log_getiriler, axis=1) # günler boyunca log getiriler toplanır, son gün patikanın toplam log getirisidir
+    with np.errstate(over='ignore'):
+        son_varlik_degerleri = np.where(S_0 > 0, S_0 * np.exp(kumulatif_log_getiriler[:, -1, :]), 0.0) # sıfır veya negatif başlangıçlı varlıklar sıfır kabul edilir
+    if patika_don: # her günün kümülatif getirisi ayrı ayrı değere çevrilir, tek patika kümesinden tüm ufuklar okunabilir
+        with np.errstate(over='ignore'):
+            gunluk_varlik_degerleri = np.where(S_0 > 0, S_0 * np.exp(kumulatif_log_getiriler), 0.0)
+        return gunluk_varlik_degerleri.sum(axis=2), son_varlik_degerleri
+    son_portfoy_degerleri = son_varlik_degerleri.sum(axis=1) # her patikanın sonunda varlık değerleri toplanır
+    return son_portfoy_degerleri, son_varlik_degerleri
+
+
+
+# Paralel simülasyonda bir parçayı (belirli sayıda patika) çalıştıran fonksiyon. Süreç havuzuna gönderilebilmesi için modül seviyesinde tanımlıdır
+def _mcs_parca_calistir(parca):
+    drift_dict, volatility_dict, cholesky_matrix_L, initial_asset_values, num_simulations, num_days, varlik_dagilimlari, tablo_modu, tohum, patikalari_don = parca
+    rng = np.random.default_rng(tohum) # her parçanın kendi bağımsız rastgele akışı olur
+    return mcs_yap_vektorel(drift_dict, volatility_dict, cholesky_matrix_L, initial_asset_values, num_simulations=num_simulations, num_days=num_days,
+                            varlik_dagilimlari=varlik_dagilimlari, rng=rng, tablo_modu=tablo_modu, yazdir=False, patikalari_don=patikalari_don)
+
+
+
+# Monte Carlo simülasyonunu patika sayısını parçalara bölerek süreç havuzunda çalıştıran fonksiyon
+def mcs_paralel_yap(drift_dict, volatility_dict, cholesky_matrix_L, initial_asset_values, num_simulations=10000, num_days=7, varlik_dagilimlari=None, num_workers=None, seed=None, parca_boyutu=5000, tablo_modu=False, patikalari_don=False): # patikalari_don True ise (simülasyon, gün) boyutunda günlük portföy değerleri döner
+    # parçalar işçi sayısından bağımsız sabit boyutta bölünür ve her parçanın tohumu aynı kök tohumdan türetilir (spawn). Böylece aynı seed için sonuç işçi sayısı ne olursa olsun bit düzeyinde aynı olur
+    parca_sayilari = [parca_boyutu] * (num_simulations // parca_boyutu)
+    if num_simulations % parca_boyutu:
+        parca_sayilari.append(num_simulations % parca_boyutu)
+    tohumlar = np.random.SeedSequence(seed).spawn(len(parca_sayilari))
+    parcalar = [(drift_dict, volatility_dict, cholesky_matrix_L, initial_asset_values, n, num_days, varlik_dagilimlari, tablo_modu, tohum, patikalari_don)
+                for n, tohum in zip(parca_sayilari, tohumlar)]
+
+    print(f"Paralel Monte Carlo simülasyonu başlatılıyor ({num_simulations} simülasyon, {len(parcalar)} parça, {num_workers or 'otomatik'} işçi)...")
+    if num_workers == 1 or len(parcalar) <= 1: # tek işçide süreç açma maliyetine gerek yoktur parçalar sırayla çalıştırılır
+        sonuclar = [_mcs_parca_calistir(parca) for parca in parcalar]
+    else:
+        with ProcessPoolExecutor(max_workers=num_workers) as havuz:
+            sonuclar = list(havuz.map(_mcs_parca_calistir, parcalar)) # map parça sırasını korur
+    print("Paralel Monte Carlo simülasyonu tamamlandı.")
+
+    if not sonuclar or any(len(sonuc) == 0 for sonuc in sonuclar): # parçalardan biri bile sonuç üretmezse (boyut uyumsuzluğu gibi) boş dizi döner
+        return np.empty((0, num_days)) if patikalari_don else np.array([])
+    return np.concatenate(sonuclar) # parça sonuçları sırayla birleştirilir (patikalarda satır ekseninde)
+
+
+
+# Paralel simülasyon sonuçlarını risk_metrikleri_hesapla ile aynı VaR/CVaR çıktısına dönüştüren fonksiyon
+def paralel_risk_metrikleri_hesapla(drift_dict, volatility_dict, cholesky_matrix_L, initial_asset_values, confidence_level=0.95, **kwargs): # kwargs mcs_paralel_yap'a aktarılır (num_simulations, num_workers, seed ...)
+    simulated_values = mcs_paralel_yap(drift_dict, volatility_dict, cholesky_matrix_L, initial_asset_values, **kwargs)
+    return risk_metrikleri_hesapla(simulated_values, sum(initial_asset_values.values()), confidence_level=confidence_level)
+
+
+
+# Monte Carlo simülasyonu çalıştıran fonksiyon (eski liste arayüzü korunur, hesaplama vektörel motorda yapılır)
+def mcs_yap(drift_dict, volatility_dict, cholesky_matrix_L, initial_asset_values, num_simulations=10000, num_days=7, varlik_dagilimlari=None):    # ortalama log getiri , varlıkların volatilitesi (std yada grachdan gelen), cholesky matrisi (yada std matrisi, getirilerin birlikte nasıl hareket edeceği), varlıkların başlangıç varlık değerleri, simülasyon sayısı ve gün sayısı alır
+    simulated_portfolio_values = mcs_yap_vektorel(drift_dict, volatility_dict, cholesky_matrix_L, initial_asset_values,
+                                                  num_simulations=num_simulations, num_days=num_days, varlik_dagilimlari=varlik_dagilimlari)
+    return simulated_portfolio_values.tolist() # her bir simülasyon patikasının sonundaki portföy değerlerini içeren listesini döndürür.
 
 
 
 # VaR (Riskteki Değer) hesaplayan fonksiyon
 def var_hesapla(simulated_values, initial_value, confidence_level=0.95): # sim sonunda oluşan toplam portföy değerleri litesi, sim başladığındaki toplam portföy değeri ve güven seviyesi (yani %95 için 0.95)
-    if not simulated_values: # sim sonuç kontrolü boş ise to 0 atar
+    if len(simulated_values) == 0: # sim sonuç kontrolü boş ise to 0 atar (liste veya numpy dizisi gelebilir)
         return 0.0
     
     sorted_values = np.sort(simulated_values) # Simülasyon sonuçlarını küçükten büyüğe doğru sıralanır. Bu sıralama en kötü senaryoları (en düşük portföy değerlerini) listenin başına getirir.
@@ -275,7 +664,7 @@ def var_hesapla(simulated_values, initial_value, confidence_level=0.95): # sim s
 
 # CVaR (Koşullu Riskteki Değer) hesaplayan fonksiyon -- var ile aynı işler sadece burada ortalama hesaplanır
 def cvar_hesapla(simulated_values, initial_value, confidence_level=0.95):
-    if not simulated_values:
+    if len(simulated_values) == 0:
         return 0.0
 
     sorted_values = np.sort(simulated_values) # var da olduıpğu gibi simülasyon sonuçları küçükten büyüğe sıralanır en kötüler başta kalır
@@ -290,12 +679,16 @@ def cvar_hesapla(simulated_values, initial_value, confidence_level=0.95):
 
 
 # Risk metriklerini (VaR ve CVaR) hesaplayan birleştirilmiş fonksiyon -- amaç tek bir fonkisyonda portföyün iki risk değerini ölçmek
-def risk_metrikleri_hesapla(simulated_values, initial_value, confidence_level=0.95): # mcs den elde edilen ileriye dönük portföy toplam değer tahminlerinin olduğu liste , portföy başlangıç değeri , ölçülecek güven aralığı
-    if not simulated_values:
+def risk_metrikleri_hesapla(simulated_values, initial_value, confidence_level=0.95): # mcs den elde edilen ileriye dönük portföy toplam değer tahminlerinin olduğu liste , portföy başlangıç değeri , ölçülecek güven aralığı
+    if len(simulated_values) == 0:
         return {f"VaR_{int(confidence_level*100)}": 0.0, f"CVaR_{int(confidence_level*100)}": 0.0}
 
-    var_loss = var_hesapla(simulated_values, initial_value, confidence_level)
-    cvar_loss = cvar_hesapla(simulated_values, initial_value, confidence_level)
+    # var_hesapla ve cvar_hesapla ayrı ayrı tam sıralama yapar. Burada tek bir kısmi seçim (partition) ile VaR indeksindeki değer yerine oturtulur, solunda kalanlar zaten en kötü senaryolardır
+    values = np.asarray(simulated_values, dtype=float)
+    index = int((1 - confidence_level) * len(values))
+    partitioned = np.partition(values, index)
+    var_loss = max(0.0, initial_value - partitioned[index])
+    cvar_loss = max(0.0, initial_value - np.mean(partitioned[:index])) if index > 0 else 0.0
 
     return {
         f"VaR_{int(confidence_level*100)}": var_loss, # bilgi amaçlı hesaplanan risk değerlerinin anahtarlarına güven aralık değerleri yazılır
@@ -304,43 +697,303 @@ def risk_metrikleri_hesapla(simulated_values, initial_value, confidence_level=0.
 
 
 
-def risk_analiz_yap(initial_asset_values: dict): # cüzdandaki varlıkları ve miktarılarını sözlük olarak alacak
-    initial_portfolio_value = sum(initial_asset_values.values()) # cüzdandan alınan varlıkların toplam değeri hesaplanır
-    if initial_portfolio_value <= 0: # varlık kontrolü
-         return {"error": "Risk analizi için portföy değeri sıfır veya negatif olamaz."}
+RISK_UFUKLARI = (1, 7, 30) # risk yüzeyinde raporlanan gün ufukları
+RISK_GUVEN_SEVIYELERI = (0.90, 0.95, 0.99) # risk yüzeyinde raporlanan güven seviyeleri
 
 
-    wallet_asset_keys = set(initial_asset_values.keys()) # cüzdanaki varlık isimlerini küme olarak alınır. Küme alınmasının sebebi karşılaştırmanın rahat yapılması ('USD', 'EUR', 'Gold_Gram_TL' gibi anahtarlarla çalışıyor app.py de uyumlu olmalı)
-    if not wallet_asset_keys:
-         return {"error": "Risk analizi yapılacak cüzdanda Dolar, Euro veya Altın bulunmuyor."}
 
+# Tek simülasyonun günlük portföy patikalarından ufuk x güven seviyesi VaR/CVaR tablosunu hesaplayan fonksiyon
+# Her ufuk için patikaların o günkü değerleri bir kez sıralanır, tüm güven seviyeleri aynı sıralamadan okunur. Yeni seviye veya ufuk eklemek yeni simülasyon gerektirmez
+def risk_yuzeyi_hesapla(portfoy_patikalari, initial_value, ufuklar=RISK_UFUKLARI, guven_seviyeleri=RISK_GUVEN_SEVIYELERI): # (simülasyon, gün) boyutunda portföy değerleri, başlangıç değeri, gün ufukları ve güven seviyeleri
+    patikalar = np.asarray(portfoy_patikalari, dtype=float)
+    if patikalar.ndim != 2 or patikalar.shape[0] == 0:
+        return {}
 
-    print(f"Yıllık piyasa verileri çekiliyor ({API_YEARLY_URL})...")
-    yearly_data = yillik_veri_cek(API_YEARLY_URL) # local url den yıllık veriler çekiliyor
-    if "error" in yearly_data:
-        print(f"Hata: Yıllık piyasa verileri çekilemedi: {yearly_data['error']}")
-        return {"error": f"Risk analizi için gerekli yıllık piyasa verileri çekilemedi: {yearly_data['error']}"}
+    yuzey = {}
+    for ufuk in ufuklar:
+        if ufuk < 1 or ufuk > patikalar.shape[1]: # simüle edilmeyen ufuklar atlanır
+            print(f"Uyarı: {ufuk} günlük ufuk simülasyon süresini ({patikalar.shape[1]} gün) aşıyor, risk yüzeyine eklenmedi.")
+            continue
+        sirali = np.sort(patikalar[:, ufuk - 1]) # ufuk günündeki portföy değerleri, en kötüler başta
+        kumulatif = np.cumsum(sirali) # kuyruk ortalamaları her seviye için tekrar toplanmadan okunur
+        metrikler = {}
+        for confidence_level in guven_seviyeleri:
+            anahtar = f"{confidence_level*100:g}" # 0.95 -> "95", 0.995 -> "99.5"
+            index = int((1 - confidence_level) * len(sirali)) # var_hesapla ile aynı indeks
+            metrikler[f"VaR_{anahtar}"] = max(0.0, float(initial_value - sirali[index]))
+            metrikler[f"CVaR_{anahtar}"] = max(0.0, float(initial_value - kumulatif[index - 1] / index)) if index > 0 else 0.0
+        yuzey[ufuk] = metrikler
+    return yuzey
+
+
+
+# Akışlı (parça parça) VaR/CVaR tahmini için başlangıç durumunu oluşturan fonksiyon. Tüm sonuçlar yerine sadece en kötü kuyruk değerleri tutulur
+def akisli_risk_durumu_olustur(initial_value, confidence_level=0.95, max_simulations=1000000, z=1.96): # portföy başlangıç değeri, güven seviyesi, en fazla kaç patika geleceği ve güven aralığı için z değeri
+    p = 1 - confidence_level
+    kapasite = int(p * max_simulations + z * np.sqrt(max_simulations * p * (1 - p))) + 2 # en fazla patikada VaR indeksi ve güven aralığının üst sınırı bu tamponun içinde kalır. Böylece bellek patika sayısıyla değil kuyruk boyutuyla sınırlı olur
+    return {
+        "initial_value": initial_value,
+        "confidence_level": confidence_level,
+        "z": z,
+        "n": 0, # şu ana kadar işlenen patika sayısı
+        "kapasite": kapasite,
+        "kuyruk": np.array([]) # şu ana kadar görülen en küçük portföy değerleri
+    }
 
 
-    prices_dict = {} # sonuç olarak bu sözlükte cüzdanda ki isimleri ile çekilen yıllık fiyatları tutacak
-    for asset_key in wallet_asset_keys: # cüzdanda bulunan varlıklar alınır (EUR , USD , Gold_Gram_TL isimleriyle saklanır burada)
-         api_key = asset_key + "y" # local urlde verilerin sonunda "y" harfi uyumu bozduğundan üstekilerle eşleşmesi için y ekliyoruz
-         prices_dict[asset_key] = yearly_data.get(api_key, []) # boş liste koyulmasının sebebi verinin alınamaması durumunda hata vermemesi boş liste döndürmesi için
 
+# Yeni gelen simülasyon parçasını akışlı duruma ekleyen fonksiyon
+def akisli_risk_guncelle(durum, parca):
+    parca = np.asarray(parca, dtype=float)
+    durum["n"] += len(parca)
+    birlesik = np.concatenate([durum["kuyruk"], parca])
+    if len(birlesik) > durum["kapasite"]: # tampon taşarsa sadece en küçük "kapasite" kadar değer kısmi seçimle tutulur
+        birlesik = np.partition(birlesik, durum["kapasite"] - 1)[:durum["kapasite"]]
+    durum["kuyruk"] = birlesik
+    return durum
+
+
+
+# Akışlı durumdan VaR/CVaR ve güven aralığı yarı genişliklerini hesaplayan fonksiyon
+def akisli_risk_sonuc(durum):
+    confidence_level = durum["confidence_level"]
+    anahtar = int(confidence_level * 100)
+    n = durum["n"]
+    p = 1 - confidence_level
+    index = int(p * n) # var_hesapla ile aynı indeks tanımı
+    if n == 0 or index >= len(durum["kuyruk"]):
+        return {f"VaR_{anahtar}": 0.0, f"CVaR_{anahtar}": 0.0, f"VaR_{anahtar}_ga": float('inf'), f"CVaR_{anahtar}_ga": float('inf'), "num_simulations": n}
+
+    kuyruk = np.sort(durum["kuyruk"]) # sadece küçük kuyruk tamponu sıralanır
+    initial_value = durum["initial_value"]
+    z = durum["z"]
+    var_value = kuyruk[index]
+
+    # VaR için sıra istatistiği (binom) güven aralığı: gerçek kantil yaklaşık n*p ± z*sqrt(n*p*(1-p)) sıraları arasındadır
+    sapma = z * np.sqrt(n * p * (1 - p))
+    alt = max(0, int(np.floor(n * p - sapma)))
+    ust = min(len(kuyruk) - 1, int(np.ceil(n * p + sapma)))
+    var_ga = (kuyruk[ust] - kuyruk[alt]) / 2
+
+    if index > 0:
+        kayiplar = initial_value - kuyruk[:index]
+        cvar_loss = np.mean(kayiplar)
+        # CVaR tahmincisinin asimptotik varyansı: (kuyruk kayıplarının varyansı + (1-p)*(CVaR-VaR)^2) / (n*p)
+        kuyruk_varyansi = np.var(kayiplar, ddof=1) if index > 1 else 0.0
+        cvar_ga = z * np.sqrt((kuyruk_varyansi + (1 - p) * (cvar_loss - (initial_value - var_value)) ** 2) / (n * p))
+    else:
+        cvar_loss = 0.0
+        cvar_ga = float('inf')
 
-    valid_prices = {asset: prices for asset, prices in prices_dict.items() if prices and len(prices) > 1} # valid sözlüğü fiyatlarını çektiğimiz varlıkları (boş olmayanları) "varlık" : "fiyat olacak şekilde tek tek alır"
-    if not valid_prices:
-        print("Hata: Risk analizi için cüzdandaki varlıklar için yeterli geçerli fiyat serisi bulunamadı.")
-        missing_data_assets = wallet_asset_keys - set(valid_prices.keys()) # fiyat verisi olmayan varlıkları bulur ve mesaj olarak basar
-        error_message = f"Risk analizi yapılamıyor. Cüzdanınızda bulunan ancak analiz verisi (geçmiş fiyat) çekilemeyen/hesaplanamayan varlıklar: {list(missing_data_assets)}. Lütfen bu varlıklar için piyasa verisi kaynaklarını kontrol edin."
-        return {"error": error_message}
+    return {
+        f"VaR_{anahtar}": max(0.0, initial_value - var_value),
+        f"CVaR_{anahtar}": max(0.0, cvar_loss),
+        f"VaR_{anahtar}_ga": var_ga, # güven aralığı yarı genişlikleri (TL)
+        f"CVaR_{anahtar}_ga": cvar_ga,
+        f"VaR_{anahtar}_std_hata": var_ga / z, # standart hatalar
+        f"CVaR_{anahtar}_std_hata": cvar_ga / z,
+        "num_simulations": n
+    }
 
 
-    min_len = min(len(prices) for prices in valid_prices.values()) # fiyatları tek tek alıp en kısa olanı bulur
-    aligned_prices_dict = {asset: prices[:min_len] for asset, prices in valid_prices.items()} # cüzdanda olan varlıkların fiyatlarını üstte bulduğumuz en kısa olanına göre baştan itibaren keser böylece tüm varlıkların fiyat listeleri aynı uzunlukta olur
-    print(f"Veri hizalama tamamlandı. Kullanılan seriler {min_len} uzunluğunda.")
 
+# Simülasyonu parça parça çalıştırıp VaR/CVaR güven aralığı toleransın altına inince erken duran fonksiyon
+def mcs_akisli_risk_hesapla(drift_dict, volatility_dict, cholesky_matrix_L, initial_asset_values, confidence_level=0.95, tolerans=0.001, num_days=7, varlik_dagilimlari=None,
+                            parca_boyutu=2000, min_simulations=2000, max_simulations=1000000, seed=None, tablo_modu=False): # tolerans: güven aralığı yarı genişliğinin portföy değerine oranı (0.001 = %0.1)
+    initial_value = sum(initial_asset_values.values())
+    durum = akisli_risk_durumu_olustur(initial_value, confidence_level=confidence_level, max_simulations=max_simulations)
+    ornekleyiciler = {asset: sok_ornekleyici_olustur((varlik_dagilimlari or {}).get(asset), tablo_modu=tablo_modu) for asset in initial_asset_values} # örnekleyiciler parçalar arasında tekrar kurulmaz
+    kok_tohum = np.random.SeedSequence(seed)
+    anahtar = int(confidence_level * 100)
+    esik = tolerans * initial_value
+
+    print(f"Akışlı Monte Carlo simülasyonu başlatılıyor (parça: {parca_boyutu}, en fazla {max_simulations} simülasyon, tolerans: {esik:.2f} TL)...")
+    sonuc = akisli_risk_sonuc(durum)
+    while durum["n"] < max_simulations:
+        n_parca = min(parca_boyutu, max_simulations - durum["n"])
+        rng = np.random.default_rng(kok_tohum.spawn(1)[0]) # her parça aynı kök tohumdan sırayla türetilen bağımsız bir akış kullanır
+        parca = mcs_yap_vektorel(drift_dict, volatility_dict, cholesky_matrix_L, initial_asset_values, num_simulations=n_parca, num_days=num_days,
+                                 rng=rng, ornekleyiciler=ornekleyiciler, yazdir=False)
+        if len(parca) == 0: # boyut uyumsuzluğu gibi durumlarda boş sonuç döner
+            break
+        akisli_risk_guncelle(durum, parca)
+        sonuc = akisli_risk_sonuc(durum)
+        if durum["n"] >= min_simulations and sonuc[f"VaR_{anahtar}_ga"] <= esik and sonuc[f"CVaR_{anahtar}_ga"] <= esik: # iki güven aralığı da yeterince darsa durulur
+            print(f"  Yakınsama sağlandı ({durum['n']} simülasyon).")
+            break
+    print("Akışlı Monte Carlo simülasyonu tamamlandı.")
+    return sonuc
+
+
+
+# Ağırlıklı simülasyon sonuçlarından VaR/CVaR hesaplayan fonksiyon (kontrol değişkeni ağırlıkları için; eşit ağırlıkta risk_metrikleri_hesapla ile aynı mantıktır)
+def agirlikli_risk_metrikleri_hesapla(simulated_values, agirliklar, initial_value, confidence_level=0.95):
+    anahtar = int(confidence_level * 100)
+    if len(simulated_values) == 0:
+        return {f"VaR_{anahtar}": 0.0, f"CVaR_{anahtar}": 0.0}
+    p = 1 - confidence_level
+    sira = np.argsort(simulated_values)
+    degerler = np.asarray(simulated_values, dtype=float)[sira]
+    sirali_agirliklar = np.asarray(agirliklar, dtype=float)[sira]
+    kumulatif = np.cumsum(sirali_agirliklar) # ağırlıklı ampirik dağılım fonksiyonu
+    k = min(int(np.searchsorted(np.maximum.accumulate(kumulatif), p * (1 + 1e-9), side="right")), len(degerler) - 1) # ağırlıklı cdf'in p'yi ilk kez aştığı sıra (eşit ağırlıkta var_hesapla indeksiyle aynıdır) (ağırlıklar negatif olabildiği için monoton hale getirilir)
+    onceki = kumulatif[k - 1] if k > 0 else 0.0
+    kuyruk_toplami = np.dot(sirali_agirliklar[:k], degerler[:k]) + (p - onceki) * degerler[k] # sınırdaki patika kısmi ağırlıkla kuyruğa eklenir
+    return {
+        f"VaR_{anahtar}": max(0.0, initial_value - degerler[k]),
+        f"CVaR_{anahtar}": max(0.0, initial_value - kuyruk_toplami / p)
+    }
+
+
+
+# Sonuç dizisini eşit parçalara (partilere) bölerek VaR/CVaR standart hatasını tahmin eden fonksiyon (parti ortalamaları yöntemi)
+def parti_std_hatasi(simulated_values, initial_value, confidence_level=0.95, parti_sayisi=10):
+    anahtar = int(confidence_level * 100)
+    partiler = [risk_metrikleri_hesapla(parti, initial_value, confidence_level) for parti in np.array_split(np.asarray(simulated_values, dtype=float), parti_sayisi)]
+    return {
+        f"VaR_{anahtar}_std_hata": float(np.std([m[f"VaR_{anahtar}"] for m in partiler], ddof=1) / np.sqrt(parti_sayisi)),
+        f"CVaR_{anahtar}_std_hata": float(np.std([m[f"CVaR_{anahtar}"] for m in partiler], ddof=1) / np.sqrt(parti_sayisi))
+    }
+
+
+
+# Varyans azaltma modlarıyla (antitetik, sobol, kontrol) VaR/CVaR ve standart hatalarını hesaplayan fonksiyon
+def mcs_varyans_azaltmali_risk_hesapla(drift_dict, volatility_dict, cholesky_matrix_L, initial_asset_values, varyans_azaltma='antitetik', confidence_level=0.95, num_simulations=10000,
+                                       num_days=7, varlik_dagilimlari=None, tekrar_sayisi=10, seed=None, tablo_modu=False): # tekrar_sayisi: standart hata için birbirinden bağımsız tekrar (replikasyon) sayısı
+    anahtar = int(confidence_level * 100)
+    if varyans_azaltma not in ('antitetik', 'sobol', 'kontrol'):
+        raise ValueError(f"Bilinmeyen varyans azaltma modu: {varyans_azaltma!r} ('antitetik', 'sobol' veya 'kontrol' olmalı)")
+    assets = list(initial_asset_values.keys())
+    if len(assets) == 0 or cholesky_matrix_L.shape[0] != len(assets):
+        print("Hata: Simülasyon için varlık sayısı veya Cholesky matrisi boyutu uyumsuz.")
+        return {f"VaR_{anahtar}": 0.0, f"CVaR_{anahtar}": 0.0, "num_simulations": 0}
+
+    initial_value = sum(initial_asset_values.values())
+    ornekleyici_listesi = [sok_ornekleyici_olustur((varlik_dagilimlari or {}).get(asset), tablo_modu=tablo_modu) for asset in assets]
+    mu = np.array([drift_dict.get(asset, 0.0) for asset in assets])
+    sigma = np.array([volatility_dict.get(asset, 0.0) for asset in assets])
+    S_0 = np.array([initial_asset_values[asset] for asset in assets], dtype=float)
+
+    if varyans_azaltma == 'kontrol':
+        # kontrol değişkeni: aynı düzgün sayılar uydurulan dağılımlara yakın (medyan ve çeyrekler arası açıklığa göre eşlenmiş) normal dağılımdan geçirilir.
+        # Bu durumda şoklar tam normal olduğundan son portföy değerinin beklentisi analitik lognormal ortalamadır ve simülasyonla birebir ilişkilidir
+        merkezler = np.array([sok_ppf(o, 0.5) for o in ornekleyici_listesi])
+        olcekler = np.array([(sok_ppf(o, 0.75) - sok_ppf(o, 0.25)) / 1.349 for o in ornekleyici_listesi])
+        eps_ortalama = cholesky_matrix_L @ merkezler # korelasyonlu normal şokların ortalaması ve varyansı
+        eps_varyans = np.diag(cholesky_matrix_L @ np.diag(olcekler**2) @ cholesky_matrix_L.T)
+        kontrol_beklenen = np.sum(np.where(S_0 > 0, S_0 * np.exp(num_days * ((mu - 0.5 * sigma**2) + eps_ortalama + 0.5 * eps_varyans)), 0.0))
+
+    n_tekrar = max(1, num_simulations // tekrar_sayisi)
+    tohumlar = np.random.SeedSequence(seed).spawn(tekrar_sayisi)
+    print(f"Varyans azaltmalı Monte Carlo başlatılıyor (mod: {varyans_azaltma}, {tekrar_sayisi} x {n_tekrar} simülasyon)...")
+    tum_degerler, tum_kontroller, tekrar_metrikleri = [], [], []
+    for tohum in tohumlar: # her tekrar bağımsızdır (sobol için ayrı karıştırma, antitetik için çiftler aynı tekrarda kalır)
+        rng = np.random.default_rng(tohum)
+        Z, U = _sok_tensoru_uret(ornekleyici_listesi, n_tekrar, num_days, rng, varyans_azaltma=varyans_azaltma)
+        degerler, _ = _gbm_son_degerler(Z, mu, sigma, cholesky_matrix_L, S_0)
+        if varyans_azaltma == 'kontrol':
+            kontroller, _ = _gbm_son_degerler(merkezler + olcekler * stats.norm.ppf(U), mu, sigma, cholesky_matrix_L, S_0)
+            tekrar_metrikleri.append(agirlikli_risk_metrikleri_hesapla(degerler, _kontrol_agirliklari(kontroller, kontrol_beklenen), initial_value, confidence_level))
+            tum_kontroller.append(kontroller)
+        else:
+            tekrar_metrikleri.append(risk_metrikleri_hesapla(degerler, initial_value, confidence_level))
+        tum_degerler.append(degerler)
+
+    tum_degerler = np.concatenate(tum_degerler)
+    if varyans_azaltma == 'kontrol':
+        sonuc = agirlikli_risk_metrikleri_hesapla(tum_degerler, _kontrol_agirliklari(np.concatenate(tum_kontroller), kontrol_beklenen), initial_value, confidence_level)
+    else:
+        sonuc = risk_metrikleri_hesapla(tum_degerler, initial_value, confidence_level)
+
+    for metrik in (f"VaR_{anahtar}", f"CVaR_{anahtar}"): # tekrar tahminlerinin dağılımından birleşik tahminin standart hatası
+        sonuc[f"{metrik}_std_hata"] = float(np.std([m[metrik] for m in tekrar_metrikleri], ddof=1) / np.sqrt(tekrar_sayisi)) if tekrar_sayisi > 1 else float('nan')
+    sonuc["num_simulations"] = len(tum_degerler)
+    sonuc["varyans_azaltma"] = varyans_azaltma
+    print("Varyans azaltmalı Monte Carlo tamamlandı.")
+    return sonuc
+
+
+
+# Kontrol değişkeninin bilinen beklentisine göre patika ağırlıklarını hesaplayan fonksiyon (ağırlıklar toplamı 1'dir, kontrolün ağırlıklı ortalaması tam olarak beklentisine eşitlenir)
+def _kontrol_agirliklari(kontroller, kontrol_beklenen):
+    n = len(kontroller)
+    sapmalar = kontroller - np.mean(kontroller)
+    payda = np.sum(sapmalar**2)
+    if payda <= 0:
+        return np.full(n, 1.0 / n)
+    return 1.0 / n + (kontrol_beklenen - np.mean(kontroller)) * sapmalar / payda
+
+
+
+# Cornish-Fisher açılımı: normal dağılım kantilini çarpıklık ve fazla basıklığa göre düzeltir (s=0, k=0 iken normal kantil aynen döner)
+def cornish_fisher_kantil(z, carpiklik, basiklik):
+    return (z + (z**2 - 1) * carpiklik / 6
+              + (z**3 - 3 * z) * basiklik / 24
+              - (2 * z**3 - 5 * z) * carpiklik**2 / 36)
+
+
+
+# Birden fazla portföy için parametrik (analitik) VaR ve CVaR hesaplayan fonksiyon. Simülasyon yapılmaz, toplu tarama için milisaniyeler sürer
+# portfoyler: [{varlık: TL değeri}, ...] listesi. Kovaryans Cholesky matrisinden (Σ = L Lᵀ) geri elde edilir, yani kovaryans_hesapla'nın kurduğu matrisin aynısıdır
+def parametrik_risk_toplu(portfoyler, drift_dict, cholesky_matrix_L, varliklar, log_getiriler=None, num_days=7, confidence_level=0.95, cornish_fisher=True):
+    anahtar = int(confidence_level * 100)
+    if not portfoyler:
+        return []
+
+    W = np.array([[p.get(asset, 0.0) for asset in varliklar] for p in portfoyler], dtype=float) # (portföy, varlık) TL tutarları
+    toplam = W.sum(axis=1)
+    L = np.asarray(cholesky_matrix_L, dtype=float)
+    kovaryans = L @ L.T # günlük log getiri kovaryansı
+    mu = np.array([drift_dict.get(asset, 0.0) for asset in varliklar], dtype=float)
+
+    ortalama = num_days * (W @ mu) # ufuk boyunca beklenen TL değişimi (delta-normal: getiriler zamanda bağımsız kabul edilir)
+    sigma = np.sqrt(np.maximum(num_days * np.einsum('pi,ij,pj->p', W, kovaryans, W), 0.0)) # ufuk boyunca TL değişiminin standart sapması
+
+    carpiklik = np.zeros(len(portfoyler))
+    basiklik = np.zeros(len(portfoyler))
+    if cornish_fisher and log_getiriler:
+        R = pd.DataFrame(log_getiriler)[list(varliklar)].dropna().to_numpy() # (gün, varlık) geçmiş log getiriler
+        if len(R) > 3:
+            agirliklar = np.divide(W, toplam[:, None], out=np.zeros_like(W), where=toplam[:, None] > 0)
+            portfoy_getirileri = R @ agirliklar.T # (gün, portföy) her portföyün geçmiş günlük getirisi
+            carpiklik = np.nan_to_num(stats.skew(portfoy_getirileri, axis=0))
+            basiklik = np.nan_to_num(stats.kurtosis(portfoy_getirileri, axis=0)) # fazla basıklık (normal için 0)
+            olcek = np.sqrt(num_days) # ufka ölçeklemede bağımsız getiriler için çarpıklık √T, fazla basıklık T ile azalır
+            carpiklik = carpiklik / olcek
+            basiklik = basiklik / num_days
+
+    alfa = 1 - confidence_level
+    z = stats.norm.ppf(alfa) # sol kuyruk kantili (negatif)
+    z_cf = cornish_fisher_kantil(z, carpiklik, basiklik)
+    var_degerleri = np.maximum(-(ortalama + z_cf * sigma), 0.0)
 
+    # CVaR kuyruktaki kantillerin ortalamasıdır. Düzeltilmiş kantil fonksiyonu (0, alfa) aralığında orta nokta kuralıyla ortalanır
+    u = (np.arange(200) + 0.5) / 200 * alfa
+    z_kuyruk = stats.norm.ppf(u)
+    kuyruk_ortalamasi = cornish_fisher_kantil(z_kuyruk[None, :], carpiklik[:, None], basiklik[:, None]).mean(axis=1)
+    cvar_degerleri = np.maximum(-(ortalama + kuyruk_ortalamasi * sigma), var_degerleri) # sayısal ortalama VaR'ın altına düşmesin
+
+    yontem = "cornish_fisher" if cornish_fisher and log_getiriler else "delta_normal"
+    return [{
+        "initial_value": float(toplam[i]),
+        f"VaR_{anahtar}": float(var_degerleri[i]),
+        f"CVaR_{anahtar}": float(cvar_degerleri[i]),
+        "carpiklik": float(carpiklik[i]),
+        "basiklik": float(basiklik[i]),
+        "yontem": yontem
+    } for i in range(len(portfoyler))]
+
+
+
+# Tek portföy için parametrik VaR ve CVaR (toplu fonksiyonun tek elemanlı hali)
+def parametrik_risk_hesapla(initial_asset_values, drift_dict, cholesky_matrix_L, varliklar, log_getiriler=None, num_days=7, confidence_level=0.95, cornish_fisher=True):
+    return parametrik_risk_toplu([initial_asset_values], drift_dict, cholesky_matrix_L, varliklar, log_getiriler=log_getiriler,
+                                 num_days=num_days, confidence_level=confidence_level, cornish_fisher=cornish_fisher)[0]
+
+
+
+# Log getirilerden simülasyon girdilerini (dağılımlar, drift, volatilite, Cholesky matrisi) hesaplayan kalibrasyon fonksiyonu
+def kalibrasyon_yap(aligned_prices_dict, tarihler=None): # varlık isimleri ve aynı uzunluğa getirilmiş fiyat listeleri, verilirse fiyatların tarihleri (eskiden yeniye)
     print("Log getiriler hesaplanıyor...")
     log_getiriler = log_getiri_hesapla(aligned_prices_dict) # hizalanman fiyatları tek tek alır ve log getirilerini hesaplar
     print("Hesaplanan log getiriler anahtarları:", list(log_getiriler.keys()))
@@ -348,24 +1001,15 @@ def risk_analiz_yap(initial_asset_values: dict): # cüzdandaki varlıkları ve m
          print("Hata: Log getiri hesaplamada sorun oluştu veya tüm hizalanmış varlıklar için getiri hesaplanamadı.")
          return {"error": "Risk analizi için log getiri hesaplamada sorun oluştu."}
     log_returns_df = pd.DataFrame(log_getiriler) # hizalama adımı filan yapıldığından dolayı artık log getiriler dataframe'e dönüştürülür
+    if tarihler is not None and len(tarihler) == len(log_returns_df): # her getiri kapanışının yapıldığı güne bağlanır (GARCH durumu tamamlanmış günlere göre ilerler)
+        log_returns_df.index = pd.Index([str(t) for t in tarihler])
     print("Log getiriler DataFrame oluşturuldu. Boyut:", log_returns_df.shape)
     print("Log getiriler DataFrame sütunları:", log_returns_df.columns.tolist())
     
     
-    aday_dagilimlar = ['norm', 't', 'laplace'] # en iyi dağılımı bulma fonksiyonun da kullanılacak
-    varlik_dagilimlari = {} # her veri serisi yani varlık adını anahtar, o varlığa en iyi uyan dağılımın adı ve parametrelerini içeren bir başka sözlüğü değer olarak saklayacaktır
-    for asset in log_returns_df.columns: # logdf sütunları yani varlık isimleri tek tek alınır
-        seri = log_returns_df[asset].dropna() # ilgili varlığın log getirisi serisi alınır ve nan değerleri atılır
-        dagilim_adi, parametreler = en_iyi_dagilimi_bul(seri, aday_dagilimlar) #  en iyi dağılımı bulma fonksiyonu çağrılır ve dönen dağılım adı ve parametreleri alınır
-        varlik_dagilimlari[asset] = {'dist': dagilim_adi, 'params': parametreler} # her varlık için dağılım adı ve parametreleri saklanır (iç içe sözlük olarak en üstte boş sözlük tanımlanırken bahsedilmişti)
-
-
-    if set(log_getiriler.keys()) != wallet_asset_keys: # hesaplanan log getiri varlıkları ile cüzdandaki varlıkları karşılaştırır
-         print("Hata: Log getiri anahtarları ile cüzdan varlık anahtarları eşleşmiyor")
-         print("Cüzdan Anahtarları:", list(wallet_asset_keys))
-         print("Log Getiri Anahtarları:", list(log_getiriler.keys()))
-         return {"error": "Varlık anahtarları eşleşmedi."}
-    print("Varlık eşleşme kontrolü başarılı.")
+    # her veri serisi yani varlık adını anahtar, o varlığa en iyi uyan dağılımın adı ve parametrelerini içeren bir başka sözlüğü değer olarak saklayacaktır
+    seriler = {asset: log_returns_df[asset].dropna() for asset in log_returns_df.columns} # ilgili varlığın log getirisi serisi alınır ve nan değerleri atılır
+    varlik_dagilimlari = en_iyi_dagilimlari_bul(seriler, ADAY_DAGILIMLAR, num_workers=DAGILIM_ISCI_SAYISI) # tüm varlık ve aday çiftleri birlikte değerlendirilir
 
 
     print("Drift hesaplanıyor...")
@@ -379,7 +1023,7 @@ def risk_analiz_yap(initial_asset_values: dict): # cüzdandaki varlıkları ve m
     volatility = {}
     if GARCH_AVAILABLE: # en baştaki kontrolün aynısı true ise devam
         print("GARCH(1,1) ile volatilite hesaplanıyor...")
-        volatility = garch_volalite_hesapla(log_returns_df) # hazırlanan log getiri df garch fonk. gönderilir
+        volatility = garch_volalite_artimli_hesapla(log_returns_df) # hazırlanan log getiri df garch fonk. gönderilir, kayıtlı parametreler varsa sadece yeni günler özyinelemeyle eklenir
         if not all(v is not None and v > 0 for v in volatility.values()): # garch sonucu döndürülen sözlükteli volalitelerin hepsinin eksiksiz ve pozitiflik kontrolü
              print("Uyarı: GARCH volatilitesi hesaplanamadı veya sıfır/negatif. Basit standart sapma kullanılacak.")
              volatility = volalite_hesapla(log_returns_df) # eksiklik veya pozitif olmama durumunda normal volalite hesaplanır
@@ -400,29 +1044,257 @@ def risk_analiz_yap(initial_asset_values: dict): # cüzdandaki varlıkları ve m
          print("Hata: Cholesky matrisi hesaplanamadı veya boş.")
          return {"error": "Risk analizi için kovaryans/korelasyon matrisi hesaplanamadı."}
 
+    return {
+        "varliklar": log_returns_df.columns.tolist(), # Cholesky matrisinin satır sırası bu varlık sırasıdır
+        "drift": drift,
+        "volatility": volatility,
+        "varlik_dagilimlari": varlik_dagilimlari,
+        "cholesky_matrix_L": cholesky_matrix_L,
+        "log_getiriler": {asset: log_returns_df[asset].tolist() for asset in log_returns_df.columns} # parametrik yöntemde portföy getirisinin çarpıklık ve basıklığı için saklanır
+    }
+
+
 
-    num_days_simulation = 7 # Kaç gün sonrası tahmin edilecek (1 hafta)
-    num_monte_carlo_simulations = 10000 # kaç simülasyon yapılacağı (10bin kere 7 günlük patikalar yapılacak)
+# Kalibrasyon önbelleği veritabanına bağlanan fonksiyon (tablo yoksa oluşturur)
+def _kalibrasyon_db_baglan():
+    conn = sqlite3.connect(KALIBRASYON_DB)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS kalibrasyon_onbellegi (
+            varlik_anahtari TEXT PRIMARY KEY,
+            veri_ozeti TEXT,
+            olusturma_zamani REAL,
+            kalibrasyon TEXT
+        )
+    ''') # varlık kümesi başına tek satır tutulur, fiyat özeti değişince satır yenisiyle değiştirilir
+    return conn
 
-    simulated_values = mcs_yap(
-        drift,  # log getirilerin ortalaması
-        volatility, # Tercihen GARCH volatilitesi, yoksa basit volatilite kullanılır
-        cholesky_matrix_L, # Hesaplanan Cholesky L matrisi
-        initial_asset_values, # Başlangıç varlık değerleri (Sadece cüzdandaki varlıklar)
-        num_simulations=num_monte_carlo_simulations,
-        num_days=num_days_simulation,
-        varlik_dagilimlari=varlik_dagilimlari # varlık dağılımı bilgileri (dağılım adı ve parametreleri)
-    )
 
-    if not simulated_values: # herhangi bir hata durumunda boş liste dönerse sim durur
-        print("Hata: Monte Carlo simülasyonu sonuç üretmedi.")
-        return {"error": "Monte Carlo simülasyonu sonuç üretmedi. Lütfen veri kaynaklarını ve parametreleri kontrol edin."}
+
+# Fiyat serilerinin özetini (hash) hesaplayan fonksiyon. Yeni günlük veri gelince özet değişir ve önbellek kendiliğinden geçersiz olur
+# Sadece tamamlanmış günlük barlarla çağrılır, gün içinde değişen bugünün barı özete girerse her fiyat yenilemesinde önbellek ıskalanır
+def fiyat_ozeti_hesapla(aligned_prices_dict):
+    ozet = hashlib.sha256()
+    for asset in sorted(aligned_prices_dict):
+        ozet.update(asset.encode("utf-8"))
+        ozet.update(np.asarray(aligned_prices_dict[asset], dtype=float).tobytes())
+    return ozet.hexdigest()
+
+
+
+# Kalibrasyonu önbellekten getiren, yoksa veya fiyatlar değiştiyse hesaplayıp önbelleğe yazan fonksiyon
+# aligned_prices_dict sadece tamamlanmış günleri içermelidir (bkz. analiz_kalibrasyonu_hazirla), böylece anahtar gün içinde sabit kalır
+def kalibrasyonu_getir(aligned_prices_dict, tarihler=None):
+    varlik_anahtari = ",".join(sorted(aligned_prices_dict))
+    son_tarih = tarihler[-1] if tarihler else "-"
+    pencere = len(next(iter(aligned_prices_dict.values()), []))
+    veri_ozeti = f"v{KALIBRASYON_SURUMU}:{son_tarih}:{pencere}:{fiyat_ozeti_hesapla(aligned_prices_dict)}" # sürüm, son tamamlanmış gün ve pencere uzunluğu özete eklenir, eski biçimdeki kayıtlar eşleşmez
+
+    try:
+        conn = _kalibrasyon_db_baglan()
+        try:
+            satir = conn.execute("SELECT veri_ozeti, kalibrasyon FROM kalibrasyon_onbellegi WHERE varlik_anahtari = ?", (varlik_anahtari,)).fetchone()
+        finally:
+            conn.close()
+        if satir and satir[0] == veri_ozeti: # aynı varlıklar ve aynı fiyatlar için önceden hesaplanmış kalibrasyon var
+            print(f"Kalibrasyon önbellekten alındı ({varlik_anahtari}).")
+            return _kalibrasyonu_coz(json.loads(satir[1]))
+    except Exception as e: # önbellek okunamazsa analiz durmaz, kalibrasyon yeniden hesaplanır
+        print(f"Uyarı: Kalibrasyon önbelleği okunamadı: {e}")
+
+    kalibrasyon = kalibrasyon_yap(aligned_prices_dict, tarihler)
+    if "error" in kalibrasyon: # hatalı sonuçlar önbelleğe yazılmaz
+        return kalibrasyon
+
+    try:
+        conn = _kalibrasyon_db_baglan()
+        try:
+            conn.execute("INSERT OR REPLACE INTO kalibrasyon_onbellegi (varlik_anahtari, veri_ozeti, olusturma_zamani, kalibrasyon) VALUES (?, ?, ?, ?)",
+                         (varlik_anahtari, veri_ozeti, time.time(), json.dumps(_kalibrasyonu_kodla(kalibrasyon))))
+            conn.commit()
+        finally:
+            conn.close()
+    except Exception as e:
+        print(f"Uyarı: Kalibrasyon önbelleğe yazılamadı: {e}")
+    return kalibrasyon
+
+
+
+# Kalibrasyon sözlüğünü json'a yazılabilir hale getiren fonksiyon (numpy tipleri listeye ve float'a çevrilir)
+def _kalibrasyonu_kodla(kalibrasyon):
+    return {
+        "varliklar": kalibrasyon["varliklar"],
+        "drift": {asset: float(v) for asset, v in kalibrasyon["drift"].items()},
+        "volatility": {asset: float(v) for asset, v in kalibrasyon["volatility"].items()},
+        "varlik_dagilimlari": {asset: {"dist": d["dist"], "params": [float(p) for p in d["params"]] if d["params"] is not None else None}
+                               for asset, d in kalibrasyon["varlik_dagilimlari"].items()},
+        "cholesky_matrix_L": np.asarray(kalibrasyon["cholesky_matrix_L"], dtype=float).tolist(),
+        "log_getiriler": {asset: [float(v) for v in degerler] for asset, degerler in kalibrasyon["log_getiriler"].items()}
+    }
+
 
 
+# json'dan okunan kalibrasyonu simülasyonun beklediği tiplere geri çeviren fonksiyon
+def _kalibrasyonu_coz(veri):
+    veri["varlik_dagilimlari"] = {asset: {"dist": d["dist"], "params": tuple(d["params"]) if d["params"] is not None else None}
+                                  for asset, d in veri["varlik_dagilimlari"].items()}
+    veri["cholesky_matrix_L"] = np.array(veri["cholesky_matrix_L"], dtype=float)
+    return veri
+
+
+
+# Bugünün geçici barını önbellekteki (tamamlanmış günlerle yapılmış) kalibrasyona uygulayan fonksiyon
+# Her varlığın GARCH volatilitesi kayıtlı durumdan tek adım ilerletilir (duruma yazılmaz), Cholesky matrisi satır satır yeni volatiliteye ölçeklenir (L = D * chol(rho))
+def gecici_bari_uygula(kalibrasyon, gecici_getiriler, son_tarih):
+    if not GARCH_AVAILABLE or not gecici_getiriler:
+        return kalibrasyon
+    try:
+        conn = _garch_db_baglan()
+        try:
+            durumlar = {satir[0]: satir[1:] for satir in conn.execute("SELECT varlik, parametreler, son_varyans, son_getiriler, son_tarih FROM garch_durumu")}
+        finally:
+            conn.close()
+    except Exception as e: # durum okunamazsa tamamlanmış günlerin kalibrasyonu aynen kullanılır
+        print(f"Uyarı: GARCH durumu okunamadı, bugünün barı kalibrasyona uygulanmadı: {e}")
+        return kalibrasyon
+
+    volatility = dict(kalibrasyon["volatility"])
+    for asset, r in gecici_getiriler.items():
+        durum = durumlar.get(asset)
+        if durum is None or durum[3] != son_tarih or not volatility.get(asset): # durum başka bir güne bağlıysa (ör. GARCH yerine std kullanıldı) dokunulmaz
+            continue
+        varyans, _ = _garch_ilerlet(json.loads(durum[0]), json.loads(durum[2])[-1], durum[1], [r])
+        volatility[asset] = float(np.sqrt(varyans))
+
+    oranlar = np.array([volatility[a] / kalibrasyon["volatility"][a] if kalibrasyon["volatility"][a] else 1.0 for a in kalibrasyon["varliklar"]])
+    return {**kalibrasyon, "volatility": volatility, "cholesky_matrix_L": np.asarray(kalibrasyon["cholesky_matrix_L"]) * oranlar[:, None]}
+
+
+
+# Cüzdandaki varlıklar için yıllık fiyatları çekip hizalayan ve kalibrasyonu (önbellekten veya yeniden) hazırlayan fonksiyon. Monte Carlo ve parametrik analiz aynı hazırlığı kullanır
+def analiz_kalibrasyonu_hazirla(wallet_asset_keys):
+    print(f"Yıllık piyasa verileri çekiliyor ({API_YEARLY_URL})...")
+    yearly_data = yillik_veri_cek(API_YEARLY_URL) # local url den yıllık veriler çekiliyor
+    if "error" in yearly_data:
+        print(f"Hata: Yıllık piyasa verileri çekilemedi: {yearly_data['error']}")
+        return {"error": f"Risk analizi için gerekli yıllık piyasa verileri çekilemedi: {yearly_data['error']}"}
+
+
+    prices_dict = {} # sonuç olarak bu sözlükte cüzdanda ki isimleri ile çekilen yıllık fiyatları tutacak
+    for asset_key in sorted(wallet_asset_keys): # cüzdanda bulunan varlıklar sabit sırayla alınır (EUR , USD , Gold_Gram_TL isimleriyle saklanır burada)
+         api_key = asset_key + "y" # local urlde verilerin sonunda "y" harfi uyumu bozduğundan üstekilerle eşleşmesi için y ekliyoruz
+         prices_dict[asset_key] = yearly_data.get(api_key, []) # boş liste koyulmasının sebebi verinin alınamaması durumunda hata vermemesi boş liste döndürmesi için
+
+
+    valid_prices = {asset: prices for asset, prices in prices_dict.items() if prices and len(prices) > 1} # valid sözlüğü fiyatlarını çektiğimiz varlıkları (boş olmayanları) "varlık" : "fiyat olacak şekilde tek tek alır"
+    if not valid_prices:
+        print("Hata: Risk analizi için cüzdandaki varlıklar için yeterli geçerli fiyat serisi bulunamadı.")
+        missing_data_assets = wallet_asset_keys - set(valid_prices.keys()) # fiyat verisi olmayan varlıkları bulur ve mesaj olarak basar
+        error_message = f"Risk analizi yapılamıyor. Cüzdanınızda bulunan ancak analiz verisi (geçmiş fiyat) çekilemeyen/hesaplanamayan varlıklar: {list(missing_data_assets)}. Lütfen bu varlıklar için piyasa verisi kaynaklarını kontrol edin."
+        return {"error": error_message}
+
+
+    min_len = min(len(prices) for prices in valid_prices.values()) # fiyatları tek tek alıp en kısa olanı bulur
+    aligned_prices_dict = {asset: prices[:min_len][::-1] for asset, prices in valid_prices.items()} # cüzdanda olan varlıkların fiyatlarını üstte bulduğumuz en kısa olanına göre baştan itibaren keser böylece tüm varlıkların fiyat listeleri aynı uzunlukta olur. API en yeni günü başta verdiği için liste ters çevrilerek eskiden yeniye sıralanır (getiriler ve GARCH zaman sırasıyla hesaplanır)
+    print(f"Veri hizalama tamamlandı. Kullanılan seriler {min_len} uzunluğunda.")
+    tarihler = yearly_data.get("tarihler") or []
+    tarihler = tarihler[:min_len][::-1] if len(tarihler) >= min_len else None # fiyatlarla aynı kesme ve sıralama
+
+    gecici_getiriler = {} # bugünün barı gün içinde değiştiğinden kalibrasyona ve önbellek anahtarına girmez, sonradan geçici olarak uygulanır
+    if tarihler and tarihler[-1] >= _bugun() and min_len > 2:
+        gecici_getiriler = {asset: float(np.log(prices[-1] / prices[-2])) for asset, prices in aligned_prices_dict.items() if prices[-1] > 0 and prices[-2] > 0}
+        aligned_prices_dict = {asset: prices[:-1] for asset, prices in aligned_prices_dict.items()}
+        tarihler = tarihler[:-1]
+
+
+    kalibrasyon = kalibrasyonu_getir(aligned_prices_dict, tarihler) # tamamlanmış günler değişmediyse (gün içinde) kalibrasyon önbellekten gelir, sadece simülasyon çalışır
+    if "error" in kalibrasyon:
+        return kalibrasyon
+    kalibrasyon = gecici_bari_uygula(kalibrasyon, gecici_getiriler, tarihler[-1] if tarihler else None)
+
+
+    if set(kalibrasyon["varliklar"]) != wallet_asset_keys: # kalibre edilen (log getirisi hesaplanan) varlıklar ile cüzdandaki varlıkları karşılaştırır
+         print("Hata: Log getiri anahtarları ile cüzdan varlık anahtarları eşleşmiyor")
+         print("Cüzdan Anahtarları:", list(wallet_asset_keys))
+         print("Log Getiri Anahtarları:", kalibrasyon["varliklar"])
+         return {"error": "Varlık anahtarları eşleşmedi."}
+    print("Varlık eşleşme kontrolü başarılı.")
+    return kalibrasyon
+
+
+
+def risk_analiz_yap(initial_asset_values: dict, num_simulations=10000, num_workers=1, seed=None, tolerans=None, varyans_azaltma=None, num_days=7, ufuklar=None, kalibrasyon=None): # cüzdandaki varlıkları ve miktarılarını sözlük olarak alacak, simülasyon sayısı, paralel işçi sayısı, tekrarlanabilirlik için tohum, erken durma toleransı (verilirse num_simulations üst sınır olur), varyans azaltma modu ('antitetik', 'sobol', 'kontrol'), tahmin ufku (gün), risk yüzeyinde raporlanacak gün ufukları (verilmezse sadece num_days, ör. RISK_UFUKLARI) ve aynı varlıklar için önceden hazırlanmış kalibrasyon (verilmezse burada hazırlanır)
+    initial_portfolio_value = sum(initial_asset_values.values()) # cüzdandan alınan varlıkların toplam değeri hesaplanır
+    if initial_portfolio_value <= 0: # varlık kontrolü
+         return {"error": "Risk analizi için portföy değeri sıfır veya negatif olamaz."}
+
+
+    wallet_asset_keys = set(initial_asset_values.keys()) # cüzdanaki varlık isimlerini küme olarak alınır. Küme alınmasının sebebi karşılaştırmanın rahat yapılması ('USD', 'EUR', 'Gold_Gram_TL' gibi anahtarlarla çalışıyor app.py de uyumlu olmalı)
+    if not wallet_asset_keys:
+         return {"error": "Risk analizi yapılacak cüzdanda Dolar, Euro veya Altın bulunmuyor."}
+
+
+    if kalibrasyon is None:
+        kalibrasyon = analiz_kalibrasyonu_hazirla(wallet_asset_keys) # fiyatlar çekilir, hizalanır ve kalibre edilir
+    if "error" in kalibrasyon:
+        return kalibrasyon
+
+
+    drift = kalibrasyon["drift"]
+    volatility = kalibrasyon["volatility"]
+    varlik_dagilimlari = kalibrasyon["varlik_dagilimlari"]
+    cholesky_matrix_L = kalibrasyon["cholesky_matrix_L"]
+    initial_asset_values = {asset: initial_asset_values[asset] for asset in kalibrasyon["varliklar"]} # simülasyonda varlık sırası Cholesky matrisinin satır sırasıyla aynı olmalı
+
+
+    num_days_simulation = num_days # Kaç gün sonrası tahmin edilecek (varsayılan 1 hafta)
+    ufuklar = tuple(sorted(set(ufuklar))) if ufuklar else (num_days_simulation,) # ek ufuk istenmedikçe fazladan gün simüle edilmez
+    num_days_yuzey = max(max(ufuklar), num_days_simulation) # risk yüzeyi için patikalar en uzun istenen ufka kadar simüle edilir, ana sonuç num_days. günden okunur
+    num_monte_carlo_simulations = num_simulations # kaç simülasyon yapılacağı (varsayılan 10bin kere 7 günlük patikalar yapılacak)
     confidence_level = 0.95
-    print(f"Risk metrikleri hesaplanıyor (Güven Seviyesi: %{int(confidence_level*100)})...")
-    risk_metrics = risk_metrikleri_hesapla(simulated_values, initial_portfolio_value, confidence_level=confidence_level)
-    # sim sonuçları , başlangıç portföy değeri ve güven aralığı ile risk metrikleri hesaplanır
+
+    if tolerans is not None: # tolerans verilirse simülasyon parça parça çalışır ve güven aralığı daralınca erken durur
+        risk_metrics = mcs_akisli_risk_hesapla(drift, volatility, cholesky_matrix_L, initial_asset_values, confidence_level=confidence_level, tolerans=tolerans,
+                                               num_days=num_days_simulation, varlik_dagilimlari=varlik_dagilimlari, max_simulations=num_monte_carlo_simulations, seed=seed)
+        if risk_metrics["num_simulations"] == 0:
+            print("Hata: Monte Carlo simülasyonu sonuç üretmedi.")
+            return {"error": "Monte Carlo simülasyonu sonuç üretmedi. Lütfen veri kaynaklarını ve parametreleri kontrol edin."}
+    elif varyans_azaltma is not None: # aynı doğruluğa daha az patikayla ulaşmak için varyans azaltma modu
+        risk_metrics = mcs_varyans_azaltmali_risk_hesapla(drift, volatility, cholesky_matrix_L, initial_asset_values, varyans_azaltma=varyans_azaltma, confidence_level=confidence_level,
+                                                          num_simulations=num_monte_carlo_simulations, num_days=num_days_simulation, varlik_dagilimlari=varlik_dagilimlari, seed=seed)
+        if risk_metrics["num_simulations"] == 0:
+            print("Hata: Monte Carlo simülasyonu sonuç üretmedi.")
+            return {"error": "Monte Carlo simülasyonu sonuç üretmedi. Lütfen veri kaynaklarını ve parametreleri kontrol edin."}
+    else:
+        portfoy_patikalari = mcs_paralel_yap(
+            drift,  # log getirilerin ortalaması
+            volatility, # Tercihen GARCH volatilitesi, yoksa basit volatilite kullanılır
+            cholesky_matrix_L, # Hesaplanan Cholesky L matrisi
+            initial_asset_values, # Başlangıç varlık değerleri (Sadece cüzdandaki varlıklar)
+            num_simulations=num_monte_carlo_simulations,
+            num_days=num_days_yuzey,
+            varlik_dagilimlari=varlik_dagilimlari, # varlık dağılımı bilgileri (dağılım adı ve parametreleri)
+            num_workers=num_workers, # 1 ise parçalar aynı süreçte sırayla çalışır
+            seed=seed,
+            patikalari_don=True # her günün portföy değeri tutulur
+        )
+        simulated_values = portfoy_patikalari[:, num_days_simulation - 1] # ana sonuç için 7. gün değerleri
+
+        if len(simulated_values) == 0: # herhangi bir hata durumunda boş dizi dönerse sim durur
+            print("Hata: Monte Carlo simülasyonu sonuç üretmedi.")
+            return {"error": "Monte Carlo simülasyonu sonuç üretmedi. Lütfen veri kaynaklarını ve parametreleri kontrol edin."}
+
+        print(f"Risk metrikleri hesaplanıyor (Güven Seviyesi: %{int(confidence_level*100)})...")
+        risk_metrics = risk_metrikleri_hesapla(simulated_values, initial_portfolio_value, confidence_level=confidence_level)
+        risk_metrics.update(parti_std_hatasi(simulated_values, initial_portfolio_value, confidence_level=confidence_level)) # düz monte carlo için standart hata parti ortalamalarıyla tahmin edilir
+        # sim sonuçları , başlangıç portföy değeri ve güven aralığı ile risk metrikleri hesaplanır
+        risk_metrics["risk_yuzeyi"] = risk_yuzeyi_hesapla(portfoy_patikalari, initial_portfolio_value, ufuklar=ufuklar) # aynı patikalardan istenen ufuklar ve tüm güven seviyeleri
+
+    if "risk_yuzeyi" not in risk_metrics: # erken durma ve varyans azaltma modları patika tutmaz, yüzeyde sadece hesaplanan ufuk ve güven seviyesi bulunur (diğer hücreler için düz simülasyon gerekir)
+        anahtar = f"{confidence_level*100:g}"
+        risk_metrics["risk_yuzeyi"] = {num_days_simulation: {f"VaR_{anahtar}": float(risk_metrics.get(f"VaR_{int(confidence_level*100)}", 0.0)),
+                                                             f"CVaR_{anahtar}": float(risk_metrics.get(f"CVaR_{int(confidence_level*100)}", 0.0))}}
+        if set(ufuklar) != {num_days_simulation}:
+            print(f"Uyarı: Erken durma/varyans azaltma modunda risk yüzeyi sadece {num_days_simulation} günlük ufuk için hesaplanır.")
 
 
     wallet_volatility = {asset: volatility.get(asset, 0.0) for asset in initial_asset_values.keys()} # cüzdanda bulunan varlıklar için yeni sözlük oluşturulur ve volaliteleri atanır yoksa oto 0 atanır
@@ -442,6 +1314,10 @@ def risk_analiz_yap(initial_asset_values: dict): # cüzdandaki varlıkları ve m
         "initial_value": initial_portfolio_value,
         f"VaR_{int(confidence_level*100)}": risk_metrics.get(f"VaR_{int(confidence_level*100)}", 0.0), # belirtilen anahtar yoksa .get ile eksikliklerde 0.0 atanır
         f"CVaR_{int(confidence_level*100)}": risk_metrics.get(f"CVaR_{int(confidence_level*100)}", 0.0),
+        f"VaR_{int(confidence_level*100)}_std_hata": risk_metrics.get(f"VaR_{int(confidence_level*100)}_std_hata"), # tahminlerin standart hataları
+        f"CVaR_{int(confidence_level*100)}_std_hata": risk_metrics.get(f"CVaR_{int(confidence_level*100)}_std_hata"),
+        "num_simulations": risk_metrics.get("num_simulations", num_monte_carlo_simulations), # erken durmada kullanılan patika sayısı daha az olabilir
+        "risk_yuzeyi": risk_metrics.get("risk_yuzeyi", {}), # {ufuk_gun: {"VaR_90": ..., "CVaR_90": ..., ...}} (erken durma ve varyans azaltma modlarında sadece {num_days: {"VaR_95", "CVaR_95"}})
         "risk_ranking": risk_ranking_dict,
         "suggestions": suggestions
     }
@@ -450,6 +1326,97 @@ def risk_analiz_yap(initial_asset_values: dict): # cüzdandaki varlıkları ve m
 
 
 
+# Monte Carlo bitmeden gösterilecek anlık risk tahmini. Kalibrasyon önbellekteyse veri çekme dışında milisaniyeler sürer
+# Ardından risk_analiz_yap çağrılacaksa kalibrasyon bir kez analiz_kalibrasyonu_hazirla ile hazırlanıp ikisine de verilir (veri iki kez çekilmesin)
+def hizli_risk_analiz_yap(initial_asset_values: dict, num_days=7, confidence_level=0.95, cornish_fisher=True, kalibrasyon=None):
+    initial_portfolio_value = sum(initial_asset_values.values())
+    if initial_portfolio_value <= 0:
+         return {"error": "Risk analizi için portföy değeri sıfır veya negatif olamaz."}
+    if not initial_asset_values:
+         return {"error": "Risk analizi yapılacak cüzdanda Dolar, Euro veya Altın bulunmuyor."}
+
+    if kalibrasyon is None:
+        kalibrasyon = analiz_kalibrasyonu_hazirla(set(initial_asset_values.keys()))
+    if "error" in kalibrasyon:
+        return kalibrasyon
+
+    sonuc = parametrik_risk_hesapla(initial_asset_values, kalibrasyon["drift"], kalibrasyon["cholesky_matrix_L"], kalibrasyon["varliklar"],
+                                    log_getiriler=kalibrasyon.get("log_getiriler"), num_days=num_days, confidence_level=confidence_level, cornish_fisher=cornish_fisher)
+    print(f"Parametrik ({sonuc['yontem']}) risk tahmini tamamlandı.")
+    return sonuc
+
+
+
+TOPLU_RISK_BLOK_BOYUTU = 256 # toplu analizde (simülasyon, portföy) değer matrisi bu kadar portföylük bloklarla kurulur (10bin patika x 256 portföy ~ 20 MB)
+
+
+
+# Çok sayıda portföyün riskini tek kalibrasyonla hesaplayan fonksiyon. portfoyler {portfoy_id: {varlık anahtarı: TL değeri}} sözlüğüdür
+# Portföyler varlık kümelerine göre gruplanır, simülasyon portföy başına değil küme başına bir kez, her varlık 1 TL ile başlatılarak yapılır. Her patikanın varlık büyüme çarpanları (simülasyon, varlık) matrisi
+# portföy tutarları matrisiyle çarpılınca gruptaki tüm portföylerin son değerleri elde edilir (GBM değerleri başlangıç tutarıyla doğrusal olduğundan tek tek simülasyonla aynı dağılım)
+# Her küme birleşim kovaryansının kendi alt bloğunun Cholesky ayrışımını kullanır, böylece bir portföyün sonucu toplu çağrıda başka hangi portföylerin bulunduğuna bağlı olmaz
+# Tüm kümeler aynı tohumdan başlar (ortak rastgele sayılar): portföyler arası farklar daha az gürültülüdür ama tahmin hataları portföyler arasında bağımsız değildir
+# parametrik True ise simülasyon yerine parametrik_risk_toplu kullanılır. {"sonuclar": {portfoy_id: {"initial_value", "VaR_95", "CVaR_95"}}} döner, sonuçlar girdi sırasındadır
+# Hata durumunda {"sonuclar": {}, "error": ...} döner. Hata anahtarı portföy id'leriyle aynı seviyede değildir ("error" adlı bir portföy hata sanılmasın)
+def toplu_risk_analiz_yap(portfoyler: dict, num_simulations=10000, num_days=7, confidence_level=0.95, seed=None, parametrik=False):
+    anahtar = int(confidence_level * 100)
+    dolu_portfoyler = {portfoy_id: degerler for portfoy_id, degerler in portfoyler.items() if sum(degerler.values()) > 0}
+    sonuclar = {portfoy_id: {"initial_value": float(sum(degerler.values())), f"VaR_{anahtar}": 0.0, f"CVaR_{anahtar}": 0.0}
+                for portfoy_id, degerler in portfoyler.items() if portfoy_id not in dolu_portfoyler} # boş portföylerde risk yoktur
+    if not dolu_portfoyler:
+        return {"sonuclar": sonuclar}
+
+    tum_varliklar = {asset for degerler in dolu_portfoyler.values() for asset, deger in degerler.items() if deger > 0}
+    kalibrasyon = analiz_kalibrasyonu_hazirla(tum_varliklar) # tüm portföylerdeki varlıkların birleşimi için tek veri çekme ve kalibrasyon
+    if "error" in kalibrasyon:
+        return {"sonuclar": {}, "error": kalibrasyon["error"]}
+    varliklar = kalibrasyon["varliklar"]
+    portfoy_idleri = list(dolu_portfoyler)
+
+    if parametrik:
+        parametrik_sonuclar = parametrik_risk_toplu([dolu_portfoyler[p] for p in portfoy_idleri], kalibrasyon["drift"], kalibrasyon["cholesky_matrix_L"], varliklar,
+                                                    log_getiriler=kalibrasyon.get("log_getiriler"), num_days=num_days, confidence_level=confidence_level)
+        sonuclar.update(zip(portfoy_idleri, parametrik_sonuclar))
+        print(f"Toplu parametrik risk analizi tamamlandı ({len(portfoy_idleri)} portföy).")
+        return {"sonuclar": {portfoy_id: sonuclar[portfoy_id] for portfoy_id in portfoyler}} # girdi sırası korunur
+
+    L = np.asarray(kalibrasyon["cholesky_matrix_L"], dtype=float)
+    kovaryans = L @ L.T # birleşim kovaryansı, her küme kendi satır/sütunlarını alır
+    gruplar = {} # varlık kümesi (Cholesky sırasıyla) -> portföy id'leri
+    for portfoy_id in portfoy_idleri:
+        kume = tuple(asset for asset in varliklar if dolu_portfoyler[portfoy_id].get(asset, 0.0) > 0)
+        gruplar.setdefault(kume, []).append(portfoy_id)
+
+    kok_tohum = np.random.SeedSequence(seed) # seed None olsa da tüm kümeler aynı akışı kullanır
+    index = int((1 - confidence_level) * num_simulations) # var_hesapla ile aynı indeks
+    for kume, kume_portfoyleri in gruplar.items():
+        sira = [varliklar.index(asset) for asset in kume]
+        alt_kovaryans = kovaryans[np.ix_(sira, sira)]
+        try:
+            alt_L = np.linalg.cholesky(alt_kovaryans)
+        except np.linalg.LinAlgError: # kovaryans_hesapla ile aynı yedek: korelasyonsuz standart sapma matrisi
+            alt_L = np.diag(np.sqrt(np.maximum(np.diag(alt_kovaryans), 0.0)))
+        _, buyume_carpanlari = mcs_yap_vektorel(kalibrasyon["drift"], kalibrasyon["volatility"], alt_L, {asset: 1.0 for asset in kume},
+                                                num_simulations=num_simulations, num_days=num_days, varlik_dagilimlari=kalibrasyon["varlik_dagilimlari"],
+                                                varlik_degerleri_don=True, rng=np.random.default_rng(kok_tohum), yazdir=False) # (simülasyon, varlık) 1 TL'nin ufuk sonundaki değeri
+        if len(buyume_carpanlari) == 0:
+            return {"sonuclar": {}, "error": "Monte Carlo simülasyonu sonuç üretmedi. Lütfen veri kaynaklarını ve parametreleri kontrol edin."}
+
+        W = np.array([[dolu_portfoyler[p].get(asset, 0.0) for asset in kume] for p in kume_portfoyleri], dtype=float) # (portföy, varlık) TL tutarları
+        baslangic = W.sum(axis=1)
+        for bas in range(0, len(kume_portfoyleri), TOPLU_RISK_BLOK_BOYUTU):
+            blok = slice(bas, bas + TOPLU_RISK_BLOK_BOYUTU)
+            sirali = np.sort(buyume_carpanlari @ W[blok].T, axis=0) # (simülasyon, portföy) son değerler, her sütun kendi içinde küçükten büyüğe
+            var_degerleri = np.maximum(baslangic[blok] - sirali[index], 0.0)
+            cvar_degerleri = np.maximum(baslangic[blok] - sirali[:index].mean(axis=0), 0.0) if index > 0 else np.zeros(len(var_degerleri))
+            for i, portfoy_id in enumerate(kume_portfoyleri[blok]):
+                sonuclar[portfoy_id] = {"initial_value": float(baslangic[bas + i]), f"VaR_{anahtar}": float(var_degerleri[i]), f"CVaR_{anahtar}": float(cvar_degerleri[i])}
+
+    print(f"Toplu Monte Carlo risk analizi tamamlandı ({len(portfoy_idleri)} portföy, {len(gruplar)} varlık kümesi, {num_simulations} simülasyon).")
+    return {"sonuclar": {portfoy_id: sonuclar[portfoy_id] for portfoy_id in portfoyler}} # girdi sırası korunur
+
+
+
 if __name__ == "__main__":
     risk_analiz_yap()
     # print("Risk analizi başlatılıyor ...")
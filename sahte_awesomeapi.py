@@ -0,0 +1,156 @@
+import argparse
+import json
+import os
+import random
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import requests
+from flask import Flask, jsonify, abort
+
+# AwesomeAPI'nin yerel yedeği. api.py'yi canlı kaynağa gitmeden ölçmek (yük testi, CI) için /json/last ve /json/daily yanıtlarını kayıtlardan veya sentetik olarak üretir
+# Kullanım:
+#   python sahte_awesomeapi.py --port 9000 --gecikme-ms 80 --hata-orani 0.02
+#   AWESOME_API_BASE_URL=http://127.0.0.1:9000 python api.py
+# Gerçek yanıtları kaydetmek için: python sahte_awesomeapi.py --kaydet
+
+sahte = Flask(__name__)
+
+GERCEK_KAYNAK = "https://economia.awesomeapi.com.br"
+KAYIT_PARITELERI = ["USD-TRY", "EUR-TRY", "XAU-USD"]
+GUNLUK_KAYIT_BOYUTU = 360
+SENTETIK_BASLANGIC = {"USD-TRY": 34.0, "EUR-TRY": 37.0, "XAU-USD": 2600.0} # kayıt yoksa sentetik serinin bugünkü seviyesi
+SENTETIK_VOLATILITE = {"USD-TRY": 0.003, "EUR-TRY": 0.005, "XAU-USD": 0.01} # günlük log getiri standart sapması
+
+AYARLAR = { # komut satırından doldurulur
+    "kayit_klasoru": "awesomeapi_kayitlari",
+    "gecikme_ms": 0.0,
+    "gecikme_sapma_ms": 0.0,
+    "hata_orani": 0.0,
+    "asili_kalma_orani": 0.0,
+    "asili_kalma_saniye": 15.0,
+    "tohum": 42,
+}
+_gunluk_kayitlar = {} # parite -> en yeni gün başta gelen günlük kayıt listesi
+_son_kayit = {} # "USDTRY" gibi anahtarla son kotasyonlar
+
+
+
+# Bir paritenin kayıt dosyası yolu
+def _kayit_yolu(ad):
+    return os.path.join(AYARLAR["kayit_klasoru"], f"{ad}.json")
+
+
+
+# Kayıt yoksa rastgele yürüyüşle AwesomeAPI biçiminde günlük kayıt üreten fonksiyon (en yeni gün başta, 'bid', 'ask', 'timestamp' alanlarıyla)
+def _sentetik_gunluk(parite, rng):
+    getiriler = rng.normal(0.0, SENTETIK_VOLATILITE.get(parite, 0.005), GUNLUK_KAYIT_BOYUTU)
+    seviyeler = SENTETIK_BASLANGIC.get(parite, 1.0) * np.exp(-np.concatenate([[0.0], np.cumsum(getiriler[:-1])])) # bugünden geriye
+    bugun = int(time.time())
+    return [{
+        "code": parite.split("-")[0], "codein": parite.split("-")[1],
+        "bid": f"{seviye:.4f}", "ask": f"{seviye * 1.001:.4f}",
+        "timestamp": str(bugun - 86400 * i)
+    } for i, seviye in enumerate(seviyeler)]
+
+
+
+# Kayıtları diskten yükleyen, olmayanları sentetik üreten fonksiyon
+def kayitlari_yukle():
+    rng = np.random.default_rng(AYARLAR["tohum"])
+    for parite in KAYIT_PARITELERI:
+        yol = _kayit_yolu(f"daily_{parite}")
+        if os.path.exists(yol):
+            with open(yol, encoding="utf-8") as f:
+                _gunluk_kayitlar[parite] = json.load(f)
+        else:
+            _gunluk_kayitlar[parite] = _sentetik_gunluk(parite, rng)
+
+    yol = _kayit_yolu("last")
+    if os.path.exists(yol):
+        with open(yol, encoding="utf-8") as f:
+            _son_kayit.update(json.load(f))
+    else: # son kotasyon günlük serinin en yeni kaydından türetilir
+        for parite, kayitlar in _gunluk_kayitlar.items():
+            _son_kayit[parite.replace("-", "")] = dict(kayitlar[0])
+    print(f"Kayıtlar hazır: {', '.join(f'{p} ({len(k)} gün)' for p, k in _gunluk_kayitlar.items())}")
+
+
+
+# Gerçek AwesomeAPI yanıtlarını kayıt klasörüne yazan fonksiyon (bir kez çalıştırılır, sonra sunucu çevrimdışı çalışır)
+def gercek_yanitlari_kaydet():
+    os.makedirs(AYARLAR["kayit_klasoru"], exist_ok=True)
+    for parite in KAYIT_PARITELERI:
+        yanit = requests.get(f"{GERCEK_KAYNAK}/json/daily/{parite}/{GUNLUK_KAYIT_BOYUTU}", timeout=(3.05, 30))
+        yanit.raise_for_status()
+        with open(_kayit_yolu(f"daily_{parite}"), "w", encoding="utf-8") as f:
+            json.dump(yanit.json(), f)
+    yanit = requests.get(f"{GERCEK_KAYNAK}/json/last/{','.join(KAYIT_PARITELERI)}", timeout=(3.05, 30))
+    yanit.raise_for_status()
+    with open(_kayit_yolu("last"), "w", encoding="utf-8") as f:
+        json.dump(yanit.json(), f)
+    print(f"Gerçek yanıtlar {AYARLAR['kayit_klasoru']} klasörüne kaydedildi.")
+
+
+
+@sahte.before_request # her isteğe gecikme ve hata enjeksiyonu uygulanır
+def _gecikme_ve_hata():
+    gecikme = random.gauss(AYARLAR["gecikme_ms"], AYARLAR["gecikme_sapma_ms"]) if AYARLAR["gecikme_sapma_ms"] else AYARLAR["gecikme_ms"]
+    if gecikme > 0:
+        time.sleep(gecikme / 1000)
+    if AYARLAR["asili_kalma_orani"] and random.random() < AYARLAR["asili_kalma_orani"]: # istemcinin zaman aşımını denemek için
+        time.sleep(AYARLAR["asili_kalma_saniye"])
+    if AYARLAR["hata_orani"] and random.random() < AYARLAR["hata_orani"]:
+        abort(random.choice([429, 500, 503])) # kaynak tarafında görülen hata kodları
+
+
+
+@sahte.route('/json/last/<pariteler>', methods=['GET'])
+def son_kotasyonlar(pariteler):
+    yanit = {}
+    for parite in pariteler.split(","):
+        anahtar = parite.replace("-", "")
+        if anahtar in _son_kayit:
+            kayit = dict(_son_kayit[anahtar])
+            kayit["create_date"] = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+            yanit[anahtar] = kayit
+    if not yanit:
+        abort(404)
+    return jsonify(yanit)
+
+
+
+@sahte.route('/json/daily/<parite>/<int:gun>', methods=['GET'])
+def gunluk_kayitlar(parite, gun):
+    if parite not in _gunluk_kayitlar:
+        abort(404)
+    return jsonify(_gunluk_kayitlar[parite][:gun]) # AwesomeAPI gibi en yeni gün başta
+
+
+
+if __name__ == '__main__':
+    ayristirici = argparse.ArgumentParser(description="Çevrimdışı AwesomeAPI yedeği")
+    ayristirici.add_argument("--port", type=int, default=9000)
+    ayristirici.add_argument("--kayit-klasoru", default=AYARLAR["kayit_klasoru"], help="daily_<parite>.json ve last.json dosyalarının klasörü")
+    ayristirici.add_argument("--kaydet", action="store_true", help="gerçek kaynaktan yanıtları kaydedip çık")
+    ayristirici.add_argument("--gecikme-ms", type=float, default=0.0, help="her yanıta eklenen ortalama gecikme")
+    ayristirici.add_argument("--gecikme-sapma-ms", type=float, default=0.0, help="gecikmenin standart sapması")
+    ayristirici.add_argument("--hata-orani", type=float, default=0.0, help="429/500/503 dönen isteklerin oranı (0-1)")
+    ayristirici.add_argument("--asili-kalma-orani", type=float, default=0.0, help="yanıtı --asili-kalma-saniye kadar geciktirilen isteklerin oranı")
+    ayristirici.add_argument("--asili-kalma-saniye", type=float, default=15.0)
+    ayristirici.add_argument("--tohum", type=int, default=42, help="sentetik seriler ve hata enjeksiyonu için")
+    argumanlar = ayristirici.parse_args()
+
+    AYARLAR.update({
+        "kayit_klasoru": argumanlar.kayit_klasoru, "gecikme_ms": argumanlar.gecikme_ms, "gecikme_sapma_ms": argumanlar.gecikme_sapma_ms,
+        "hata_orani": argumanlar.hata_orani, "asili_kalma_orani": argumanlar.asili_kalma_orani,
+        "asili_kalma_saniye": argumanlar.asili_kalma_saniye, "tohum": argumanlar.tohum,
+    })
+    random.seed(argumanlar.tohum)
+
+    if argumanlar.kaydet:
+        gercek_yanitlari_kaydet()
+    else:
+        kayitlari_yukle()
+        sahte.run(port=argumanlar.port, threaded=True)
@@ -0,0 +1,65 @@
+import json
+import struct
+import threading
+
+import numpy as np # ikili seri biçimi için
+import requests
+
+# api.py'nin seri endpointleri ile istemcileri (app.py, riskanaliz.py) arasında paylaşılan ikili biçim ve istemci fonksiyonu
+# Flask uygulamasını, çekim havuzlarını ve yoklayıcıyı içe aktarmadan seri okumak için api.py'den ayrı tutulur
+
+SERI_IKILI_TURU = "application/x-seri-f64" # sütunlu ikili seri biçimi: b"SF64" + 4 bayt başlık uzunluğu + json başlık + ardışık float64 (little-endian) sütunlar
+ISTEMCI_ZAMAN_ASIMI = (3.05, 60) # app.py ve riskanaliz.py'nin api'ye istekleri için (soğuk yıllık çekim uzun sürebilir)
+
+_oturum = requests.Session() # api'ye yapılan istekler için keep-alive oturumu
+_istemci_onbellegi = {} # url -> (etag, çözülmüş veri)
+_istemci_kilidi = threading.Lock()
+
+
+# Sütun adı -> sayı listesi sözlüğünü ikili biçime çeviren fonksiyon. None değerler NaN olarak yazılır. kok verilirse çözümde sütunlar bu anahtarın altına konur, ek sözlüğü başlıkta aynen taşınır (tarihler gibi sayısal olmayan alanlar için)
+def seri_ikili_kodla(sutunlar, ek=None, kok=None):
+    diziler = [np.asarray([np.nan if v is None else v for v in degerler], dtype="<f8") for degerler in sutunlar.values()]
+    baslik = json.dumps({"surum": 1, "sutunlar": [[ad, len(dizi)] for ad, dizi in zip(sutunlar, diziler)], "kok": kok, "ek": ek or {}}).encode("utf-8")
+    return b"SF64" + struct.pack("<I", len(baslik)) + baslik + b"".join(dizi.tobytes() for dizi in diziler)
+
+
+# seri_ikili_kodla çıktısını json yanıtıyla aynı yapıya geri çeviren fonksiyon (NaN -> None)
+def seri_ikili_coz(icerik):
+    if icerik[:4] != b"SF64":
+        raise ValueError("Geçersiz ikili seri verisi")
+    baslik_uzunlugu = struct.unpack("<I", icerik[4:8])[0]
+    baslik = json.loads(icerik[8:8 + baslik_uzunlugu].decode("utf-8"))
+    veri = np.frombuffer(icerik, dtype="<f8", offset=8 + baslik_uzunlugu)
+    sutunlar, konum = {}, 0
+    for ad, uzunluk in baslik["sutunlar"]:
+        dizi = veri[konum:konum + uzunluk]
+        sutunlar[ad] = [None if v != v else v for v in dizi.tolist()] if np.isnan(dizi).any() else dizi.tolist() # NaN yoksa doğrudan listeye çevrilir
+        konum += uzunluk
+    if baslik.get("kok"):
+        return dict(baslik["ek"], **{baslik["kok"]: sutunlar})
+    return dict(sutunlar, **baslik["ek"]) # ek alanlar sütunlarla aynı seviyeye geri konur
+
+
+# Seri endpointlerini ikili biçimde ve koşullu istekle okuyan istemci fonksiyonu (app.py ve riskanaliz.py kullanır). Veri değişmediyse sunucu 304 döner ve bellekteki kopya kullanılır
+# HTTP hatalarında requests exception'ı fırlatır
+def seri_istegi(url):
+    basliklar = {"Accept": f"{SERI_IKILI_TURU}, application/json;q=0.5"}
+    with _istemci_kilidi:
+        onceki = _istemci_onbellegi.get(url)
+    if onceki:
+        basliklar["If-None-Match"] = f'"{onceki[0]}"'
+
+    response = _oturum.get(url, headers=basliklar, timeout=ISTEMCI_ZAMAN_ASIMI)
+    if response.status_code == 304 and onceki:
+        return onceki[1]
+    response.raise_for_status()
+    if response.headers.get("Content-Type", "").startswith(SERI_IKILI_TURU):
+        veri = seri_ikili_coz(response.content) # gzip'i requests kendisi açar
+    else:
+        veri = response.json()
+
+    etag = response.headers.get("ETag", "").strip('"')
+    if etag:
+        with _istemci_kilidi:
+            _istemci_onbellegi[url] = (etag, veri)
+    return veri
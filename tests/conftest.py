@@ -0,0 +1,16 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) # modüller kök dizinde düz dosyalar olarak durur
+os.environ.setdefault("KOTASYON_YOKLAMA", "0") # test istemcisi api'nin arka plan yoklayıcısını başlatıp gerçek kaynağa gitmesin
+
+
+# Modüllerin oluşturduğu veritabanı dosyaları (cuzdan.db, kalibrasyon.db ...) göreli yolludur, her test kendi geçici dizininde çalışır
+@pytest.fixture(autouse=True)
+def gecici_dizin(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    yield tmp_path
+    if "db" in sys.modules: # iş parçacığına bağlı cüzdan bağlantısı bir sonraki teste taşınmasın
+        sys.modules["db"].close_db()
@@ -0,0 +1,319 @@
+import gzip
+import json
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+
+import api
+import seri_istemcisi
+
+
+def test_seri_ikili_kodla_coz_gidis_donus():
+    sutunlar = {"USD-TRY": [41.25, 41.3, None, 40.9], "EUR-TRY": [48.0, 48.125, 47.5, 47.75], "bos": []}
+    ek = {"tarihler": ["2026-10-16", "2026-10-15", "2026-10-14", "2026-10-13"]}
+
+    cozulen = api.seri_ikili_coz(api.seri_ikili_kodla(sutunlar, ek=ek))
+
+    assert cozulen == {**sutunlar, **ek} # None (NaN) değerler ve ek alanlar aynen geri gelir
+
+
+def test_seri_ikili_kodla_coz_kok_anahtari():
+    veri = {"seriler": {"USD-TRY": [1.0, 2.0], "Gold_Gram_TL": [3.5, None]}, "tarihler": ["2026-10-16", "2026-10-15"]}
+
+    cozulen = api.seri_ikili_coz(api.seri_ikili_kodla(veri["seriler"], ek={"tarihler": veri["tarihler"]}, kok="seriler"))
+
+    assert cozulen == veri
+
+
+def test_seri_ikili_coz_gecersiz_veriyi_reddeder():
+    with pytest.raises(ValueError):
+        api.seri_ikili_coz(b"JSON{}")
+
+
+@pytest.fixture
+def istemci():
+    api.api.config["TESTING"] = True
+    return api.api.test_client()
+
+
+def test_gecmis_seri_endpointi_liste_dondurur_ve_etag_ile_304_verir(istemci, monkeypatch):
+    monkeypatch.setattr(api, "get_gecmis_veri", lambda parite, days: [41.3, 41.25, 41.1][:days])
+
+    yanit = istemci.get("/get-historical-series/USD-TRY/3")
+    assert yanit.status_code == 200
+    assert yanit.get_json() == [41.3, 41.25, 41.1]
+    assert yanit.headers["ETag"]
+
+    tekrar = istemci.get("/get-historical-series/USD-TRY/3", headers={"If-None-Match": yanit.headers["ETag"]})
+    assert tekrar.status_code == 304
+    assert tekrar.get_data() == b""
+
+
+def test_gecmis_seri_endpointi_bos_seriyi_saklanmaz_olarak_doner(istemci, monkeypatch):
+    monkeypatch.setattr(api, "get_gecmis_veri", lambda parite, days: [])
+
+    yanit = istemci.get("/get-historical-series/USD-TRY/30")
+    assert yanit.status_code == 200
+    assert yanit.get_json() == []
+    assert yanit.headers["Cache-Control"] == "no-store"
+    assert "ETag" not in yanit.headers
+
+
+def test_ttl_onbellek_taze_kaydi_tekrar_hesaplamaz():
+    cagrilar = []
+
+    @api.ttl_onbellek("test_taze", ttl=60)
+    def kare(x):
+        cagrilar.append(x)
+        return {"deger": x * x}
+
+    assert kare(3) == kare(3) == {"deger": 9}
+    assert cagrilar == [3]
+    assert kare.istatistik()["isabet"] == 1
+
+
+def test_ttl_onbellek_hata_sozlugunu_yazmaz():
+    cagrilar = []
+
+    @api.ttl_onbellek("test_hata", ttl=60)
+    def kaynak():
+        cagrilar.append(1)
+        return {"error": "kaynak yanıt vermedi"}
+
+    kaynak()
+    kaynak()
+    assert len(cagrilar) == 2
+
+
+def test_ttl_onbellek_bayat_kaydi_sunar_ve_tek_yenileme_baslatir():
+    cagrilar = []
+    yenileme_basladi, yenilemeyi_bitir = threading.Event(), threading.Event()
+
+    @api.ttl_onbellek("test_bayat", ttl=0.05, bayat_sure=60)
+    def surum():
+        cagrilar.append(1)
+        if len(cagrilar) > 1: # arka plan yenilemesi testin izni gelene kadar bekler
+            yenileme_basladi.set()
+            yenilemeyi_bitir.wait(5)
+        return {"surum": len(cagrilar)}
+
+    assert surum() == {"surum": 1}
+    time.sleep(0.1)
+    assert [surum() for _ in range(5)] == [{"surum": 1}] * 5 # yenileme sürerken bayat değer anında döner
+    assert yenileme_basladi.wait(5)
+    assert len(cagrilar) == 2 # beş bayat isabet tek yenileme başlattı
+
+    yenilemeyi_bitir.set()
+    bitis = time.time() + 5
+    while surum() != {"surum": 2} and time.time() < bitis:
+        time.sleep(0.01)
+    assert surum() == {"surum": 2}
+    assert surum.istatistik()["bayat_isabet"] >= 5
+
+
+def test_bayat_yenileme_ic_ice_paralel_cekimde_kilitlenmez(monkeypatch):
+    tek_isci = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(api, "_cekim_havuzu", tek_isci) # hizali_cerceve gibi yenilemesi çekim havuzunu bekleyen önbellek, en dar havuzla
+    cagrilar = []
+
+    @api.ttl_onbellek("test_ic_ice", ttl=0.05, bayat_sure=60)
+    def cerceve():
+        cagrilar.append(1)
+        return {"satir": api._cekim_havuzu.submit(lambda: len(cagrilar)).result(timeout=5)}
+
+    cerceve()
+    time.sleep(0.1)
+    cerceve()
+    bitis = time.time() + 5
+    while cerceve.istatistik()["boyut"] and cerceve() == {"satir": 1} and time.time() < bitis:
+        time.sleep(0.01)
+    assert cerceve() == {"satir": 2}
+    assert cerceve.istatistik()["yenileme_hatasi"] == 0
+    tek_isci.shutdown()
+
+
+class _SahteYanit:
+    def __init__(self, veri, status_code=200):
+        self._veri, self.status_code = veri, status_code
+
+    def json(self):
+        return self._veri
+
+
+def _kaynak_kotasyonu(usd="41.2534", eur="48.1012", ons_alis="2650.4567", ons_satis="2651.9876"):
+    return {"USDTRY": {"bid": usd, "ask": usd}, "EURTRY": {"bid": eur, "ask": eur}, "XAUUSD": {"bid": ons_alis, "ask": ons_satis}}
+
+
+@pytest.fixture
+def kotasyon_durumu(monkeypatch):
+    monkeypatch.setattr(api, "_son_kotasyon", None)
+    monkeypatch.setattr(api, "_kotasyon_surumu", 0)
+    monkeypatch.setattr(api, "_kotasyon_gecmisi", api.deque(maxlen=api.KOTASYON_TAMPON_BOYUTU))
+    monkeypatch.setattr(api, "paylasimli_getir", lambda anahtar, ttl, hesapla, **_: hesapla()) # süreçler arası önbellek testler arasında değer taşımasın
+    kaynak = {"veri": _kaynak_kotasyonu()}
+    monkeypatch.setattr(api._oturum, "get", lambda url, timeout=None: _SahteYanit(kaynak["veri"]))
+    return kaynak
+
+
+def test_kotasyon_gecmisi_ham_alis_satis_fiyatlarini_tutar(istemci, kotasyon_durumu):
+    api._kotasyonu_guncelle()
+
+    kayit = istemci.get("/get-market-history").get_json()[-1]
+    assert kayit["XAUUSD_bid"] == 2650.4567 and kayit["XAUUSD_ask"] == 2651.9876 # yuvarlanmamış kaynak değerleri
+    assert kayit["USDTRY_bid"] == 41.2534 and kayit["EURTRY_ask"] == 48.1012
+    assert kayit["Gold_Gram_TLs"] == round(2651.99 * 41.25 / 31.1035, 2)
+    guncel = istemci.get("/get-market-data").get_json()
+    assert "ham" not in guncel and "XAUUSD_bid" not in guncel # güncel kur yanıtının biçimi değişmedi
+
+
+def test_kotasyon_akisi_once_tum_kurlari_sonra_sadece_degisenleri_gonderir(istemci, kotasyon_durumu, monkeypatch):
+    monkeypatch.setattr(api, "SSE_CANLILIK_ARALIGI", 0.05)
+    api._kotasyonu_guncelle()
+
+    yanit = istemci.get("/stream-market-data", buffered=False)
+    assert yanit.mimetype == "text/event-stream"
+    assert yanit.headers["Cache-Control"] == "no-cache"
+    akis = iter(yanit.response)
+    ilk = next(akis).decode()
+    assert ilk.startswith("id: 1\nevent: kotasyon\n")
+    assert set(json.loads(ilk.split("data: ", 1)[1])) == {"USDs", "EURs", "Gold_Gram_TLs", "USDa", "EURa", "Gold_Gram_TLa", "zaman"}
+
+    assert next(akis) == b": canli\n\n" # yeni kotasyon yokken canlılık yorumu
+
+    kotasyon_durumu["veri"] = _kaynak_kotasyonu(eur="48.5")
+    api._kotasyonu_guncelle()
+    fark = next(akis).decode()
+    assert fark.startswith("id: 2\n")
+    assert set(json.loads(fark.split("data: ", 1)[1])) == {"EURs", "EURa", "zaman"} # sadece değişen kurlar
+    yanit.close()
+
+
+def test_ayni_kotasyon_aboneleri_uyandirmaz(kotasyon_durumu):
+    api._kotasyonu_guncelle()
+    api._kotasyonu_guncelle()
+    assert api._kotasyon_surumu == 1
+    assert len(api.kotasyon_gecmisi()) == 2 # geçmişe yine de yazılır
+
+
+def _haftalik_ornek(gun=7, kaydir=0.0):
+    tarihler = [f"2026-10-{16 - i:02d}" for i in range(gun)]
+    return {"USDh": [41.0 + kaydir + i / 100 for i in range(gun)], "EURh": [48.0 + i / 100 for i in range(gun)],
+            "Gold_Gram_TLh": [3500.0 + i for i in range(gun)], "tarihler": tarihler}
+
+
+def test_seri_endpointi_ikili_bicim_json_ile_ayni_veriyi_tasir(istemci, monkeypatch):
+    monkeypatch.setattr(api, "haftalik_veri", lambda: _haftalik_ornek())
+
+    json_yanit = istemci.get("/get-weekly")
+    ikili_yanit = istemci.get("/get-weekly", headers={"Accept": f"{api.SERI_IKILI_TURU}, application/json;q=0.5"})
+
+    assert ikili_yanit.mimetype == api.SERI_IKILI_TURU
+    assert api.seri_ikili_coz(ikili_yanit.get_data()) == json_yanit.get_json()
+    assert ikili_yanit.headers["ETag"] != json_yanit.headers["ETag"] # farklı gösterimler farklı varlıklardır
+    assert "Accept" in ikili_yanit.headers["Vary"]
+
+
+def test_seri_endpointi_etag_degisince_304_vermez(istemci, monkeypatch):
+    veri = {"kaydir": 0.0}
+    monkeypatch.setattr(api, "haftalik_veri", lambda: _haftalik_ornek(kaydir=veri["kaydir"]))
+
+    ilk = istemci.get("/get-weekly")
+    assert istemci.get("/get-weekly", headers={"If-None-Match": ilk.headers["ETag"]}).status_code == 304
+    assert istemci.get("/get-weekly", headers={"If-Modified-Since": ilk.headers["Last-Modified"]}).status_code == 304
+
+    veri["kaydir"] = 0.5 # yeni fiyat
+    yeni = istemci.get("/get-weekly", headers={"If-None-Match": ilk.headers["ETag"]})
+    assert yeni.status_code == 200
+    assert yeni.headers["ETag"] != ilk.headers["ETag"]
+
+
+def test_seri_endpointi_buyuk_yaniti_gzip_ile_sikistirir(istemci, monkeypatch):
+    monkeypatch.setattr(api, "haftalik_veri", lambda: _haftalik_ornek(gun=120))
+
+    duz = istemci.get("/get-weekly")
+    sikistirilmis = istemci.get("/get-weekly", headers={"Accept-Encoding": "gzip"})
+
+    assert "Content-Encoding" not in duz.headers
+    assert sikistirilmis.headers["Content-Encoding"] == "gzip"
+    assert sikistirilmis.headers["ETag"].strip('"').endswith("-gz")
+    assert json.loads(gzip.decompress(sikistirilmis.get_data())) == duz.get_json()
+    assert len(sikistirilmis.get_data()) < len(duz.get_data())
+
+
+def test_seri_istegi_304_gelince_bellekteki_kopyayi_dondurur(monkeypatch):
+    istekler = []
+    govde = seri_istemcisi.seri_ikili_kodla({"USDh": [41.0, 41.1]}, ek={"tarihler": ["2026-10-16", "2026-10-15"]})
+
+    def sahte_get(url, headers=None, timeout=None):
+        istekler.append(dict(headers))
+        yanit = requests.Response()
+        if headers.get("If-None-Match") == '"e1"':
+            yanit.status_code = 304
+        else:
+            yanit.status_code, yanit._content = 200, govde
+            yanit.headers.update({"Content-Type": seri_istemcisi.SERI_IKILI_TURU, "ETag": '"e1"'})
+        return yanit
+
+    monkeypatch.setattr(seri_istemcisi._oturum, "get", sahte_get)
+    monkeypatch.setattr(seri_istemcisi, "_istemci_onbellegi", {})
+
+    ilk = seri_istemcisi.seri_istegi("http://yerel/get-weekly")
+    ikinci = seri_istemcisi.seri_istegi("http://yerel/get-weekly")
+
+    assert ilk == ikinci == {"USDh": [41.0, 41.1], "tarihler": ["2026-10-16", "2026-10-15"]}
+    assert "If-None-Match" not in istekler[0] and istekler[1]["If-None-Match"] == '"e1"'
+    assert api.SERI_IKILI_TURU in istekler[0]["Accept"]
+
+
+@pytest.fixture
+def ortak_onbellek(tmp_path, monkeypatch):
+    yol = str(tmp_path / "ortak.db")
+    monkeypatch.setattr(api, "PAYLASIMLI_ONBELLEK_DB", yol)
+    monkeypatch.setattr(api, "_paylasimli_yerel", threading.local()) # önceki testin bağlantısı kullanılmasın
+    api._paylasimli_baglanti() # tablo oluşur
+    diger_surec = sqlite3.connect(yol, isolation_level=None) # başka bir api sürecinin bağlantısı yerine
+    yield diger_surec
+    diger_surec.close()
+    api._paylasimli_baglanti().close()
+
+
+def test_ortak_onbellek_taze_degeri_hesaplamadan_dondurur(ortak_onbellek):
+    ortak_onbellek.execute("INSERT INTO onbellek VALUES ('k', ?, ?, NULL, 0)", (json.dumps({"v": 1}), time.time()))
+    assert api.paylasimli_getir("k", 60, lambda: pytest.fail("taze değer varken kaynağa gidildi")) == {"v": 1}
+
+
+def test_ortak_onbellek_kiradaki_anahtar_icin_bayat_degeri_sunar(ortak_onbellek):
+    ortak_onbellek.execute("INSERT INTO onbellek VALUES ('k', ?, ?, 'diger', ?)", (json.dumps({"v": 1}), time.time() - 120, time.time() + 30))
+    assert api.paylasimli_getir("k", 60, lambda: pytest.fail("kira başka süreçteyken kaynağa gidildi")) == {"v": 1}
+
+
+def test_ortak_onbellek_suresi_dolan_kirayi_devralir(ortak_onbellek):
+    ortak_onbellek.execute("INSERT INTO onbellek VALUES ('k', ?, ?, 'coken', ?)", (json.dumps({"v": 1}), time.time() - 120, time.time() - 1)) # kira sahibi çöktü
+
+    assert api.paylasimli_getir("k", 60, lambda: {"v": 2}) == {"v": 2}
+    deger, sahip, bitis = ortak_onbellek.execute("SELECT deger, kira_sahibi, kira_bitis FROM onbellek WHERE anahtar = 'k'").fetchone()
+    assert json.loads(deger) == {"v": 2} # diğer süreçler yeni değeri görür
+    assert sahip == api._SUREC_KIMLIGI and bitis == 0 # kira alındı ve bırakıldı
+
+
+def test_ortak_onbellek_ilk_degeri_kira_sahibinden_bekler(ortak_onbellek):
+    ortak_onbellek.execute("INSERT INTO onbellek VALUES ('k', NULL, 0, 'diger', ?)", (time.time() + 30,))
+
+    def kira_sahibi_yazar():
+        conn = sqlite3.connect(api.PAYLASIMLI_ONBELLEK_DB, isolation_level=None)
+        conn.execute("UPDATE onbellek SET deger = ?, yazilma = ?, kira_bitis = 0 WHERE anahtar = 'k'", (json.dumps([1, 2]), time.time()))
+        conn.close()
+
+    threading.Timer(0.2, kira_sahibi_yazar).start()
+
+    assert api.paylasimli_getir("k", 60, lambda: pytest.fail("kira sahibi hesaplarken ikinci kez hesaplandı")) == [1, 2]
+
+
+def test_ortak_onbellek_hata_sonucunu_yazmaz(ortak_onbellek):
+    assert api.paylasimli_getir("k", 60, lambda: {"error": "429"}) == {"error": "429"}
+    assert ortak_onbellek.execute("SELECT deger FROM onbellek WHERE anahtar = 'k'").fetchone() == (None,)
+    assert api.paylasimli_getir("k", 60, lambda: {"v": 3}) == {"v": 3} # kira bırakıldığı için sonraki çağrı hemen yeniden dener
@@ -0,0 +1,160 @@
+import sqlite3
+import threading
+
+import db
+
+
+def _kurulum():
+    db.initialize_db()
+
+
+def test_yeniden_hesaplama_islemleri_zaman_sirasiyla_oynatir():
+    _kurulum()
+    # dosyada satış önce gelir ama tarihi alıştan sonradır, defter zamana göre oynatıldığı için aşım sayılmaz
+    sonuc = db.islemleri_toplu_ekle([("2024-03-01T00:00:00", "Dolar", "satis", 5, 35.0),
+                                     ("2024-01-01T00:00:00", "Dolar", "alis", 10, 30.0)])
+    assert sonuc["eklenen"] == 2
+    assert sonuc["pozisyonlar"]["Dolar"]["miktar"] == 5
+    assert db.kar_zarar_gecmisi("Dolar")[0]["kar_zarar"] == 5 * 35.0 - 10 * 30.0
+
+    # satıştan önceye tarihli yeni alış, satışın kar/zararını da yeniden hesaplatır
+    db.islemleri_toplu_ekle([("2024-02-01T00:00:00", "Dolar", "alis", 10, 32.0)])
+    assert db.kar_zarar_gecmisi("Dolar")[0]["kar_zarar"] == 5 * 35.0 - 20 * 31.0
+    assert db.load_wallet_data()["Dolar"]["miktar"] == 15
+    assert [islem["zaman"][:10] for islem in db.islem_gecmisi("Dolar")] == ["2024-01-01", "2024-02-01", "2024-03-01"]
+
+
+def test_eldekinden_fazla_satis_tum_aktarimi_geri_alir():
+    _kurulum()
+    db.islem_ekle("Euro", "alis", 10, 40.0, zaman="2024-01-10T00:00:00")
+
+    sonuc = db.islemleri_toplu_ekle([("2024-01-05T00:00:00", "Euro", "alis", 1, 39.0),
+                                     ("2024-01-06T00:00:00", "Euro", "satis", 2, 41.0)]) # 6 Ocak'ta elde sadece 1 Euro var
+
+    assert "error" in sonuc
+    assert len(db.islem_gecmisi("Euro")) == 1 # geçerli satır da yazılmadı
+    assert db.load_wallet_data()["Euro"]["miktar"] == 10
+
+
+def test_islem_ekle_durum_kodlari():
+    _kurulum()
+    assert db.islem_ekle("Altın", "satis", 1, 3000.0)["durum"] == db.DURUM_VARLIK_YOK
+    assert db.islem_ekle("Altın", "alis", 2, 3000.0)["durum"] == db.DURUM_TAMAM
+    assert db.islem_ekle("Altın", "satis", 3, 3100.0)["durum"] == db.DURUM_YETERSIZ_MIKTAR
+    assert db.islem_ekle("Altın", "alis", 0, 3000.0)["durum"] == db.DURUM_GECERSIZ
+
+
+def test_eski_cuzdan_tasinirken_acilis_islemleri_en_basa_tarihlenir_ve_kar_zarar_korunur():
+    conn = sqlite3.connect(db.DB_YOLU) # defter öncesi tek cüzdanlı şema
+    conn.execute("CREATE TABLE wallet (varlik_turu TEXT PRIMARY KEY, miktar REAL, maliyet REAL, alis_fiyati REAL, satis_fiyati REAL, kar_zarar REAL)")
+    conn.execute("INSERT INTO wallet VALUES ('Dolar', 100, 30, 30, NULL, 250)")
+    conn.commit()
+    conn.close()
+    _kurulum()
+
+    acilis = db.islem_gecmisi("Dolar")
+    assert [(i["zaman"], i["yon"], i["miktar"], i["kar_zarar"]) for i in acilis] == [(db.ACILIS_ZAMANI, "alis", 100, 250)]
+
+    # geçmişe tarihli satış açılıştan sonra oynatılır, aşım hatası vermez
+    sonuc = db.islemleri_toplu_ekle([("2023-02-05T00:00:00", "Dolar", "satis", 40, 32.0)])
+    assert sonuc["pozisyonlar"]["Dolar"]["miktar"] == 60
+    assert [k["kar_zarar"] for k in db.kar_zarar_gecmisi("Dolar")] == [250, 40 * 32.0 - 100 * 30.0]
+
+
+def test_cuzdan_bosaltma_defteri_silmez_kapanis_satisi_yazar():
+    _kurulum()
+    db.islem_ekle("Dolar", "alis", 10, 30.0, zaman="2024-01-01T00:00:00")
+    db.islem_ekle("Dolar", "satis", 4, 33.0, zaman="2024-02-01T00:00:00")
+    db.islem_ekle("Euro", "alis", 5, 40.0, portfoy_id="diger")
+
+    assert db.empty_wallet() is True
+    assert db.load_wallet_data() == {}
+    assert db.load_wallet_data(portfoy_id="diger")["Euro"]["miktar"] == 5 # diğer portföy etkilenmez
+
+    gecmis = db.islem_gecmisi("Dolar")
+    assert [(i["yon"], i["miktar"]) for i in gecmis] == [("alis", 10), ("satis", 4), ("satis", 6)] # eski kayıtlar yerinde, kapanış eklendi
+    assert gecmis[-1]["kar_zarar"] == 0
+
+    # defter baştan oynatıldığında kapanış satışı eski pozisyonu sıfırlar, sonraki alış sıfırdan başlar
+    sonuc = db.islemleri_toplu_ekle([("2099-01-01T00:00:00", "Dolar", "alis", 2, 31.0)])
+    assert sonuc["pozisyonlar"]["Dolar"]["miktar"] == 2
+    assert sonuc["pozisyonlar"]["Dolar"]["maliyet"] == 31.0
+
+
+def test_yeniden_hesaplama_defter_satirlarini_degistirmez():
+    _kurulum()
+    db.islem_ekle("Dolar", "alis", 10, 30.0, zaman="2024-01-01T00:00:00")
+    db.islem_ekle("Dolar", "satis", 5, 35.0, zaman="2024-03-01T00:00:00")
+    defter_oncesi = db.connect_db().execute(f"SELECT * FROM {db.ISLEM_TABLOSU} ORDER BY id").fetchall()
+
+    db.islemleri_toplu_ekle([("2024-02-01T00:00:00", "Dolar", "alis", 10, 32.0)]) # satışın kar/zararını değiştiren geçmişe tarihli alış
+
+    defter_sonrasi = db.connect_db().execute(f"SELECT * FROM {db.ISLEM_TABLOSU} ORDER BY id").fetchall()
+    assert defter_sonrasi[:len(defter_oncesi)] == defter_oncesi # eski satırlar aynen duruyor, sadece yeni satır eklendi
+    assert len(defter_sonrasi) == len(defter_oncesi) + 1
+    assert [k["kar_zarar"] for k in db.kar_zarar_gecmisi("Dolar")] == [5 * 35.0 - 20 * 31.0] # rapor oynatılmış değeri gösterir
+    assert [i["kar_zarar"] for i in db.islem_gecmisi("Dolar")] == [None, None, 5 * 35.0 - 20 * 31.0]
+
+
+def test_baglanti_is_parcacigi_basina_bir_kez_acilir_ve_ayarlari_uygular():
+    conn = db.connect_db()
+    assert db.connect_db() is conn
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1 # NORMAL
+    assert conn.execute("PRAGMA cache_size").fetchone()[0] == -8000
+    assert conn.execute("PRAGMA temp_store").fetchone()[0] == 2 # MEMORY
+
+    baska = []
+    is_parcacigi = threading.Thread(target=lambda: baska.append(db.connect_db()))
+    is_parcacigi.start()
+    is_parcacigi.join()
+    assert baska[0] is not conn # her iş parçacığının kendi bağlantısı
+
+
+def test_fork_sonrasi_ebeveyn_baglantisi_kullanilmaz(monkeypatch):
+    conn = db.connect_db()
+    monkeypatch.setattr(db._yerel, "pid", -1) # başka süreçte açılmış gibi
+    yeni = db.connect_db()
+    assert yeni is not conn
+    conn.close()
+
+
+class _SorguSayanBaglanti:
+    def __init__(self, conn):
+        self.conn, self.sorgular = conn, 0
+
+    def cursor(self):
+        self.sorgular += 1
+        return self.conn.cursor()
+
+    def __getattr__(self, ad):
+        return getattr(self.conn, ad)
+
+
+def test_cuzdan_onbellegi_tekrar_okumada_sorgu_calistirmaz_ve_yazmada_gecersizlesir(monkeypatch):
+    _kurulum()
+    db.islem_ekle("Dolar", "alis", 10, 30.0)
+    sayac = _SorguSayanBaglanti(db.connect_db())
+    monkeypatch.setattr(db, "connect_db", lambda: sayac)
+
+    ilk = db.load_wallet_data()
+    ilk["Dolar"]["miktar"] = 999 # çağıranın değişikliği önbelleği bozmaz
+    assert db.load_wallet_data()["Dolar"]["miktar"] == 10
+    assert sayac.sorgular == 1
+
+    db.islem_ekle("Dolar", "alis", 5, 31.0) # bu süreçteki yazma
+    assert db.load_wallet_data()["Dolar"]["miktar"] == 15
+    assert sayac.sorgular == 2
+
+
+def test_cuzdan_onbellegi_baska_baglantinin_yazmasini_gorur():
+    _kurulum()
+    db.islem_ekle("Euro", "alis", 4, 40.0)
+    assert db.load_wallet_data()["Euro"]["miktar"] == 4
+
+    diger = sqlite3.connect(db.DB_YOLU) # başka süreç yerine, yazma sayacını artırmaz
+    diger.execute(f"UPDATE {db.TABLE_NAME} SET miktar = 7 WHERE varlik_turu = 'Euro'")
+    diger.commit()
+    diger.close()
+
+    assert db.load_wallet_data()["Euro"]["miktar"] == 7 # PRAGMA data_version değişti
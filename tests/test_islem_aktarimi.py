@@ -0,0 +1,50 @@
+import io
+
+import pytest
+
+import db
+import islem_aktarimi
+
+
+@pytest.mark.parametrize("metin, beklenen", [
+    ("18.75", 18.75),
+    ("19,10", 19.10),
+    ("1.234,50", 1234.50),
+    ("1,234.50", 1234.50),
+    (" 1 234,5 ", 1234.5),
+])
+def test_sayi_ondalik_virgul_ve_binlik_ayrac(metin, beklenen):
+    assert islem_aktarimi._sayi(metin) == pytest.approx(beklenen)
+
+
+@pytest.mark.parametrize("metin, beklenen", [
+    ("2023-01-05", "2023-01-05T00:00:00"),
+    ("2023-01-05 14:30", "2023-01-05T14:30:00"),
+    ("2023-01-05T14:30:15", "2023-01-05T14:30:15"),
+    ("05.03.2023", "2023-03-05T00:00:00"),
+    ("05.03.2023 09:15", "2023-03-05T09:15:00"),
+    ("05/03/2023", "2023-03-05T00:00:00"),
+])
+def test_tarih_iso_bicimine_cevrilir(metin, beklenen):
+    assert islem_aktarimi._tarih(metin) == beklenen
+
+
+def test_tarih_taninmayan_bicimi_reddeder():
+    with pytest.raises(ValueError):
+        islem_aktarimi._tarih("5 Mart 2023")
+
+
+def test_csv_ice_aktar_noktali_virgul_ve_hatali_satir():
+    db.initialize_db()
+    icerik = ("﻿İşlem Tarihi;Sembol;İşlem;Adet;Kur\n"
+              "05.01.2023;USD;AL;100;18,75\n"
+              "05.03.2023;USD;SAT;40;19,10\n"
+              "06.03.2023;XYZ;AL;1;1\n"
+              "\n").encode("utf-8")
+
+    sonuc = islem_aktarimi.csv_ice_aktar(io.BytesIO(icerik))
+
+    assert sonuc["eklenen"] == 2 and sonuc["gecerli"] == 2 and sonuc["hatali"] == 1
+    assert "bilinmeyen varlık" in sonuc["hatalar"][0]
+    assert db.load_wallet_data()["Dolar"]["miktar"] == 60
+    assert [(i["zaman"], i["yon"], i["fiyat"]) for i in db.islem_gecmisi("Dolar")] == [("2023-01-05T00:00:00", "alis", 18.75), ("2023-03-05T00:00:00", "satis", 19.10)]
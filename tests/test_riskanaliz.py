@@ -0,0 +1,166 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+import riskanaliz
+
+
+VARLIKLAR = ["USD", "EUR"]
+DEGERLER = {"USD": 60000.0, "EUR": 40000.0}
+DRIFT = {"USD": 0.0004, "EUR": 0.0002}
+VOLATILITE = {"USD": 0.009, "EUR": 0.011}
+
+
+def _cholesky(korelasyon=0.6):
+    D = np.diag([VOLATILITE[a] for a in VARLIKLAR])
+    rho = np.array([[1.0, korelasyon], [korelasyon, 1.0]])
+    return np.linalg.cholesky(D @ rho @ D)
+
+
+def test_parametrik_ve_monte_carlo_var_normal_marjinallerde_uyusur():
+    L = _cholesky()
+    dagilimlar = {a: {"dist": "norm", "params": (0.0005, VOLATILITE[a])} for a in VARLIKLAR} # getiri ölçeğinde uydurulmuş normal marjinaller
+    degerler = riskanaliz.mcs_yap_vektorel(DRIFT, VOLATILITE, L, DEGERLER, num_simulations=200000, num_days=7,
+                                          varlik_dagilimlari=dagilimlar, rng=np.random.default_rng(7), yazdir=False)
+    mc = riskanaliz.risk_metrikleri_hesapla(degerler, sum(DEGERLER.values()))
+    parametrik = riskanaliz.parametrik_risk_hesapla(DEGERLER, DRIFT, L, VARLIKLAR, num_days=7, cornish_fisher=False)
+
+    assert mc["VaR_95"] > 0
+    assert abs(mc["VaR_95"] - parametrik["VaR_95"]) / parametrik["VaR_95"] < 0.05
+    assert abs(mc["CVaR_95"] - parametrik["CVaR_95"]) / parametrik["CVaR_95"] < 0.05
+
+
+def test_sok_ornekleyici_birim_varyansli_sok_uretir():
+    ornekleyici = riskanaliz.sok_ornekleyici_olustur({"dist": "t", "params": (5.0, 0.001, 0.008)})
+    soklar = riskanaliz.sok_ornekle(ornekleyici, 400000, np.random.default_rng(1))
+    assert abs(np.mean(soklar)) < 0.01
+    assert abs(np.std(soklar) - 1.0) < 0.02
+
+
+def test_toplu_risk_sonucu_toplu_cagridaki_diger_portfoylere_bagli_degil(monkeypatch):
+    varliklar = ["USD", "EUR", "Gold_Gram_TL"]
+    volatilite = {"USD": 0.009, "EUR": 0.011, "Gold_Gram_TL": 0.014}
+    D = np.diag([volatilite[a] for a in varliklar])
+    rho = np.array([[1.0, 0.6, 0.3], [0.6, 1.0, 0.2], [0.3, 0.2, 1.0]])
+    kalibrasyon = {"varliklar": varliklar, "drift": {a: 0.0003 for a in varliklar}, "volatility": volatilite,
+                   "varlik_dagilimlari": {}, "cholesky_matrix_L": np.linalg.cholesky(D @ rho @ D)}
+    monkeypatch.setattr(riskanaliz, "analiz_kalibrasyonu_hazirla", lambda varlik_kumesi: dict(kalibrasyon))
+
+    portfoyler = {"p1": {"EUR": 1000.0}, "p2": {"USD": 500.0, "EUR": 500.0}}
+    tek_basina = riskanaliz.toplu_risk_analiz_yap(portfoyler, num_simulations=5000, seed=3)["sonuclar"]
+    genis = riskanaliz.toplu_risk_analiz_yap({**portfoyler, "p3": {"Gold_Gram_TL": 10.0}}, num_simulations=5000, seed=3)["sonuclar"]
+
+    assert genis["p1"] == tek_basina["p1"]
+    assert genis["p2"] == tek_basina["p2"]
+    assert list(genis) == ["p1", "p2", "p3"]
+
+
+@pytest.mark.parametrize("parametrik", [False, True])
+def test_toplu_risk_girdi_sirasini_korur_ve_hatayi_ayri_dondurur(monkeypatch, parametrik):
+    kalibrasyon = {"varliklar": VARLIKLAR, "drift": DRIFT, "volatility": VOLATILITE, "varlik_dagilimlari": {}, "cholesky_matrix_L": _cholesky()}
+    monkeypatch.setattr(riskanaliz, "analiz_kalibrasyonu_hazirla", lambda varlik_kumesi: dict(kalibrasyon))
+    portfoyler = {"z": {"USD": 100.0, "EUR": 100.0}, "error": {"EUR": 300.0}, "bos": {}, "a": {"USD": 50.0}} # "error" adlı portföy de normal sonuç alır
+
+    toplu = riskanaliz.toplu_risk_analiz_yap(portfoyler, num_simulations=2000, seed=1, parametrik=parametrik)
+
+    assert "error" not in toplu
+    assert list(toplu["sonuclar"]) == ["z", "error", "bos", "a"]
+    assert toplu["sonuclar"]["error"]["VaR_95"] > 0
+
+    monkeypatch.setattr(riskanaliz, "analiz_kalibrasyonu_hazirla", lambda varlik_kumesi: {"error": "veri yok"})
+    assert riskanaliz.toplu_risk_analiz_yap(portfoyler, parametrik=parametrik) == {"sonuclar": {}, "error": "veri yok"}
+
+
+def test_hazir_kalibrasyon_verilince_veri_tekrar_cekilmez(monkeypatch):
+    kalibrasyon = {"varliklar": VARLIKLAR, "drift": DRIFT, "volatility": VOLATILITE, "varlik_dagilimlari": {}, "cholesky_matrix_L": _cholesky()}
+    cagrilar = []
+    monkeypatch.setattr(riskanaliz, "analiz_kalibrasyonu_hazirla", lambda varlik_kumesi: cagrilar.append(varlik_kumesi) or dict(kalibrasyon))
+
+    on_tahmin = riskanaliz.hizli_risk_analiz_yap(DEGERLER, kalibrasyon=kalibrasyon)
+    sonuc = riskanaliz.risk_analiz_yap(DEGERLER, num_simulations=2000, seed=1, ufuklar=riskanaliz.RISK_UFUKLARI, kalibrasyon=kalibrasyon)
+
+    assert cagrilar == []
+    assert on_tahmin["VaR_95"] > 0 and sonuc["VaR_95"] > 0
+    assert sorted(sonuc["risk_yuzeyi"]) == [1, 7, 30]
+
+
+def test_mcs_yap_vektorel_desteklenmeyen_varyans_azaltma_modunu_reddeder():
+    for mod in ("kontrol", "bilinmeyen"):
+        with pytest.raises(ValueError):
+            riskanaliz.mcs_yap_vektorel(DRIFT, VOLATILITE, _cholesky(), DEGERLER, num_simulations=100, varyans_azaltma=mod, yazdir=False)
+
+
+@pytest.mark.parametrize("dagilim_adi", ["norm", "laplace"])
+def test_kapali_form_mle_scipy_fit_ile_ayni(dagilim_adi):
+    veri = getattr(riskanaliz.stats, dagilim_adi).rvs(loc=0.0003, scale=0.01, size=2001, random_state=np.random.default_rng(11))
+
+    parametreler = riskanaliz._dagilim_parametreleri(dagilim_adi, veri, np.sort(veri))
+
+    np.testing.assert_allclose(parametreler, getattr(riskanaliz.stats, dagilim_adi).fit(veri), rtol=1e-6, atol=1e-9)
+
+
+def test_dagilim_secimi_paralel_havuzda_seri_yol_ile_ayni():
+    rng = np.random.default_rng(2)
+    seriler = {"USD": (rng.standard_t(4, 300) * 0.01).tolist(), "EUR": (rng.laplace(0.0, 0.008, 300)).tolist()}
+
+    seri = riskanaliz.en_iyi_dagilimlari_bul(seriler, riskanaliz.ADAY_DAGILIMLAR, num_workers=1)
+    paralel = riskanaliz.en_iyi_dagilimlari_bul(seriler, riskanaliz.ADAY_DAGILIMLAR, num_workers=2)
+
+    assert riskanaliz.DAGILIM_ISCI_SAYISI >= 1
+    assert {a: d["dist"] for a, d in paralel.items()} == {a: d["dist"] for a, d in seri.items()}
+    for asset in seriler:
+        np.testing.assert_allclose(paralel[asset]["params"], seri[asset]["params"])
+
+
+def test_mcs_paralel_yap_ayni_tohumla_seri_yol_ile_ayni_sonucu_verir():
+    dagilimlar = {"USD": {"dist": "t", "params": (5.0, 0.0, 0.008)}, "EUR": {"dist": "norm", "params": (0.0, 0.01)}}
+    ortak = dict(num_simulations=2500, num_days=5, varlik_dagilimlari=dagilimlar, seed=42, parca_boyutu=1000)
+
+    seri = riskanaliz.mcs_paralel_yap(DRIFT, VOLATILITE, _cholesky(), DEGERLER, num_workers=1, **ortak)
+    paralel = riskanaliz.mcs_paralel_yap(DRIFT, VOLATILITE, _cholesky(), DEGERLER, num_workers=2, **ortak)
+    tekrar = riskanaliz.mcs_paralel_yap(DRIFT, VOLATILITE, _cholesky(), DEGERLER, num_workers=1, **ortak)
+
+    # seri yol: aynı kök tohumdan türetilen parça akışları sırayla mcs_yap_vektorel ile çalıştırılır
+    tohumlar = np.random.SeedSequence(42).spawn(3)
+    elle = np.concatenate([riskanaliz.mcs_yap_vektorel(DRIFT, VOLATILITE, _cholesky(), DEGERLER, num_simulations=n, num_days=5, varlik_dagilimlari=dagilimlar,
+                                                       rng=np.random.default_rng(tohum), yazdir=False) for n, tohum in zip((1000, 1000, 500), tohumlar)])
+
+    assert seri.shape == (2500,)
+    np.testing.assert_array_equal(seri, paralel)
+    np.testing.assert_array_equal(seri, tekrar)
+    np.testing.assert_array_equal(seri, elle)
+
+
+def test_garch_durumu_bugunun_gecici_barini_kaydetmez():
+    pytest.importorskip("arch")
+    import pandas as pd
+
+    bugun = pd.Timestamp(riskanaliz._bugun())
+    tarihler = [(bugun - pd.Timedelta(days=i)).date().isoformat() for i in range(200, -1, -1)] # son satır bugün
+    getiriler = np.random.default_rng(5).standard_normal(len(tarihler)) * 0.01
+
+    def _durum():
+        conn = riskanaliz._garch_db_baglan()
+        try:
+            return conn.execute("SELECT son_tarih, son_varyans, uydurma_zamani, guncelleme_sayisi FROM garch_durumu").fetchone()
+        finally:
+            conn.close()
+
+    riskanaliz.garch_volalite_artimli_hesapla(pd.DataFrame({"USD": getiriler}, index=tarihler))
+    ilk = _durum()
+    degisen = getiriler.copy()
+    degisen[-1] = 0.04 # gün içi fiyat yenilemesi sadece bugünün barını değiştirir
+    riskanaliz.garch_volalite_artimli_hesapla(pd.DataFrame({"USD": degisen}, index=tarihler))
+
+    assert ilk[0] == tarihler[-2] # durum son tamamlanmış güne bağlı
+    assert _durum() == ilk # yeniden uydurma yok, geçici bar kalıcı duruma katılmadı
+
+
+def test_risk_motoru_api_modulunu_ice_aktarmaz():
+    kok = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    kod = "import sys, riskanaliz; print('api' in sys.modules, 'flask' in sys.modules)"
+    cikti = subprocess.run([sys.executable, "-c", kod], cwd=kok, capture_output=True, text=True, check=True).stdout.split()
+    assert cikti == ["False", "False"]
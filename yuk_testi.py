@@ -0,0 +1,153 @@
+import argparse
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+from seri_istemcisi import SERI_IKILI_TURU # api.py'yi (ve Flask'ı) içe aktarmadan ikili biçim türü
+
+# api.py için yük üreteci. Rotalara sabit eşzamanlılıkla istek atar, rota başına verim (istek/sn) ve gecikme yüzdeliklerini (p50/p90/p99) raporlar
+# Canlı kaynağa gitmemek için api.py sahte_awesomeapi.py'ye yönlendirilerek çalıştırılır:
+#   python sahte_awesomeapi.py --port 9000 --gecikme-ms 80
+#   AWESOME_API_BASE_URL=http://127.0.0.1:9000 python api.py
+#   python yuk_testi.py --eszamanlilik 16 --sure 20 --cikti olcum_oncesi.json
+# Her performans değişikliğinden önce ve sonra aynı parametrelerle çalıştırılıp çıktılar karşılaştırılır
+# Herhangi bir rotanın hata oranı --azami-hata-orani'nı (varsayılan 0) aşarsa betik sıfırdan farklı çıkış koduyla biter, hatalı rotanın ölçümü karşılaştırmaya alınmamalı
+
+VARSAYILAN_HEDEF = "http://127.0.0.1:8000"
+VARSAYILAN_ROTALAR = [
+    "/get-market-data",
+    "/get-weekly",
+    "/get-monthly",
+    "/get-yearly",
+    "/get-historical-series/USD-TRY/30",
+]
+IKILI_TUR = SERI_IKILI_TURU
+
+
+
+# Bir işçinin bitiş zamanına kadar rotalar arasında sırayla dönerek istek attığı döngü. Her isteğin (rota, durum kodu, süre) sonucu listeye eklenir
+def _isci_dongusu(hedef, rotalar, bitis_zamani, istek_siniri, sayac, sayac_kilidi, basliklar, sonuclar, isci_no):
+    oturum = requests.Session() # her işçi kendi keep-alive bağlantısını kullanır
+    sira = isci_no # işçiler rotalara farklı noktadan başlar
+    while time.perf_counter() < bitis_zamani:
+        if istek_siniri is not None:
+            with sayac_kilidi:
+                if sayac[0] >= istek_siniri:
+                    break
+                sayac[0] += 1
+        rota = rotalar[sira % len(rotalar)]
+        sira += 1
+        baslangic = time.perf_counter()
+        try:
+            yanit = oturum.get(hedef + rota, headers=basliklar, timeout=(3.05, 60))
+            _ = yanit.content # gövde tamamen okunmadan süre ölçülmez
+            durum = yanit.status_code
+        except requests.exceptions.RequestException:
+            durum = 0 # bağlantı hatası / zaman aşımı
+        sonuclar.append((rota, durum, time.perf_counter() - baslangic))
+    oturum.close()
+
+
+
+# Ölçüm sonuçlarını rota bazında özetleyen fonksiyon
+def _ozetle(sonuclar, gecen_sure):
+    ozet = {}
+    rotalar = sorted({rota for rota, _, _ in sonuclar})
+    for rota in rotalar + ["TOPLAM"]:
+        secilen = sonuclar if rota == "TOPLAM" else [s for s in sonuclar if s[0] == rota]
+        sureler_ms = np.array([s[2] for s in secilen]) * 1000
+        hatali = sum(1 for s in secilen if not 200 <= s[1] < 400)
+        ozet[rota] = {
+            "istek": len(secilen),
+            "hata": hatali,
+            "verim_istek_sn": round(len(secilen) / gecen_sure, 2) if gecen_sure > 0 else 0.0,
+            "p50_ms": round(float(np.percentile(sureler_ms, 50)), 2) if len(sureler_ms) else None,
+            "p90_ms": round(float(np.percentile(sureler_ms, 90)), 2) if len(sureler_ms) else None,
+            "p99_ms": round(float(np.percentile(sureler_ms, 99)), 2) if len(sureler_ms) else None,
+            "max_ms": round(float(sureler_ms.max()), 2) if len(sureler_ms) else None,
+        }
+    return ozet
+
+
+
+# Yük testini çalıştıran fonksiyon. sure (saniye) veya istek_sayisi ile sınırlanır, hangisi önce dolarsa
+def yuk_testi_calistir(hedef=VARSAYILAN_HEDEF, rotalar=None, eszamanlilik=8, sure=10.0, istek_sayisi=None, isinma=1, ikili=False):
+    rotalar = rotalar or VARSAYILAN_ROTALAR
+    basliklar = {"Accept": f"{IKILI_TUR}, application/json;q=0.5"} if ikili else {}
+
+    for _ in range(isinma): # ilk istekler depo/önbellek doldurma maliyetini içerdiğinden ölçüme katılmaz
+        for rota in rotalar:
+            try:
+                requests.get(hedef + rota, headers=basliklar, timeout=(3.05, 60))
+            except requests.exceptions.RequestException as e:
+                print(f"Uyarı: Isınma isteği başarısız ({rota}): {e}")
+
+    sonuclar = [] # list.append iş parçacıkları arasında güvenlidir
+    sayac, sayac_kilidi = [0], threading.Lock()
+    baslangic = time.perf_counter()
+    bitis_zamani = baslangic + (sure if sure else float("inf"))
+    with ThreadPoolExecutor(max_workers=eszamanlilik) as havuz:
+        for isci_no in range(eszamanlilik):
+            havuz.submit(_isci_dongusu, hedef, rotalar, bitis_zamani, istek_sayisi, sayac, sayac_kilidi, basliklar, sonuclar, isci_no)
+    gecen_sure = time.perf_counter() - baslangic
+    return _ozetle(sonuclar, gecen_sure), gecen_sure
+
+
+
+# Hata oranı sınırı aşan rotaları (rota, hata oranı) listesi olarak döndüren fonksiyon. Hiç isteği tamamlanmayan rota da başarısız sayılır
+def hatali_rotalar(ozet, azami_hata_orani=0.0):
+    hatalilar = []
+    for rota, m in ozet.items():
+        if rota == "TOPLAM":
+            continue
+        oran = m["hata"] / m["istek"] if m["istek"] else 1.0
+        if oran > azami_hata_orani:
+            hatalilar.append((rota, oran))
+    return hatalilar
+
+
+
+# Özeti tablo olarak yazdıran fonksiyon
+def ozeti_yazdir(ozet, gecen_sure, eszamanlilik):
+    print(f"\nSüre: {gecen_sure:.2f} sn, eşzamanlılık: {eszamanlilik}")
+    print(f"{'Rota':<40}{'İstek':>8}{'Hata':>7}{'İstek/sn':>11}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for rota, m in ozet.items():
+        print(f"{rota:<40}{m['istek']:>8}{m['hata']:>7}{m['verim_istek_sn']:>11}"
+              f"{m['p50_ms'] if m['p50_ms'] is not None else '-':>10}{m['p90_ms'] if m['p90_ms'] is not None else '-':>10}"
+              f"{m['p99_ms'] if m['p99_ms'] is not None else '-':>10}{m['max_ms'] if m['max_ms'] is not None else '-':>10}")
+
+
+
+if __name__ == '__main__':
+    ayristirici = argparse.ArgumentParser(description="api.py yük testi")
+    ayristirici.add_argument("--hedef", default=VARSAYILAN_HEDEF, help="api.py adresi")
+    ayristirici.add_argument("--rota", action="append", dest="rotalar", help="ölçülecek rota (birden fazla verilebilir), varsayılan tüm veri rotaları")
+    ayristirici.add_argument("--eszamanlilik", type=int, default=8, help="aynı anda istek atan işçi sayısı")
+    ayristirici.add_argument("--sure", type=float, default=10.0, help="saniye cinsinden ölçüm süresi (0 verilirse sadece --istek-sayisi sınırlar)")
+    ayristirici.add_argument("--istek-sayisi", type=int, default=None, help="toplam istek sınırı")
+    ayristirici.add_argument("--isinma", type=int, default=1, help="ölçüm öncesi her rotaya atılan tur sayısı")
+    ayristirici.add_argument("--ikili", action="store_true", help="seri rotalarında ikili biçim iste")
+    ayristirici.add_argument("--cikti", help="özeti json olarak yazılacak dosya (önce/sonra karşılaştırması için)")
+    ayristirici.add_argument("--azami-hata-orani", type=float, default=0.0, help="rota başına izin verilen hata oranı (0-1), aşılırsa çıkış kodu 1 olur")
+    argumanlar = ayristirici.parse_args()
+
+    if not argumanlar.sure and argumanlar.istek_sayisi is None:
+        ayristirici.error("--sure 0 ise --istek-sayisi verilmeli")
+
+    ozet, gecen_sure = yuk_testi_calistir(argumanlar.hedef, argumanlar.rotalar, argumanlar.eszamanlilik, argumanlar.sure,
+                                          argumanlar.istek_sayisi, argumanlar.isinma, argumanlar.ikili)
+    ozeti_yazdir(ozet, gecen_sure, argumanlar.eszamanlilik)
+    if argumanlar.cikti:
+        with open(argumanlar.cikti, "w", encoding="utf-8") as f:
+            json.dump({"eszamanlilik": argumanlar.eszamanlilik, "sure": gecen_sure, "ozet": ozet}, f, ensure_ascii=False, indent=2)
+        print(f"Özet {argumanlar.cikti} dosyasına yazıldı.")
+
+    hatalilar = hatali_rotalar(ozet, argumanlar.azami_hata_orani)
+    if hatalilar:
+        for rota, oran in hatalilar:
+            print(f"HATA: {rota} rotasında hata oranı %{oran * 100:.1f} (sınır %{argumanlar.azami_hata_orani * 100:.1f})")
+        raise SystemExit(1)